@@ -6,14 +6,30 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from routers import all_routers  # all_routers is a list of routers imported from routers module
 from config import origins
+from deadline import DeadlineMiddleware
+from lifespan import lifespan
+from log import setup_logging
+from metrics import MetricsMiddleware
+from ratelimit import RateLimitMiddleware
+from scheduling import TenantMiddleware
+from tracing import TracingMiddleware
 
 
+setup_logging()
+
 app = FastAPI(
     title="VM Allocater",
     description="A VM Allocater for supporting both OSPC and Flex environments",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+app.add_middleware(TenantMiddleware)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RateLimitMiddleware)
+# Outermost: preflights are answered before they reach the rate limiter, and 429/503 get CORS headers
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
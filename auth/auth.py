@@ -5,15 +5,38 @@ from fastapi import APIRouter, HTTPException, Depends, Body
 from datetime import datetime, timezone
 from dotenv import load_dotenv 
 
-from config import API_BASE_URLS, get_async_client, get_token, update_token 
+from config import API_BASE_URLS, get_async_client, get_token, update_token, token_lock
+from log import get_logger
+from metrics import token_cache_events
+from tracing import traced, traced_lock
 from models import CloudEnvironment, RegionName
 
 auth_router = APIRouter(prefix="/auth", tags=["auth"])
+logger = get_logger(__name__)
 
 # Try to load .env.local, fall back to .env
 load_dotenv(dotenv_path=".env.local", override=True)
 load_dotenv()  # fallback if needed
 
+# serviceCatalog entry type -> API_BASE_URLS service key
+CATALOG_SERVICE_TYPES = {"compute": "servers", "volume": "volumes", "network": "networking"}
+
+def catalog_endpoints(catalog: list, region: RegionName) -> dict:
+    """
+    Public endpoint of each service in one region, keyed like API_BASE_URLS, from a /tokens serviceCatalog.
+    Services without an endpoint in the region are left out (callers fall back to API_BASE_URLS).
+    """
+    endpoints = {}
+    for entry in catalog or ():
+        service = CATALOG_SERVICE_TYPES.get(entry.get("type"))
+        if service is None or service in endpoints:
+            continue
+        for endpoint in entry.get("endpoints", ()):
+            if str(endpoint.get("region", "")).lower() == region.value and endpoint.get("publicURL"):
+                endpoints[service] = endpoint["publicURL"].rstrip("/")
+                break
+    return endpoints
+
 def is_token_valid(cached_token: dict) -> bool:
     """
     Check if cached token exists and is not expired.
@@ -33,24 +56,45 @@ def is_token_valid(cached_token: dict) -> bool:
     except (ValueError, TypeError):
         return False
     
+@traced("auth.get_auth_token", phase="auth")
 async def get_auth_token(cloud_environment: CloudEnvironment = CloudEnvironment.OSPC, region: RegionName = RegionName.IAD, client: httpx.AsyncClient = Depends(get_async_client)):
     """
     Authenticate with Rackspace OSPC Cloud and get an auth token.
     """
 
     # 1. We cache initially for token
-    cached_token = get_token(cloud_environment.value, region.value)
+    cached_token = await get_token(cloud_environment.value, region.value)
     
     # 2. Validate cached token with expires time field
     if is_token_valid(cached_token):
-        print(f"Using cached token for {cloud_environment.value} in region {region.value}")
+        token_cache_events.labels("hit").inc()
+        logger.debug_sampled("token_cache_hit", cloud_environment=cloud_environment.value, region=region.value)
         return {
             "auth_token": cached_token["auth_token"],
             "expires": cached_token["expires"],
-            "tenant_id": cached_token.get("tenant_id")
+            "tenant_id": cached_token.get("tenant_id"),
+            "endpoints": cached_token.get("endpoints", {})
         }
     
-    # 3. Get new token if cache is invalid
+    # 3. Get new token if cache is invalid. Only one worker refreshes, the rest wait and reuse its token
+    token_cache_events.labels("miss").inc()
+    async with traced_lock("auth.token_lock", token_lock(cloud_environment.value, region.value)):
+        cached_token = await get_token(cloud_environment.value, region.value)
+        if is_token_valid(cached_token):
+            return {
+                "auth_token": cached_token["auth_token"],
+                "expires": cached_token["expires"],
+                "tenant_id": cached_token.get("tenant_id"),
+                "endpoints": cached_token.get("endpoints", {})
+            }
+        token_cache_events.labels("refresh").inc()
+        return await fetch_auth_token(cloud_environment, region, client)
+
+
+async def fetch_auth_token(cloud_environment: CloudEnvironment, region: RegionName, client: httpx.AsyncClient):
+    """
+    Request a fresh token from the identity service and store it in the shared cache.
+    """
     try:
         url = f"{API_BASE_URLS[cloud_environment.value]['identity']}/tokens"
         payload = {
@@ -78,11 +122,14 @@ async def get_auth_token(cloud_environment: CloudEnvironment = CloudEnvironment.
         output = {
             "auth_token": token,
             "expires": expires,
-            "tenant_id": tenant_id
+            "tenant_id": tenant_id,
+            "endpoints": catalog_endpoints(data["access"].get("serviceCatalog"), region)
         }
 
-        # 4. Update cache with new fresh token
-        await update_token(cloud_environment.value, region.value, output)
+        # 4. Update cache with new fresh token, expiring together with it
+        expires_at = datetime.fromisoformat(expires.replace('Z', '+00:00'))
+        ttl = max((expires_at - datetime.now(timezone.utc)).total_seconds(), 1)
+        await update_token(cloud_environment.value, region.value, output, ttl)
 
         return output
 
@@ -91,7 +138,7 @@ async def get_auth_token(cloud_environment: CloudEnvironment = CloudEnvironment.
             status_code=e.response.status_code,
             detail="Failed to authenticate with Rackspace Cloud"
         )
-    except KeyError as e:
+    except (KeyError, ValueError) as e:
         raise HTTPException(
             status_code=500,
             detail=f"Malformed authentication response: {str(e)}"
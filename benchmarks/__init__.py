@@ -0,0 +1,6 @@
+import os
+
+# Benchmarks measure the service behind the front door: inbound rate limits and load shedding
+# (ratelimit.py) are off unless set explicitly, e.g. RATE_LIMIT_RATE=50 python -m benchmarks.load
+for name in ("RATE_LIMIT_RATE", "SHED_MAX_INFLIGHT", "SHED_LOOP_LAG"):
+    os.environ.setdefault(name, "0")
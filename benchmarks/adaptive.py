@@ -0,0 +1,119 @@
+"""
+Batch creates against an upstream with a saturation point: fake_openstack works on --capacity
+requests per region at once, queues --queue-limit more and answers 429 beyond that.
+Each mode sends the same concurrent batch creates through the app, in process, once per
+--latencies service time distribution:
+
+    python -m benchmarks.adaptive --capacity 16 --queue-limit 16 --items 200 --batches 2
+
+Modes:
+    fixed:N   at most N calls in flight per (region, service), what a static cap does
+              (fixed:1 is the old one-item-at-a-time batch loop)
+    adaptive  upstream/limiter.py AdaptiveLimiter, starting from LIMIT_INITIAL
+
+A fixed cap below capacity leaves throughput unused, one above capacity+queue-limit turns
+into 429s; the adaptive limit should settle near capacity without either, with jittery
+service times (lognormal) as well as steady ones.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import httpx
+
+from app import app
+from config import get_async_client
+from fake_openstack import FakeOpenStack, LatencyModel
+from metrics import InstrumentedTransport
+from tracing import TracingTransport
+from upstream import AdaptiveLimiter, limiters
+
+
+async def sample_limit(limiter_key, samples: list, stop: asyncio.Event):
+    while not stop.is_set():
+        limiter = limiters.get(limiter_key)
+        if limiter is not None:
+            samples.append((limiter.limit, limiter.inflight))
+        await asyncio.sleep(0.05)
+
+
+async def run_mode(mode: str, cloud: FakeOpenStack, args) -> dict:
+    limiters.clear()
+    if mode.startswith("fixed:"):
+        size = int(mode.split(":", 1)[1])
+        limiters[("dfw", "servers")] = AdaptiveLimiter(size, size, size)
+    saturated_before = cloud.stats()["saturated"]
+    body = {"servers": [{"name": f"bench-{i}", "imageRef": "Ubuntu 22.04", "flavorRef": "2 GB General Purpose v1"} for i in range(args.items)]}
+    samples, stop = [], asyncio.Event()
+    sampler = asyncio.create_task(sample_limit(("dfw", "servers"), samples, stop))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=600) as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/servers/?region=dfw", json=body, headers={"X-Request-Timeout": str(args.deadline)}) for _ in range(args.batches)
+        ))
+        elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    created = 0
+    for response in responses:
+        servers = response.json().get("servers")
+        if servers is None:
+            servers = response.json().get("detail", {}).get("servers", []) if isinstance(response.json().get("detail"), dict) else []
+        created += len(servers)
+    limits = [limit for limit, _ in samples]
+    return {
+        "seconds": round(elapsed, 3),
+        "created": created,
+        "requested": args.items * args.batches,
+        "servers_per_second": round(created / elapsed, 2),
+        "failed_batches": sum(response.status_code != 200 for response in responses),
+        "upstream_429s": cloud.stats()["saturated"] - saturated_before,
+        "limit": {
+            "mean": round(statistics.fmean(limits), 2) if limits else None,
+            "max": round(max(limits), 2) if limits else None,
+            "final": round(limits[-1], 2) if limits else None,
+        },
+    }
+
+
+async def run(args) -> dict:
+    cloud = FakeOpenStack(capacity=args.capacity, queue_limit=args.queue_limit, seed=1)
+    transport = cloud.transport()
+
+    async def upstream_client():
+        async with httpx.AsyncClient(transport=InstrumentedTransport(TracingTransport(transport)), timeout=60) as upstream:
+            yield upstream
+
+    app.dependency_overrides[get_async_client] = upstream_client
+    latencies = {}
+    for latency in args.latencies.split(","):
+        cloud.latency = LatencyModel(latency, seed=1)
+        latencies[latency] = {mode: await run_mode(mode, cloud, args) for mode in args.modes.split(",")}
+    return {
+        "config": {
+            "capacity": args.capacity, "queue_limit": args.queue_limit,
+            "batches": args.batches, "items_per_batch": args.items,
+        },
+        "latencies": latencies,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="fixed:1,fixed:4,fixed:16,fixed:64,adaptive")
+    parser.add_argument("--capacity", type=int, default=16, help="Requests the fake works on at once per region and service")
+    parser.add_argument("--queue-limit", type=int, default=16, help="Requests the fake queues before answering 429")
+    parser.add_argument("--latencies", default="fixed:0.05,lognormal:0.05:0.5", help="fake_openstack service times per request, one run of every mode each")
+    parser.add_argument("--batches", type=int, default=2, help="Concurrent batch create requests")
+    parser.add_argument("--items", type=int, default=200, help="Servers per batch")
+    parser.add_argument("--deadline", type=float, default=300, help="X-Request-Timeout per batch")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
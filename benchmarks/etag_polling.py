@@ -0,0 +1,100 @@
+"""
+Polling benchmark for ETag / If-None-Match.
+
+Runs the real app in process against a mocked upstream and polls list and get endpoints,
+once re-downloading every response and once revalidating with If-None-Match.
+
+    python -m benchmarks.etag_polling --servers 500 --polls 200
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import httpx
+
+from app import app
+from config import get_async_client
+
+
+def fake_upstream(server_count: int) -> httpx.MockTransport:
+    servers = [
+        {
+            "id": f"server-{i}",
+            "name": f"pooler-VM-{i}",
+            "status": "ACTIVE",
+            "updated": "2025-06-28T21:17:54Z",
+            "metadata": {"region": "dfw", "bid_price": "", "flavor": "general"},
+            "addresses": {"public": [{"addr": f"10.0.{i // 250}.{i % 250}", "version": 4}]},
+            "links": [{"href": f"https://dfw.servers.api.rackspacecloud.com/v2/123/servers/server-{i}", "rel": "self"}],
+        }
+        for i in range(server_count)
+    ]
+    servers_body = json.dumps({"servers": servers}).encode()
+    server_bodies = {server["id"]: json.dumps({"server": server}).encode() for server in servers}
+    token_body = json.dumps({"access": {"token": {"id": "token", "expires": "2099-01-01T00:00:00Z", "tenant": {"id": "123"}}}}).encode()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/tokens"):
+            return httpx.Response(200, content=token_body, headers={"Content-Type": "application/json"})
+        if path.endswith("/servers"):
+            return httpx.Response(200, content=servers_body, headers={"Content-Type": "application/json"})
+        return httpx.Response(200, content=server_bodies[path.rsplit("/", 1)[1]], headers={"Content-Type": "application/json"})
+
+    return httpx.MockTransport(handler)
+
+
+async def poll(client: httpx.AsyncClient, url: str, polls: int, conditional: bool) -> dict:
+    latencies = []
+    received = 0
+    not_modified = 0
+    etag = None
+    for _ in range(polls):
+        headers = {"If-None-Match": etag} if conditional and etag else {}
+        started = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        received += len(response.content)
+        not_modified += response.status_code == 304
+        etag = response.headers.get("etag", etag)
+    return {
+        "bytes": received,
+        "not_modified": not_modified,
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(statistics.median(latencies), 3),
+    }
+
+
+async def run(args) -> dict:
+    transport = fake_upstream(args.servers)
+
+    async def upstream_client():
+        async with httpx.AsyncClient(transport=transport) as client:
+            yield client
+
+    app.dependency_overrides[get_async_client] = upstream_client
+    report = {}
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for name, url in (("list_servers", "/servers/?region=dfw"), ("get_server", "/servers/server-1?region=dfw")):
+                await client.get(url)  # warm the token cache
+                plain = await poll(client, url, args.polls, conditional=False)
+                revalidated = await poll(client, url, args.polls, conditional=True)
+                report[name] = {
+                    "unconditional": plain,
+                    "if_none_match": revalidated,
+                    "bandwidth_saved": round(1 - revalidated["bytes"] / plain["bytes"], 4),
+                    "latency_saved": round(1 - revalidated["mean_ms"] / plain["mean_ms"], 4),
+                }
+    finally:
+        app.dependency_overrides.pop(get_async_client, None)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=500, help="Servers in the mocked region")
+    parser.add_argument("--polls", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
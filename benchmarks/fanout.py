@@ -0,0 +1,100 @@
+"""
+Whole-fleet listing: one list call per region in sequence (what clients did) against one
+region=all call, with the app and fake_openstack in process and slow links to SYD and HKG.
+
+    python -m benchmarks.fanout --servers 20 --region-latency syd=fixed:0.6,hkg=fixed:0.5 --timeout 2
+
+Set a region's latency above --timeout to see it reported as a partial result.
+httpx.ASGITransport hands over the body only once the response is complete, so
+first_line_seconds equals seconds here; it is only meaningful against a real server.
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+
+import fanout
+from app import app
+from config import get_async_client
+from fake_openstack import FakeOpenStack
+from metrics import InstrumentedTransport
+from models import RegionName
+from tracing import TracingTransport
+
+
+async def seed(client: httpx.AsyncClient, servers: int):
+    for region in RegionName:
+        body = {"servers": [{"name": f"{region.value}-{i}", "imageRef": "Ubuntu 22.04", "flavorRef": "2 GB General Purpose v1"} for i in range(servers)]}
+        response = await client.post(f"/servers/?region={region.value}", json=body)
+        response.raise_for_status()
+
+
+async def sequential(client: httpx.AsyncClient) -> dict:
+    started = time.perf_counter()
+    count = 0
+    for region in RegionName:
+        response = await client.get(f"/servers/?region={region.value}")
+        count += len(response.json()["servers"])
+    return {"seconds": round(time.perf_counter() - started, 3), "servers": count}
+
+
+async def fanned_out(client: httpx.AsyncClient) -> dict:
+    started = time.perf_counter()
+    first_line, count, summary = None, 0, None
+    async with client.stream("GET", "/servers/?region=all") as response:
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            if first_line is None:
+                first_line = time.perf_counter() - started
+            record = json.loads(line)
+            if "server" in record:
+                count += 1
+            elif "complete" in record:
+                summary = record
+    return {
+        "seconds": round(time.perf_counter() - started, 3),
+        "first_line_seconds": round(first_line or 0, 3),
+        "servers": count,
+        "summary": summary,
+    }
+
+
+async def run(args) -> dict:
+    region_latency = dict(entry.split("=", 1) for entry in args.region_latency.split(",") if entry)
+    cloud = FakeOpenStack(latency=args.latency, region_latency=region_latency, seed=1)
+    transport = cloud.transport()
+
+    async def upstream_client():
+        async with httpx.AsyncClient(transport=InstrumentedTransport(TracingTransport(transport))) as upstream:
+            yield upstream
+
+    app.dependency_overrides[get_async_client] = upstream_client
+    fanout.FANOUT_REGION_TIMEOUT = args.timeout
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+        await seed(client, args.servers)
+        # Warm every region's token so both sides measure listing only
+        await sequential(client)
+        return {
+            "config": {"servers_per_region": args.servers, "latency": args.latency, "region_latency": region_latency, "timeout_s": args.timeout},
+            "sequential": await sequential(client),
+            "region_all": await fanned_out(client),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=20, help="Servers per region")
+    parser.add_argument("--latency", default="fixed:0.05", help="Upstream latency for most regions")
+    parser.add_argument("--region-latency", default="syd=fixed:0.6,hkg=fixed:0.5")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Per-region deadline for region=all")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
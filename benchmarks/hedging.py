@@ -0,0 +1,84 @@
+"""
+Hedged GETs against a heavy-tailed upstream: the same closed-loop load on one server GET with
+hedging off and on, reporting latency percentiles and the extra upstream calls hedging cost.
+
+    python -m benchmarks.hedging --requests 4000 --concurrency 16 --latency lognormal:0.02:1.0
+
+Hedging needs HEDGE_MIN_SAMPLES calls to learn the p95, so the first calls of the hedged run
+go out unhedged, as they would after a worker starts.
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+
+from benchmarks.load import percentile
+from fake_openstack import FakeOpenStack
+from models import CloudEnvironment, RegionName
+from upstream import get_upstream, hedger
+
+
+async def run_load(client: httpx.AsyncClient, cloud: FakeOpenStack, server_id: str, hedge, args) -> dict:
+    upstream = await get_upstream(CloudEnvironment.OSPC, RegionName.DFW, client)
+    calls_before = cloud.stats()["calls"].get("servers GET", 0)
+    latencies, remaining = [], args.requests
+
+    async def user():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await upstream.servers.get(f"/servers/{server_id}", hedge=hedge)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    upstream_calls = cloud.stats()["calls"].get("servers GET", 0) - calls_before
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "p999_ms": round(percentile(latencies, 0.999), 3),
+        "max_ms": round(latencies[-1], 3),
+        "upstream_calls": upstream_calls,
+        "extra_upstream_load": round(upstream_calls / len(latencies) - 1, 4),
+    }
+
+
+async def run(args) -> dict:
+    cloud = FakeOpenStack(latency=args.latency, seed=args.seed)
+    async with httpx.AsyncClient(transport=cloud.transport(), timeout=60) as client:
+        upstream = await get_upstream(CloudEnvironment.OSPC, RegionName.DFW, client)
+        created = await upstream.servers.post("/servers", json={"server": {"name": "bench", "flavorRef": "general1-1", "imageRef": "image"}})
+        server_id = created.json()["server"]["id"]
+        hedger.budget = args.budget
+        return {
+            "config": {"requests": args.requests, "concurrency": args.concurrency, "latency": args.latency, "budget": args.budget},
+            "unhedged": await run_load(client, cloud, server_id, None, args),
+            "hedged": await run_load(client, cloud, server_id, "bench_get_server", args),
+            "hedge_delay_ms": round((hedger.window("bench_get_server").delay or 0) * 1000, 3),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", default="lognormal:0.02:1.0", help="fake_openstack latency model")
+    parser.add_argument("--budget", type=float, default=0.05, help="Hedges allowed per call (HEDGE_BUDGET)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
@@ -0,0 +1,120 @@
+"""
+Multi-process leader failover check.
+
+Starts several worker processes that run the same poller through run_elected, checks that
+only one of them polls while nothing fails, then SIGKILLs the current leader and measures how
+long it takes until another worker is polling again.
+
+    python -m benchmarks.leader_failover --workers 3 --election lease --ttl 2
+    python -m benchmarks.leader_failover --workers 4 --election lease --ttl 2 --interval 5
+    python -m benchmarks.leader_failover --workers 3 --election file
+
+The second run polls less often than the lease lasts, as the ownership reconciler and the
+health probes do: the lease must not lapse between polls.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from state import SQLiteBackend, run_elected, set_backend
+from state.leader import LEASE_RENEWALS
+
+
+POLLER = "benchmark-poller"
+HEARTBEAT_KEY = "benchmark:heartbeat"
+POLLS_KEY = "benchmark:polls"  # :<pid> -> times that worker polled
+
+
+def worker(db_path: str, election: str, ttl: float, interval: float, lock_dir: str):
+    os.environ["LEADER_ELECTION"] = election
+    tempfile.tempdir = lock_dir  # FileLockElection's lock file goes with the rest of the run
+
+    async def main():
+        backend = SQLiteBackend(db_path)
+        set_backend(backend)
+        polls = []
+
+        async def poll():
+            polls.append(time.time())
+            await backend.set(f"{POLLS_KEY}:{os.getpid()}", polls)
+            await backend.set(HEARTBEAT_KEY, {"pid": os.getpid(), "at": polls[-1]})
+
+        await run_elected(POLLER, poll, interval, ttl=ttl)
+
+    asyncio.run(main())
+
+
+async def wait_for_leader(backend: SQLiteBackend, not_pid: int, since: float, timeout: float) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        beat = await backend.get(HEARTBEAT_KEY)
+        if beat and beat["pid"] != not_pid and beat["at"] >= since:
+            return beat
+        await asyncio.sleep(0.01)
+    raise TimeoutError("No worker took over leadership")
+
+
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="leader-failover-")
+    db_path = os.path.join(workdir, "state.db")
+    backend = SQLiteBackend(db_path)
+    ctx = multiprocessing.get_context("spawn")
+    processes = {}
+    for _ in range(args.workers):
+        process = ctx.Process(target=worker, args=(db_path, args.election, args.ttl, args.interval, workdir), daemon=True)
+        process.start()
+        processes[process.pid] = process
+
+    failovers, steady_leaders = [], set()
+    try:
+        leader = await wait_for_leader(backend, not_pid=-1, since=0, timeout=30)
+        # Steady state: a few polls and lease lifetimes without a failure, one worker polling
+        steady_from = time.time()
+        await asyncio.sleep(max(args.interval * 3, args.ttl * 2))
+        for pid in processes:
+            if any(at >= steady_from for at in await backend.get(f"{POLLS_KEY}:{pid}") or []):
+                steady_leaders.add(pid)
+        for _ in range(min(args.rounds, args.workers - 1)):
+            killed_at = time.time()
+            os.kill(leader["pid"], signal.SIGKILL)
+            processes.pop(leader["pid"]).join()
+            leader = await wait_for_leader(backend, not_pid=leader["pid"], since=killed_at, timeout=args.ttl * 5 + args.interval + 10)
+            failovers.append(leader["at"] - killed_at)
+    finally:
+        for process in processes.values():
+            process.kill()
+        await backend.close()
+
+    return {
+        "election": args.election,
+        "workers": args.workers,
+        "lease_ttl": args.ttl,
+        "interval": args.interval,
+        "steady_leaders": len(steady_leaders),
+        "failover_seconds": [round(value, 3) for value in failovers],
+        "max_failover_seconds": round(max(failovers), 3) if failovers else None,
+        # The lease expires, a follower's next heartbeat takes it, its next tick polls
+        "bound_seconds": round(args.ttl / LEASE_RENEWALS + args.interval + (0 if args.election == "file" else args.ttl), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--election", choices=["lease", "file"], default="lease")
+    parser.add_argument("--ttl", type=float, default=2.0, help="Lease TTL in seconds")
+    parser.add_argument("--interval", type=float, default=0.2, help="Poll interval in seconds")
+    parser.add_argument("--rounds", type=int, default=2)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    # Fail the run on a second leader, or when failover exceeds its theoretical bound (plus scheduling slack)
+    if report["steady_leaders"] != 1 or report["max_failover_seconds"] is None or report["max_failover_seconds"] > report["bound_seconds"] + 1:
+        sys.exit(1)
@@ -0,0 +1,328 @@
+"""
+End-to-end load harness.
+
+Drives the real FastAPI app with mixed workloads against fake_openstack and writes a JSON
+report with per-route throughput, p50/p95/p99 latency, upstream call counts and event-loop lag.
+
+In process (app and fake upstream both behind ASGI transports, nothing listens on a port):
+    python -m benchmarks.load --workload mixed --users 50 --duration 30 --output report.json
+
+Against a running server (start the fake and the app first, see README):
+    python -m benchmarks.load --url http://127.0.0.1:8000 --fake-url http://127.0.0.1:9000
+
+Workloads:
+    dashboard  users poll list/get endpoints, revalidating with If-None-Match
+    batch      users fire bursts of multi-server/volume/port creates, then idle
+    teardown   users delete what earlier creates left behind (recreating when the pool runs dry)
+    mixed      70% dashboard, 20% batch, 10% teardown users
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import time
+import httpx
+
+from collections import defaultdict
+
+from fake_openstack import FakeOpenStack
+
+
+REGION = "dfw"
+LAG_SAMPLE_INTERVAL = 0.01  # seconds
+MIXED_WORKLOAD = (("dashboard", 0.7), ("batch", 0.2), ("teardown", 0.1))
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Latency samples and status codes per route label."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.recording = False
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            if self.recording:
+                self.errors[route] += 1
+                self.statuses[route][type(e).__name__] += 1
+            return None
+        if self.recording:
+            self.latencies[route].append((time.perf_counter() - started) * 1000)
+            self.statuses[route][str(response.status_code)] += 1
+        return response
+
+    def report(self, duration: float) -> dict:
+        routes = {}
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            samples = sorted(self.latencies[route])
+            routes[route] = {
+                "requests": len(samples) + self.errors[route],
+                "throughput_rps": round((len(samples) + self.errors[route]) / duration, 2),
+                "p50_ms": round(percentile(samples, 0.50), 3),
+                "p95_ms": round(percentile(samples, 0.95), 3),
+                "p99_ms": round(percentile(samples, 0.99), 3),
+                "max_ms": round(samples[-1], 3) if samples else 0.0,
+                "statuses": dict(self.statuses[route]),
+            }
+        return routes
+
+
+class Pool:
+    """Ids created during the run, shared between users so teardown has something to delete."""
+
+    def __init__(self):
+        self.servers = []
+        self.volumes = []
+        self.ports = []
+        self.networks = []
+
+    def take(self, kind: str):
+        items = getattr(self, kind)
+        return items.pop(random.randrange(len(items))) if items else None
+
+    def peek(self, kind: str):
+        items = getattr(self, kind)
+        return random.choice(items) if items else None
+
+
+async def create_servers(client, recorder: Recorder, pool: Pool, count: int):
+    body = {"servers": [{"name": "load", "imageRef": "Ubuntu 22.04 LTS (Jammy Jellyfish) (Cloud)", "flavorRef": "2 GB General Purpose v1"}] * count}
+    response = await recorder.request(client, "POST /servers/", "POST", f"/servers/?region={REGION}", json=body)
+    if response is not None and response.status_code == 200:
+        pool.servers.extend(item["server"]["id"] for item in response.json()["servers"])
+
+
+async def create_volumes(client, recorder: Recorder, pool: Pool, count: int):
+    body = {"volumes": [{"size": 100, "display_name": "load"}] * count}
+    response = await recorder.request(client, "POST /volumes/", "POST", f"/volumes/?region={REGION}", json=body)
+    if response is not None and response.status_code == 200:
+        pool.volumes.extend(item["volume"]["id"] for item in response.json())
+
+
+async def create_ports(client, recorder: Recorder, pool: Pool, count: int):
+    network_id = pool.peek("networks")
+    if network_id is None:
+        return
+    body = {"ports": [{"network_id": network_id, "name": "load"}] * count}
+    response = await recorder.request(client, "POST /ports/ports", "POST", f"/ports/ports?region={REGION}", json=body)
+    if response is not None and response.status_code == 200:
+        pool.ports.extend(item["port"]["id"] for item in response.json())
+
+
+async def dashboard_user(client, recorder: Recorder, pool: Pool, stop: asyncio.Event, think_time: float):
+    etags = {}
+
+    async def poll(route: str, url: str):
+        headers = {"If-None-Match": etags[url]} if url in etags else {}
+        response = await recorder.request(client, route, "GET", url, headers=headers)
+        if response is not None and "etag" in response.headers:
+            etags[url] = response.headers["etag"]
+
+    while not stop.is_set():
+        roll = random.random()
+        if roll < 0.30:
+            await poll("GET /servers/", f"/servers/?region={REGION}")
+        elif roll < 0.60 and pool.servers:
+            await poll("GET /servers/{server_id}", f"/servers/{pool.peek('servers')}?region={REGION}")
+        elif roll < 0.75:
+            await poll("GET /volumes/", f"/volumes/?region={REGION}")
+        elif roll < 0.85:
+            await poll("GET /networks/", f"/networks/?region={REGION}")
+        elif roll < 0.95:
+            await poll("GET /ports/ports", f"/ports/ports?region={REGION}")
+        else:
+            await poll("GET /keypairs/", f"/keypairs/?region={REGION}")
+        await asyncio.sleep(random.expovariate(1 / think_time) if think_time else 0)
+
+
+async def batch_user(client, recorder: Recorder, pool: Pool, stop: asyncio.Event, think_time: float):
+    while not stop.is_set():
+        # A burst of back-to-back creates, then a long pause
+        for _ in range(random.randint(2, 5)):
+            roll = random.random()
+            if roll < 0.5:
+                await create_servers(client, recorder, pool, random.randint(1, 5))
+            elif roll < 0.8:
+                await create_volumes(client, recorder, pool, random.randint(1, 3))
+            else:
+                await create_ports(client, recorder, pool, random.randint(1, 3))
+        await asyncio.sleep(random.expovariate(1 / (think_time * 10)) if think_time else 0)
+
+
+async def teardown_user(client, recorder: Recorder, pool: Pool, stop: asyncio.Event, think_time: float):
+    while not stop.is_set():
+        kind = random.choice(("servers", "volumes", "ports"))
+        resource_id = pool.take(kind)
+        if resource_id is None:
+            if kind == "servers":
+                await create_servers(client, recorder, pool, 5)
+            elif kind == "volumes":
+                await create_volumes(client, recorder, pool, 3)
+            else:
+                await create_ports(client, recorder, pool, 3)
+            continue
+        route, url = {
+            "servers": ("DELETE /servers/{server_id}", f"/servers/{resource_id}?region={REGION}"),
+            "volumes": ("DELETE /volumes/{volume_id}", f"/volumes/{resource_id}?region={REGION}"),
+            "ports": ("DELETE /ports/{port_id}", f"/ports/{resource_id}?region={REGION}"),
+        }[kind]
+        await recorder.request(client, route, "DELETE", url)
+        await asyncio.sleep(random.expovariate(1 / think_time) if think_time else 0)
+
+
+USERS = {"dashboard": dashboard_user, "batch": batch_user, "teardown": teardown_user}
+
+
+async def sample_loop_lag(stop: asyncio.Event, samples: list):
+    """Overshoot of a fixed sleep: how long ready callbacks waited for the loop."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+        samples.append(max(0.0, time.perf_counter() - started - LAG_SAMPLE_INTERVAL) * 1000)
+
+
+async def seed(client, recorder: Recorder, pool: Pool, servers: int):
+    """Give the dashboards something to list before measuring starts."""
+    response = await recorder.request(client, "POST /networks/", "POST", f"/networks/{REGION}/networks", json={"networks": [{"name": "load"}]})
+    if response is not None and response.status_code == 200:
+        pool.networks.extend(item["network"]["id"] for item in response.json())
+    for _ in range(0, servers, 10):
+        await create_servers(client, recorder, pool, 10)
+    await create_volumes(client, recorder, pool, 5)
+    await create_ports(client, recorder, pool, 5)
+
+
+def user_kinds(workload: str, users: int) -> list:
+    if workload != "mixed":
+        return [workload] * users
+    kinds = []
+    for kind, share in MIXED_WORKLOAD:
+        kinds.extend([kind] * max(1, round(users * share)))
+    return kinds[:max(users, len(MIXED_WORKLOAD))]
+
+
+async def run(args) -> dict:
+    random.seed(args.seed)
+    cloud = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30)
+    else:
+        from app import app
+        from config import get_async_client
+        from metrics import InstrumentedTransport, loop_monitor
+        from tracing import TracingTransport
+
+        cloud = FakeOpenStack(latency=args.upstream_latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate, build_time=1.0, seed=args.seed)
+        transport = cloud.transport()
+
+        async def upstream_client():
+            async with httpx.AsyncClient(transport=InstrumentedTransport(TracingTransport(transport))) as upstream:
+                yield upstream
+
+        app.dependency_overrides[get_async_client] = upstream_client
+        loop_monitor.strict = args.strict
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load", timeout=30)
+
+    recorder = Recorder()
+    pool = Pool()
+    stop = asyncio.Event()
+    lag_samples = []
+    async with client:
+        await seed(client, recorder, pool, args.seed_servers)
+        upstream_before = await upstream_stats(cloud, args.fake_url)
+
+        recorder.recording = True
+        kinds = user_kinds(args.workload, args.users)
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(USERS[kind](client, recorder, pool, stop, args.think_time)) for kind in kinds]
+        tasks.append(asyncio.create_task(sample_loop_lag(stop, lag_samples)))
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - started
+
+        upstream_after = await upstream_stats(cloud, args.fake_url)
+
+    lag = sorted(lag_samples)
+    routes = recorder.report(duration)
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "config": {
+            "mode": "uvicorn" if args.url else "asgi",
+            "workload": args.workload,
+            "users": dict((kind, kinds.count(kind)) for kind in set(kinds)),
+            "duration_s": round(duration, 3),
+            "think_time_s": args.think_time,
+            "upstream_latency": args.upstream_latency,
+            "error_rate": args.error_rate,
+            "throttle_rate": args.throttle_rate,
+            "seed": args.seed,
+            "python": platform.python_version(),
+        },
+        "summary": {
+            "requests": total,
+            "throughput_rps": round(total / duration, 2),
+        },
+        "routes": routes,
+        "upstream": upstream_delta(upstream_before, upstream_after),
+        "loop_lag_ms": {
+            "p50": round(percentile(lag, 0.50), 3),
+            "p99": round(percentile(lag, 0.99), 3),
+            "max": round(lag[-1], 3) if lag else 0.0,
+        },
+    }
+
+
+async def upstream_stats(cloud, fake_url) -> dict:
+    if cloud is not None:
+        return cloud.stats()["calls"]
+    if fake_url:
+        async with httpx.AsyncClient() as client:
+            return (await client.get(f"{fake_url}/_fake/stats")).json()["calls"]
+    return {}
+
+
+def upstream_delta(before: dict, after: dict) -> dict:
+    calls = {key: count - before.get(key, 0) for key, count in after.items() if count - before.get(key, 0)}
+    return {"calls": calls, "total_calls": sum(calls.values())}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", choices=[*USERS, "mixed"], default="mixed")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of measured load")
+    parser.add_argument("--think-time", type=float, default=0.05, help="Mean pause between a user's requests")
+    parser.add_argument("--seed-servers", type=int, default=50, help="Servers created before measuring")
+    parser.add_argument("--url", help="Base URL of a running service instead of the in-process app")
+    parser.add_argument("--fake-url", help="Base URL of a running fake_openstack, for upstream call counts")
+    parser.add_argument("--upstream-latency", default="lognormal:0.02:0.5", help="In-process fake latency model")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--strict", action="store_true", help="Exit non-zero if any callback blocked the app's event loop (in-process only)")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if args.strict:
+        from metrics import loop_monitor
+        loop_monitor.raise_if_blocked()
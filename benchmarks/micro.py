@@ -0,0 +1,201 @@
+"""
+Micro-benchmarks for the per-request hot paths.
+
+Each case is timed in isolation (no network: upstream calls go to a mocked transport) and
+reported as ops/sec plus the peak bytes allocated by one call (tracemalloc).
+Results are compared with benchmarks/baselines.json; a case slower than the baseline by more
+than --threshold makes the run exit non-zero.
+
+    python -m benchmarks.micro                 # run and compare
+    python -m benchmarks.micro --save          # record new baselines on this machine
+    python -m benchmarks.micro -k auth -k json # only cases whose name contains "auth" or "json"
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+import httpx
+
+from auth import get_auth_token
+from auth.auth import is_token_valid
+from config import update_token
+from flavors import flavor_id_mapping
+from models import CloudEnvironment, RegionName, ServerCreate
+from os_images import find_os_image_uuid_by_name
+from ratelimit import RateLimiter
+from servers.servers import build_server_payload
+from upstream import get_upstream
+
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+CACHED_TOKEN = {"auth_token": "0" * 32, "expires": "2099-01-01T00:00:00.000Z", "tenant_id": "123456"}
+
+
+def nova_servers_payload(count: int = 100) -> bytes:
+    servers = [
+        {
+            "id": f"6a0c1a3e-0000-4000-8000-{i:012d}",
+            "name": f"pooler-VM-{1750000000000 + i}",
+            "status": "ACTIVE",
+            "tenant_id": "123456",
+            "user_id": "user",
+            "image": {"id": "c2e5b7be-32ea-4f74-bb88-1c9a4104f8ca"},
+            "flavor": {"id": "general1-2"},
+            "metadata": {"region": "dfw", "cloud_environment": "ospc", "bid_price": "", "flavor": "general"},
+            "addresses": {
+                "public": [{"addr": f"10.0.{i // 250}.{i % 250}", "version": 4}, {"addr": f"2001:db8::{i:x}", "version": 6}],
+                "private": [{"addr": f"192.168.{i // 250}.{i % 250}", "version": 4}],
+            },
+            "created": "2025-06-28T21:17:54Z",
+            "updated": "2025-06-28T21:19:02Z",
+            "links": [{"rel": "self", "href": f"https://dfw.servers.api.rackspacecloud.com/v2/123456/servers/{i}"}],
+        }
+        for i in range(count)
+    ]
+    return json.dumps({"servers": servers}).encode()
+
+
+def neutron_ports_payload(count: int = 100) -> bytes:
+    ports = [
+        {
+            "id": f"9b1f7c2d-0000-4000-8000-{i:012d}",
+            "network_id": "00000000-0000-0000-0000-000000000000",
+            "name": f"port-{i}",
+            "status": "ACTIVE",
+            "mac_address": f"fa:16:3e:00:{i // 256:02x}:{i % 256:02x}",
+            "fixed_ips": [{"subnet_id": "5e1c0b0a-0000-4000-8000-000000000001", "ip_address": f"10.1.{i // 250}.{i % 250}"}],
+            "security_groups": ["1c5f7a0e-0000-4000-8000-000000000001"],
+            "device_id": "",
+            "tenant_id": "123456",
+        }
+        for i in range(count)
+    ]
+    return json.dumps({"ports": ports}).encode()
+
+
+def cases() -> dict:
+    """name -> (callable, is_coroutine)"""
+    server_data = ServerCreate(name="bench", imageRef="Ubuntu 22.04 LTS (Jammy Jellyfish) (Cloud)", flavorRef="2 GB General Purpose v1", key_name="k")
+    nova_body = nova_servers_payload()
+    nova_obj = json.loads(nova_body)
+    neutron_body = neutron_ports_payload()
+    neutron_obj = json.loads(neutron_body)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+    limiter = RateLimiter(rate=1e9, burst=1e9, routes={"POST /servers": (1e9, 1e9)}, address_rate=1e9, address_burst=1e9)  # never refuses: times the grant path
+
+    async def upstream_cache_hit():
+        # Token lookup plus endpoint/header resolution, everything a handler does before its upstream call
+        return await get_upstream(CloudEnvironment.OSPC, RegionName.DFW, client)
+
+    async def auth_cache_hit():
+        # Token is pre-seeded, so the mocked transport is never reached
+        return await get_auth_token(CloudEnvironment.OSPC, RegionName.DFW, client)
+
+    return {
+        "auth.get_auth_token[cache_hit]": (auth_cache_hit, True),
+        "auth.is_token_valid": (lambda: is_token_valid(CACHED_TOKEN), False),
+        "upstream.get_upstream[cache_hit]": (upstream_cache_hit, True),
+        "os_images.find_os_image_uuid_by_name": (lambda: find_os_image_uuid_by_name("Ubuntu 22.04 LTS (Jammy Jellyfish) (Cloud)"), False),
+        "flavors.resolve": (lambda: flavor_id_mapping.get("2 GB General Purpose v1", "general1-2"), False),
+        "servers.build_server_payload": (lambda: build_server_payload(server_data, RegionName.DFW, CloudEnvironment.OSPC, "123456"), False),
+        "ratelimit.check[tenant]": (lambda: limiter.check("tenant-a", "10.0.0.1", "GET", "/servers/", time.monotonic()), False),
+        "ratelimit.check[route]": (lambda: limiter.check("tenant-a", "10.0.0.1", "POST", "/servers/", time.monotonic()), False),
+        "json.decode[nova_servers_100]": (lambda: json.loads(nova_body), False),
+        "json.encode[nova_servers_100]": (lambda: json.dumps(nova_obj), False),
+        "json.decode[neutron_ports_100]": (lambda: json.loads(neutron_body), False),
+        "json.encode[neutron_ports_100]": (lambda: json.dumps(neutron_obj), False),
+    }
+
+
+async def time_batch(func, is_coroutine: bool, batch: int) -> float:
+    # Separate loops so sync cases are not charged for an await per call
+    started = time.perf_counter()
+    if is_coroutine:
+        for _ in range(batch):
+            await func()
+    else:
+        for _ in range(batch):
+            func()
+    return time.perf_counter() - started
+
+
+async def measure(func, is_coroutine: bool, min_time: float, repeats: int = 7) -> dict:
+    # Calibrate: grow the batch until one batch takes at least min_time / repeats
+    batch = 1
+    while await time_batch(func, is_coroutine, batch) < min_time / repeats:
+        batch *= 2
+
+    # Best batch wins, which filters out scheduler and GC noise
+    best = min([await time_batch(func, is_coroutine, batch) for _ in range(repeats)])
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(20):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        if is_coroutine:
+            await func()
+        else:
+            func()
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {"ops_per_sec": round(batch / best, 1), "peak_bytes_per_call": sorted(peaks)[len(peaks) // 2]}
+
+
+async def run(selected, min_time: float) -> dict:
+    await update_token(CloudEnvironment.OSPC.value, RegionName.DFW.value, CACHED_TOKEN)
+    results = {}
+    for name, (func, is_coroutine) in cases().items():
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        results[name] = await measure(func, is_coroutine, min_time)
+    return results
+
+
+def compare(results: dict, baselines: dict, threshold: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            result["change"] = None
+            continue
+        change = result["ops_per_sec"] / baseline["ops_per_sec"] - 1
+        result["change"] = round(change, 4)
+        if change < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="selected", action="append", default=[], help="Only run cases whose name contains this")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Approximate seconds spent timing each case")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed ops/sec drop against the baseline")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--save", action="store_true", help="Write the results as the new baselines")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.selected, args.min_time))
+    if args.save:
+        with open(args.baselines, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(json.dumps(results, indent=2))
+        sys.exit(0)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+    regressions = compare(results, baselines, args.threshold)
+    if regressions:
+        # Re-measure suspects once so a single noisy sample does not fail the run
+        retry = asyncio.run(run(regressions, args.min_time))
+        results.update({name: retry[name] for name in regressions})
+        regressions = compare(results, baselines, args.threshold)
+    print(json.dumps({"results": results, "regressions": regressions}, indent=2))
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,135 @@
+"""
+Interactive reads during a bulk burst: a few tenants GET servers in a closed loop while another
+tenant creates --items servers in one batch, all through the app in process, against a
+fake_openstack with a saturation point (--capacity, --queue-limit) in the same region.
+
+    python -m benchmarks.scheduler --items 500 --readers 8
+
+Modes:
+    idle       the reads alone, the latency to hold on to
+    fifo       reads and the burst share one first-come queue per (region, service):
+               every call in one class and one tenant, the class taking the whole limit
+    scheduled  scheduling.py as configured: reads are interactive, the batch is bulk and
+               limited to its SCHEDULER_CLASS_SHARES of the limit
+
+The resource cache is off so every read reaches upstream.
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+
+from app import app
+from benchmarks.load import percentile
+from cache import resource_cache
+from config import get_async_client, SCHEDULER_CLASS_SHARES
+from fake_openstack import FakeOpenStack
+from metrics import InstrumentedTransport
+from scheduling import BULK, PRIORITIES, priority, queue_wait
+from tracing import TracingTransport
+from upstream import limiters
+
+
+def wait_totals() -> dict:
+    return {name: (sum(queue_wait.labels(name).counts), queue_wait.labels(name).sum) for name in PRIORITIES}
+
+
+async def run_mode(mode: str, client: httpx.AsyncClient, server_ids: list, args) -> dict:
+    limiters.clear()
+    shares = dict(SCHEDULER_CLASS_SHARES)
+    if mode == "fifo":
+        SCHEDULER_CLASS_SHARES.update({name: 1.0 for name in PRIORITIES})
+    waits_before = wait_totals()
+    latencies, statuses = [], {}
+    burst_done = asyncio.Event()
+
+    async def reader(index: int):
+        n = index
+        while not burst_done.is_set():
+            n += 1
+            started = time.perf_counter()
+            if mode == "fifo":
+                with priority(BULK):
+                    response = await client.get(f"/servers/{server_ids[n % len(server_ids)]}?region=dfw")
+            else:
+                response = await client.get(f"/servers/{server_ids[n % len(server_ids)]}?region=dfw", headers={"X-Tenant-Id": f"reader-{index % 3}"})
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async def burst():
+        try:
+            if mode == "idle":
+                await asyncio.sleep(args.idle_seconds)
+                return None
+            body = {"servers": [{"name": f"bulk-{i}", "imageRef": "Ubuntu 22.04", "flavorRef": "2 GB General Purpose v1"} for i in range(args.items)]}
+            headers = {"X-Request-Timeout": "600"} if mode == "fifo" else {"X-Request-Timeout": "600", "X-Tenant-Id": "bulk"}
+            started = time.perf_counter()
+            response = await client.post("/servers/?region=dfw", json=body, headers=headers)
+            return {"status": response.status_code, "seconds": round(time.perf_counter() - started, 3)}
+        finally:
+            burst_done.set()
+
+    try:
+        outcome, *_ = await asyncio.gather(burst(), *(reader(index) for index in range(args.readers)))
+    finally:
+        SCHEDULER_CLASS_SHARES.update(shares)
+    waits = {}
+    for name, (count, total) in wait_totals().items():
+        calls, seconds = count - waits_before[name][0], total - waits_before[name][1]
+        if calls:
+            waits[name] = {"calls": calls, "mean_wait_ms": round(seconds / calls * 1000, 3)}
+    latencies.sort()
+    return {
+        "reads": len(latencies),
+        "read_statuses": statuses,
+        "read_p50_ms": round(percentile(latencies, 0.50), 3),
+        "read_p99_ms": round(percentile(latencies, 0.99), 3),
+        "read_max_ms": round(latencies[-1], 3) if latencies else None,
+        "burst": outcome,
+        "queue_wait": waits,
+    }
+
+
+async def run(args) -> dict:
+    cloud = FakeOpenStack(latency=args.latency, capacity=args.capacity, queue_limit=args.queue_limit, seed=1)
+    transport = cloud.transport()
+
+    async def upstream_client():
+        async with httpx.AsyncClient(transport=InstrumentedTransport(TracingTransport(transport)), timeout=60) as upstream:
+            yield upstream
+
+    app.dependency_overrides[get_async_client] = upstream_client
+    resource_cache.ttls = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=600) as client:
+        body = {"servers": [{"name": f"read-{i}", "imageRef": "Ubuntu 22.04", "flavorRef": "2 GB General Purpose v1"} for i in range(20)]}
+        created = await client.post("/servers/?region=dfw", json=body)
+        server_ids = [server["server"]["id"] for server in created.json()["servers"]]
+        modes = {mode: await run_mode(mode, client, server_ids, args) for mode in args.modes.split(",")}
+    return {
+        "config": {
+            "capacity": args.capacity, "queue_limit": args.queue_limit, "latency": args.latency,
+            "items": args.items, "readers": args.readers, "class_shares": SCHEDULER_CLASS_SHARES,
+        },
+        "modes": modes,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="idle,fifo,scheduled")
+    parser.add_argument("--capacity", type=int, default=16, help="Requests the fake works on at once per region and service")
+    parser.add_argument("--queue-limit", type=int, default=16, help="Requests the fake queues before answering 429")
+    parser.add_argument("--latency", default="fixed:0.05", help="fake_openstack service time per request")
+    parser.add_argument("--items", type=int, default=500, help="Servers in the bulk batch")
+    parser.add_argument("--readers", type=int, default=8, help="Concurrent interactive readers")
+    parser.add_argument("--idle-seconds", type=float, default=3, help="How long the idle mode reads for")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
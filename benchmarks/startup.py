@@ -0,0 +1,181 @@
+"""
+Launcher benchmark: cold start to first request, then steady-state throughput.
+
+Starts fake_openstack, then for each launcher spawns the app as a real server process,
+times spawn -> first 200 from an upstream-backed endpoint (with the latency of that first
+request on its own), runs closed-loop load for --duration seconds and stops the server with
+SIGTERM, timing the graceful shutdown.
+
+    python -m benchmarks.startup --launchers dev,serve --workers 4 --concurrency 64 --output startup.json
+
+Launchers:
+    dev    uvicorn app:app --reload, what `python app.py` runs
+    serve  python serve.py --workers N --prewarm ospc:dfw
+
+The load generator is a single Python process; on small machines it can saturate before a
+multi-worker server does, so compare runs with the same --concurrency on the same host.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import time
+import httpx
+
+from benchmarks.load import percentile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGET = "/servers/?region=dfw"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def launcher_command(name: str, port: int, workers: int) -> list:
+    if name == "dev":
+        return [sys.executable, "-m", "uvicorn", "app:app", "--reload", "--host", "127.0.0.1", "--port", str(port)]
+    if name == "serve":
+        return [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--prewarm", "ospc:dfw"]
+    raise ValueError(f"Unknown launcher {name}")
+
+
+async def wait_until_serving(url: str, timeout: float) -> float:
+    """Poll until the target answers 200; returns the latency of that first successful request."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await client.get(url)
+            except httpx.TransportError:
+                await asyncio.sleep(0.01)
+                continue
+            if response.status_code == 200:
+                return time.perf_counter() - started
+            await asyncio.sleep(0.01)
+    raise TimeoutError(f"{url} not serving after {timeout}s")
+
+
+async def steady_state(url: str, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], 0
+    stop = time.monotonic() + duration
+
+    async def user(client):
+        nonlocal errors
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            try:
+                response = await client.get(url)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+    }
+
+
+async def measure(name: str, args, fake_url: str) -> dict:
+    port = free_port()
+    env = dict(os.environ, UPSTREAM_BASE_URL=fake_url, LOG_LEVEL="WARNING")
+    spawned = time.perf_counter()
+    process = subprocess.Popen(launcher_command(name, port, args.workers), cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        url = f"http://127.0.0.1:{port}{TARGET}"
+        first_request = await wait_until_serving(url, args.startup_timeout)
+        cold_start = time.perf_counter() - spawned
+        load = await steady_state(url, args.concurrency, args.duration)
+    finally:
+        stopping = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+    return {
+        "command": " ".join(launcher_command(name, port, args.workers)[1:]),
+        "cold_start_to_first_200_s": round(cold_start, 3),
+        "first_request_ms": round(first_request * 1000, 3),
+        "steady_state": load,
+        "shutdown_s": round(time.perf_counter() - stopping, 3),
+    }
+
+
+async def run(args) -> dict:
+    fake_port = free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "fake_openstack", "--port", str(fake_port), "--latency", args.upstream_latency],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        await wait_until_serving(f"{fake_url}/_fake/stats", args.startup_timeout)
+        async with httpx.AsyncClient() as client:
+            # Something for the list endpoint to return
+            token = (await client.post(f"{fake_url}/identity/v2.0/tokens", json={})).json()["access"]["token"]
+            for i in range(args.servers):
+                await client.post(
+                    f"{fake_url}/dfw/servers/v2/{token['tenant']['id']}/servers",
+                    json={"server": {"name": f"bench-{i}", "flavorRef": "general1-1", "imageRef": "image"}},
+                    headers={"X-Auth-Token": token["id"]}
+                )
+        launchers = {name: await measure(name, args, fake_url) for name in args.launchers.split(",")}
+    finally:
+        fake.terminate()
+        fake.wait()
+    return {
+        "config": {
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "upstream_latency": args.upstream_latency,
+            "servers": args.servers,
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "launchers": launchers,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--launchers", default="dev,serve", help="Comma separated: dev, serve")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Workers for the serve launcher")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of steady-state load per launcher")
+    parser.add_argument("--servers", type=int, default=50, help="Servers in the fake cloud for the list endpoint")
+    parser.add_argument("--upstream-latency", default="fixed:0.02", help="fake_openstack latency model")
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
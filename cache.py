@@ -0,0 +1,171 @@
+import asyncio
+import time
+import uuid
+import httpx
+
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from fastapi import HTTPException
+
+from config import CACHE_TTLS, CACHE_NEGATIVE_TTL, CACHE_MAX_BYTES
+from metrics import Counter, Gauge
+from state import InProcessBackend, StateBackend, get_backend
+from tracing import traced
+
+
+cache_requests = Counter(
+    "resource_cache_requests_total",
+    "Read-through cache lookups by resource type and result (hit, negative_hit, miss)",
+    ("kind", "result")
+)
+
+
+def version_keys(key: tuple) -> Tuple[str, str]:
+    """State backend keys whose values change when a resource, or every resource of its type in its region, is invalidated."""
+    kind, cloud_environment, region, resource_id = key
+    region_key = f"cache:version:{kind}:{cloud_environment}:{region}"
+    return f"{region_key}:{resource_id}", region_key
+
+
+class ResourceCache:
+    """
+    Read-through LRU cache for single-resource GETs, bounded by the total size of cached response bodies.
+    Entries expire after the per-type TTL in CACHE_TTLS; upstream 404s are cached for CACHE_NEGATIVE_TTL.
+    Concurrent misses for the same key share one upstream call.
+
+    Each worker caches on its own. With a shared STATE_BACKEND, invalidate() also writes a new
+    version token for the resource (or the type in the region) there; a load remembers the
+    tokens it started under and a hit is only served while they are unchanged, so a write
+    through one worker is not answered from another worker's stale copy.
+    """
+
+    def __init__(self, ttls: dict = CACHE_TTLS, negative_ttl: float = CACHE_NEGATIVE_TTL, max_bytes: int = CACHE_MAX_BYTES):
+        self.ttls = ttls
+        self.negative_ttl = negative_ttl
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict = OrderedDict()  # key -> (value, error_detail, size, expires_at, versions)
+        self.inflight: dict = {}
+        self.bytes_by_kind = defaultdict(int)
+        self.entries_by_kind = defaultdict(int)
+        self.total_bytes = 0
+
+    def _store(self, key: tuple, value: Any, error: Optional[str], size: int, ttl: float, versions: Optional[List[str]]):
+        self._drop(key)
+        self.entries[key] = (value, error, size, time.monotonic() + ttl, versions)
+        self.bytes_by_kind[key[0]] += size
+        self.entries_by_kind[key[0]] += 1
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes and self.entries:
+            self._drop(next(iter(self.entries)))
+
+    def _drop(self, key: tuple):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes_by_kind[key[0]] -= entry[2]
+            self.entries_by_kind[key[0]] -= 1
+            self.total_bytes -= entry[2]
+
+    @traced("cache.get", phase="cache")
+    async def get(
+        self,
+        kind: str,
+        cloud_environment: str,
+        region: str,
+        resource_id: str,
+        fetch: Callable[[], Awaitable[httpx.Response]],
+        transform: Optional[Callable[[Any], Any]] = None
+    ) -> Any:
+        """
+        Return the cached body for resource_id, or call fetch() and cache its response.
+        Non-200 responses raise HTTPException like the handlers do; only 404s are cached.
+        """
+        key = (kind, cloud_environment, region, resource_id)
+        backend = shared_backend()
+        entry = self.entries.get(key)
+        if entry is not None and entry[3] > time.monotonic() and (backend is None or await versions(backend, key) == entry[4]):
+            if self.entries.get(key) is entry:
+                self.entries.move_to_end(key)
+            value, error = entry[0], entry[1]
+            if error is not None:
+                cache_requests.labels(kind, "negative_hit").inc()
+                raise HTTPException(status_code=404, detail=error)
+            cache_requests.labels(kind, "hit").inc()
+            return value
+        if entry is not None and self.entries.get(key) is entry:
+            self._drop(key)  # expired, or invalidated through another worker
+
+        cache_requests.labels(kind, "miss").inc()
+        future = self.inflight.get(key)
+        if future is None:
+            future = self.inflight[key] = asyncio.ensure_future(self._load(key, fetch, transform, backend))
+            future.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(future)
+
+    def _finish(self, key: tuple, future: asyncio.Future):
+        if self.inflight.get(key) is future:
+            del self.inflight[key]
+        if not future.cancelled():
+            future.exception()  # mark retrieved: waiters already got it through shield()
+
+    def _is_current(self, key: tuple) -> bool:
+        # False when a write invalidated the key while this load was in flight
+        return self.inflight.get(key) is asyncio.current_task()
+
+    async def _load(self, key: tuple, fetch, transform, backend: Optional[StateBackend]) -> Any:
+        loaded_under = await versions(backend, key) if backend is not None else None
+        response = await fetch()
+        if response.status_code == 404:
+            if self._is_current(key):
+                self._store(key, None, response.text, len(response.content), self.negative_ttl, loaded_under)
+            raise HTTPException(status_code=404, detail=response.text)
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        value = response.json()
+        if transform is not None:
+            value = transform(value)
+        if self._is_current(key):
+            self._store(key, value, None, len(response.content), self.ttls.get(key[0], 0), loaded_under)
+        return value
+
+    async def invalidate(self, kind: str, cloud_environment: str, region: str, resource_id: Optional[str] = None):
+        """
+        Drop one cached resource, or every cached resource of that type in the region when
+        resource_id is None, here and, through a shared state backend, in the other workers.
+        """
+        if resource_id is not None:
+            keys = [(kind, cloud_environment, region, resource_id)]
+        else:
+            keys = [key for key in [*self.entries, *self.inflight] if key[:3] == (kind, cloud_environment, region)]
+        for key in keys:
+            self._drop(key)
+            self.inflight.pop(key, None)
+        backend = shared_backend()
+        if backend is not None:
+            resource_key, region_key = version_keys((kind, cloud_environment, region, resource_id))
+            # Outlives every entry loaded under the old token; an expired token only costs a refetch
+            ttl = max([*self.ttls.values(), self.negative_ttl])
+            await backend.set(resource_key if resource_id is not None else region_key, uuid.uuid4().hex, ttl=ttl)
+
+    def hit_ratios(self) -> dict:
+        ratios = {}
+        for (kind, result), child in cache_requests.children.items():
+            hits, total = ratios.get(kind, (0, 0))
+            ratios[kind] = (hits + (child.value if result != "miss" else 0), total + child.value)
+        return {kind: (hits / total if total else 0) for kind, (hits, total) in ratios.items()}
+
+
+def shared_backend() -> Optional[StateBackend]:
+    """The state backend when other workers can see it, else None: one worker's own invalidations need no versions."""
+    backend = get_backend()
+    return None if isinstance(backend, InProcessBackend) else backend
+
+
+async def versions(backend: StateBackend, key: tuple) -> List[Optional[str]]:
+    return list(await asyncio.gather(*(backend.get(name) for name in version_keys(key))))
+
+
+resource_cache = ResourceCache()
+
+Gauge("resource_cache_bytes", "Response bytes held in the read-through cache", ("kind",), collect=lambda: dict(resource_cache.bytes_by_kind))
+Gauge("resource_cache_entries", "Entries held in the read-through cache", ("kind",), collect=lambda: dict(resource_cache.entries_by_kind))
+Gauge("resource_cache_hit_ratio", "Share of cache lookups answered without calling upstream", ("kind",), collect=resource_cache.hit_ratios)
@@ -1,9 +1,10 @@
+import os
 import httpx
-import asyncio
 
-from collections import defaultdict
-
-from models import CloudEnvironment, RegionName
+from metrics import InstrumentedTransport
+from models import CloudEnvironment
+from state import get_backend
+from tracing import TracingTransport
 
 origins = [
     # "http://localhost:5173/",
@@ -12,6 +13,8 @@ origins = [
     # "http://localhost:3000",
 ]
 
+# Identity endpoint per environment, and the fallback for services missing from a token's
+# service catalog (upstream.UpstreamClient takes its endpoints from the catalog first)
 API_BASE_URLS = {
     CloudEnvironment.OSPC: {
         "identity": "https://identity.api.rackspacecloud.com/v2.0",
@@ -27,36 +30,181 @@ API_BASE_URLS = {
     }
 }
 
+# Point every environment at a fake_openstack instance instead of Rackspace,
+# e.g. UPSTREAM_BASE_URL=http://127.0.0.1:9000 (see fake_openstack/fake_openstack.py)
+UPSTREAM_BASE_URL = os.getenv("UPSTREAM_BASE_URL")
+if UPSTREAM_BASE_URL:
+    for urls in API_BASE_URLS.values():
+        urls.update({
+            "identity": f"{UPSTREAM_BASE_URL}/identity/v2.0",
+            "servers": UPSTREAM_BASE_URL + "/{region}/servers/v2/{tenant_id}",
+            "volumes": UPSTREAM_BASE_URL + "/{region}/blockstorage/v1/{tenant_id}",
+            "networking": UPSTREAM_BASE_URL + "/{region}/networks/v2.0"
+        })
+
+# Resource event stream (/events)
+EVENTS_POLL_INTERVAL = 5  # seconds between upstream polls per (environment, region, tenant)
+EVENTS_BUFFER_SIZE = 1000  # events kept in the ring buffer for Last-Event-ID resume
+EVENTS_SUBSCRIBER_QUEUE_SIZE = 256  # undelivered events per subscriber before it is dropped
+EVENTS_KEEPALIVE_INTERVAL = 15  # seconds
+
+# Idempotency-Key support on create endpoints
+IDEMPOTENCY_TTL = 24 * 60 * 60  # seconds a create result stays replayable, in the state backend
+IDEMPOTENCY_MAX_ENTRIES = 10000  # LRU bound on stored create results, across the workers sharing the backend
+
+# Read-through cache for single-resource GETs: seconds each resource type stays cached
+CACHE_TTLS = {
+    "servers": 5,
+    "volumes": 10,
+    "ports": 10,
+    "networks": 300,
+    "subnets": 300,
+    "security_groups": 120,
+    "keypairs": 300,
+}
+CACHE_NEGATIVE_TTL = 5  # seconds an upstream 404 is remembered
+CACHE_MAX_BYTES = 32 * 1024 * 1024  # LRU bound on cached response bodies
+
+# region=all list calls: seconds each region gets before it is reported as timed out
+FANOUT_REGION_TIMEOUT = 10
+
+# Fleet inventory (/inventory): OSPC and FLEX, every region, rebuilt at most this often
+INVENTORY_TTL = 30  # seconds
+INVENTORY_MAX_PAGES = 50  # pages followed per list call
+INVENTORY_BID_BANDS = (0.01, 0.05, 0.1, 0.5, 1.0)  # bid_price band edges
+
+# Ownership index behind mine=true listings (see ownership.py): seconds between reconciliations
+# against upstream; 0 disables them
+OWNERSHIP_RECONCILE_INTERVAL = float(os.getenv("OWNERSHIP_RECONCILE_INTERVAL", "60"))
+
+# Upstream health per (environment, region, service), see upstream/health.py and /health/upstreams
+HEALTH_EWMA_ALPHA = 0.2  # weight of the newest call in the latency and error-rate averages
+HEALTH_BREAKER_FAILURES = 5  # consecutive failures that open a breaker
+HEALTH_BREAKER_ERROR_RATE = 0.5  # ...or an error-rate average above this, once HEALTH_MIN_SAMPLES calls were seen
+HEALTH_MIN_SAMPLES = 10
+HEALTH_BREAKER_COOLDOWN = 30  # seconds an open breaker fails fast before letting one trial call through
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "30"))  # seconds between synthetic probes of idle regions; 0 disables
+HEALTH_PROBE_TIMEOUT = 5  # seconds
+HEALTH_ANY_ATTEMPTS = 2  # regions a region=any read tries, best first
+
+# Hedged upstream GETs for endpoints that opt in (see upstream/hedging.py)
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.05"))  # extra upstream calls allowed per hedgeable call; 0 disables hedging
+HEDGE_BURST = 10  # hedges that can be spent at once after a quiet spell
+HEDGE_QUANTILE = 0.95  # a hedge goes out once the first attempt is slower than this quantile of recent calls
+HEDGE_WINDOW = 500  # recent attempt latencies kept per endpoint
+HEDGE_MIN_SAMPLES = 50  # no hedging until an endpoint has this many samples
+HEDGE_MIN_DELAY = 0.01  # seconds; never hedge sooner than this
+
+# Request deadlines (see deadline.py): callers send X-Request-Timeout in seconds, otherwise the
+# route's @deadline default or DEADLINE_DEFAULT applies; upstream calls get what is left
+DEADLINE_DEFAULT = float(os.getenv("DEADLINE_DEFAULT", "60"))  # seconds
+DEADLINE_MAX = 600  # seconds; longer X-Request-Timeout values are capped to this
+
+# Adaptive concurrency of batch creates and multi-region listing per (region, service), see upstream/limiter.py
+LIMIT_INITIAL = 8  # concurrent upstream calls before anything is known
+LIMIT_MIN = 1
+LIMIT_MAX = 128
+LIMIT_TOLERANCE = 1.5  # back off once smoothed latency exceeds the no-load latency by this factor
+LIMIT_BACKOFF = 0.8  # multiplicative decrease when latency rises
+LIMIT_OVERLOAD_BACKOFF = 0.5  # multiplicative decrease on 429, 5xx and transport errors
+# No-load latency: the lowest mean latency of the last LIMIT_BASELINE_WINDOWS windows of
+# LIMIT_BASELINE_SAMPLES calls, so it follows a region that got slower for good and ignores jitter
+LIMIT_BASELINE_SAMPLES = 50
+LIMIT_BASELINE_WINDOWS = 10
+LIMIT_RETRIES = 3  # times a batch item answered 429 is sent again, each after the limit has been cut
+
+# Outbound scheduling (see scheduling.py): share of a (region, service) limit each priority class may fill,
+# so interactive reads always find free slots during bulk bursts. Keep shares non-increasing by priority:
+# a waiting class that may not fill a slot holds back every class below it
+SCHEDULER_CLASS_SHARES = {"interactive": 1.0, "polling": 0.75, "bulk": 0.75}
+# Weighted fair queueing across tenants (X-Tenant-Id) within a class, e.g. "ci=0.5,portal=4"; others weigh 1
+SCHEDULER_TENANT_WEIGHTS = {
+    tenant: float(weight)
+    for tenant, _, weight in (entry.partition("=") for entry in os.getenv("SCHEDULER_TENANT_WEIGHTS", "").split(",") if entry)
+}
+
+# Inbound rate limits (see ratelimit.py), token buckets per tenant (X-Tenant-Id, else client address):
+# RATE_LIMIT_RATE requests/s with bursts of RATE_LIMIT_BURST across all routes; 0 turns them off
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "50"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "100"))
+# X-Tenant-Id is the caller's word: every client address also gets one bucket across all its tenants,
+# so rotating the header does not lift the limit. Roomy for proxies serving many tenants; 0 turns it off
+RATE_LIMIT_ADDRESS_RATE = float(os.getenv("RATE_LIMIT_ADDRESS_RATE", "200"))
+RATE_LIMIT_ADDRESS_BURST = float(os.getenv("RATE_LIMIT_ADDRESS_BURST", "400"))
+# Tighter per-tenant buckets for expensive routes: "METHOD /path prefix" ("*" for any method) -> (rate, burst)
+RATE_LIMIT_ROUTES = {
+    "POST /servers": (2, 10),  # creates (up to a whole batch each), rebuilds, attachments
+    "POST /ports/ports": (5, 20),
+    "GET /ports/ports": (5, 20),  # lists every port of a region
+}
+RATE_LIMIT_MAX_KEYS = 10000  # buckets kept per rule; beyond that, a full (idle) one among the oldest is dropped
+RATE_LIMIT_SYNC_INTERVAL = float(os.getenv("RATE_LIMIT_SYNC_INTERVAL", "1"))  # seconds between usage exchanges through a shared STATE_BACKEND
+# Load shedding: 503 for everything but health and metrics once this many requests are being
+# handled, or once the event loop runs this many seconds late; 0 turns a check off
+SHED_MAX_INFLIGHT = int(os.getenv("SHED_MAX_INFLIGHT", "1000"))
+SHED_LOOP_LAG = float(os.getenv("SHED_LOOP_LAG", "0.25"))
+SHED_RETRY_AFTER = 1  # seconds
+
+# Event-loop monitor (see metrics/loop_monitor.py and /debug/loop)
+LOOP_HEARTBEAT_INTERVAL = 0.05  # seconds between heartbeats on the loop
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))  # seconds without a heartbeat before a stack is taken
+# Dev/test switch: also turn on asyncio debug mode and make raise_if_blocked() fail on any block
+LOOP_MONITOR_STRICT = os.getenv("LOOP_MONITOR_STRICT", "") not in ("", "0")
+
+# Token for the /debug admin endpoints (loop monitor, profilers); they are disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Upstream connection pool of the shared client (see serve.py); per-request clients keep httpx defaults
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "200"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "50"))
+UPSTREAM_KEEPALIVE_EXPIRY = 60  # seconds an idle upstream connection is kept open
+
+# One pooled client per worker, opened by the app lifespan. Requests outside a lifespan
+# (tests, ASGITransport) fall back to a client of their own.
+shared_client = None
+
+def open_shared_client(transport=None):
+    global shared_client
+    if shared_client is None:
+        transport = transport or httpx.AsyncHTTPTransport(limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+        ))
+        shared_client = httpx.AsyncClient(transport=InstrumentedTransport(TracingTransport(transport)))
+    return shared_client
+
+async def close_shared_client():
+    global shared_client
+    client, shared_client = shared_client, None
+    if client is not None:
+        await client.aclose()
+
 async def get_async_client():
-    async with httpx.AsyncClient() as client:
+    if shared_client is not None:
+        yield shared_client
+        return
+    async with httpx.AsyncClient(transport=InstrumentedTransport(TracingTransport())) as client:
         yield client
 
-#######################  Temporary in-memory storage for Redis-like functionality ##################
-# TODO: Replace with Redis or another persistent storage solution once ready
-### Won't work for multi-process applications, but suitable for single-process FastAPI apps ###
-### Move to Redis later
-
-temporary_redis = {
-    env.value: {
-        region.value: {
-            "auth_token": None,
-            "expires": None,
-            "tenant_id": None,
-        } for region in RegionName
-    } for env in CloudEnvironment
-}
+#######################  Shared state for tokens and caches ##################
+# Backed by state.get_backend(): set STATE_BACKEND to "memory" (default, single process),
+# "sqlite:///path/to/state.db" (several workers on one host) or "redis://host:port/db" (fleet wide)
+# so every uvicorn worker shares one token and one set of caches.
 
-# Lock map 
-lock_map = defaultdict(asyncio.Lock)
+def token_key(env, region):
+    return f"token:{env}:{region}"
 
 # Read (no lock needed)
-def get_token(env, region):
-    return temporary_redis[env][region]
-
-# Write (with lock)
-async def update_token(env, region, token_data):
-    key = f"{env}:{region}"
-    async with lock_map[key]:
-        temporary_redis[env][region] = token_data
+async def get_token(env, region):
+    return await get_backend().get(token_key(env, region))
+
+# Write (kept until the token itself expires)
+async def update_token(env, region, token_data, ttl=None):
+    await get_backend().set(token_key(env, region), token_data, ttl)
+
+def token_lock(env, region):
+    """Cross-process lock so only one worker refreshes a given token at a time."""
+    return get_backend().lock(f"token-refresh:{env}:{region}")
 
 #################################################################################################
\ No newline at end of file
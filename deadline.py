@@ -0,0 +1,106 @@
+import asyncio
+import contextvars
+import functools
+import time
+
+from typing import Awaitable, Optional, Tuple, TypeVar
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from config import DEADLINE_DEFAULT, DEADLINE_MAX
+from metrics import Counter
+
+
+DEADLINE_HEADER = b"x-request-timeout"
+
+T = TypeVar("T")
+
+# (time.monotonic() deadline, whether the caller set it) for the current request
+current_deadline: contextvars.ContextVar[Optional[Tuple[float, bool]]] = contextvars.ContextVar("current_deadline", default=None)
+
+deadlines_exceeded = Counter("request_deadline_exceeded_total", "Upstream calls refused or cut short because the request's deadline passed", ("service", "stage"))
+
+
+class DeadlineExceeded(HTTPException):
+    def __init__(self, detail: str = "Request deadline exceeded"):
+        super().__init__(status_code=504, detail=detail)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a request."""
+    deadline = current_deadline.get()
+    return None if deadline is None else deadline[0] - time.monotonic()
+
+
+def budget_for(service: str) -> Optional[float]:
+    """The current request's remaining budget for an upstream call; 504 when nothing is left."""
+    budget = remaining()
+    if budget is not None and budget <= 0:
+        deadlines_exceeded.labels(service, "before_send").inc()
+        raise DeadlineExceeded()
+    return budget
+
+
+async def within_deadline(call: Awaitable[T], budget: float, service: str, stage: str = "in_flight") -> T:
+    """Await an upstream call for at most `budget` seconds; past that it is cancelled (closing its connection) and 504."""
+    try:
+        return await asyncio.wait_for(call, budget)
+    except asyncio.TimeoutError:
+        deadlines_exceeded.labels(service, stage).inc()
+        raise DeadlineExceeded() from None
+
+
+def deadline(seconds: float):
+    """
+    Budget for a route when the caller sent no X-Request-Timeout, e.g. a batch create that
+    legitimately needs longer than DEADLINE_DEFAULT:
+        @deadline(300)
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            current = current_deadline.get()
+            if current is not None and current[1]:
+                return await endpoint(*args, **kwargs)
+            token = current_deadline.set((time.monotonic() + seconds, False))
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                current_deadline.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware turning X-Request-Timeout (seconds the caller will wait, capped at
+    DEADLINE_MAX) into the request's deadline, DEADLINE_DEFAULT when absent. Upstream calls
+    made while handling the request get the remaining budget as their timeout, see
+    within_deadline. Streaming bodies are not cut off; their upstream calls are.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = dict(scope["headers"]).get(DEADLINE_HEADER)
+        budget, explicit = DEADLINE_DEFAULT, False
+        if header is not None:
+            try:
+                budget, explicit = min(float(header), DEADLINE_MAX), True
+            except ValueError:
+                budget = 0
+            if not budget > 0:
+                response = JSONResponse({"detail": "X-Request-Timeout must be a positive number of seconds"}, status_code=400)
+                await response(scope, receive, send)
+                return
+        token = current_deadline.set((time.monotonic() + budget, explicit))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_deadline.reset(token)
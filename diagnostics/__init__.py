@@ -0,0 +1,3 @@
+from .diagnostics import router as diagnostics_router
+
+__all__ = ["diagnostics_router"]
\ No newline at end of file
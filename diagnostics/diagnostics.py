@@ -0,0 +1,69 @@
+import asyncio
+import hmac
+import threading
+
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from config import ADMIN_TOKEN
+from metrics import loop_monitor
+from .profiler import sample_stacks, collapsed, allocation_diff
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Every /debug endpoint needs X-Admin-Token; they are disabled entirely while ADMIN_TOKEN is unset."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/debug", tags=["debug"], dependencies=[Depends(require_admin)])
+
+# One profile at a time per worker: overlapping samplers would skew each other
+profile_lock = asyncio.Lock()
+
+
+@router.get("/loop")
+async def loop_status():
+    """
+    Event-loop health: worst lag seen, and the stacks of recent callbacks that blocked
+    the loop for longer than LOOP_BLOCK_THRESHOLD.
+    """
+    loop_monitor.ensure_started()
+    return loop_monitor.snapshot()
+
+
+@router.post("/profile/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(10, gt=0, le=120),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    all_threads: bool = False
+):
+    """
+    Sample this worker's stacks for `seconds` and return them in collapsed-stack format
+    (flamegraph.pl, speedscope). Samples the event loop thread unless all_threads is set.
+    """
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+    async with profile_lock:
+        thread_id = None if all_threads else threading.get_ident()
+        stacks = await asyncio.to_thread(sample_stacks, seconds, interval_ms / 1000, thread_id)
+    return PlainTextResponse(collapsed(stacks))
+
+
+@router.post("/profile/memory")
+async def profile_memory(
+    seconds: float = Query(10, gt=0, le=120),
+    top: int = Query(25, ge=1, le=500),
+    frames: int = Query(1, ge=1, le=50)
+):
+    """
+    Trace allocations for `seconds` and return the call sites whose memory grew the most.
+    frames > 1 groups by call stack instead of by line.
+    """
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+    async with profile_lock:
+        return await asyncio.to_thread(allocation_diff, seconds, top, frames)
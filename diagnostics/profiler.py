@@ -0,0 +1,75 @@
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from typing import Optional
+
+
+def frame_name(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(seconds: float, interval: float, thread_id: Optional[int]) -> collections.Counter:
+    """
+    Statistical CPU profile: every `interval` seconds, record the Python stack of the target thread
+    (every other thread when thread_id is None). Meant to run on its own thread; nothing is
+    installed in the interpreter, so the profiled code runs at full speed between samples.
+    """
+    own_id = threading.get_ident()
+    stacks = collections.Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for tid, frame in sys._current_frames().items():
+            if tid == own_id or (thread_id is not None and tid != thread_id):
+                continue
+            names = []
+            while frame is not None:
+                names.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            stacks[";".join(reversed(names))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapsed(stacks: collections.Counter) -> str:
+    """Brendan Gregg's collapsed-stack format, ready for flamegraph.pl or speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def allocation_diff(seconds: float, top: int, frames: int) -> dict:
+    """
+    Trace allocations for `seconds` and report the call sites whose live memory grew the most.
+    tracemalloc is only switched on for the duration of the call.
+    """
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start(frames)
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        if not already_tracing:
+            tracemalloc.stop()
+
+    key = "traceback" if frames > 1 else "lineno"
+    stats = after.compare_to(before, key)
+    return {
+        "seconds": seconds,
+        "traced_bytes": traced_current,
+        "traced_peak_bytes": traced_peak,
+        "top": [
+            {
+                "size_diff_bytes": stat.size_diff,
+                "size_bytes": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+                "traceback": stat.traceback.format(),
+            }
+            for stat in stats[:top]
+        ],
+    }
@@ -0,0 +1,3 @@
+from .events import router as events_router
+
+__all__ = ["events_router"]
\ No newline at end of file
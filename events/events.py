@@ -0,0 +1,293 @@
+import asyncio
+import json
+import uuid
+import httpx
+
+from collections import deque
+from typing import Dict, Optional, Set
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+
+from config import get_async_client, EVENTS_POLL_INTERVAL, EVENTS_BUFFER_SIZE, EVENTS_SUBSCRIBER_QUEUE_SIZE, EVENTS_KEEPALIVE_INTERVAL
+from inventory.inventory import list_all
+from models import RegionName, CloudEnvironment
+from scheduling import POLLING, background_task, current_priority
+from state import get_backend, run_elected
+from upstream import get_upstream
+
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+# Resource type -> (UpstreamClient service, path, collection key in the upstream response)
+RESOURCE_SOURCES = {
+    "servers": ("servers", "/servers/detail", "servers"),
+    "volumes": ("volumes", "/volumes/detail", "volumes"),
+    "ports": ("networking", "/ports", "ports"),
+}
+SHARED_POLLS = 2  # polls whose events the leader shares, so a follower that misses one still gets them
+
+
+def diff_snapshots(resource: str, old: Dict[str, dict], new: Dict[str, dict]) -> list:
+    """
+    Compare two {id: item} snapshots of one resource type and return the change events.
+    """
+    changes = []
+    for resource_id, item in new.items():
+        previous = old.get(resource_id)
+        if previous is None:
+            changes.append(("created", resource, resource_id, item))
+        elif previous.get("status") != item.get("status"):
+            changes.append(("status_changed", resource, resource_id, item))
+        elif previous != item:
+            changes.append(("updated", resource, resource_id, item))
+    for resource_id, item in old.items():
+        if resource_id not in new:
+            changes.append(("deleted", resource, resource_id, item))
+    return changes
+
+
+class Subscriber:
+    """A single SSE client with its own bounded queue and filters."""
+
+    def __init__(self, types: Optional[Set[str]], ids: Optional[Set[str]]):
+        self.types = types
+        self.ids = ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENTS_SUBSCRIBER_QUEUE_SIZE)
+        self.lagged = False
+
+    def wants(self, event: dict) -> bool:
+        if event["type"] == "reset":
+            return True
+        if self.types and event["resource"] not in self.types:
+            return False
+        if self.ids and event["resource_id"] not in self.ids:
+            return False
+        return True
+
+
+class EventFeed:
+    """
+    One upstream diffing poller per (environment, region, tenant) shared by all its subscribers.
+    The poller only runs while at least one subscriber is connected.
+
+    Event IDs are one sequence per feed across workers: the leader numbers the events and shares
+    them with its snapshot, and the other workers deliver those same events. The SSE id is
+    "<epoch>-<id>", the epoch naming the sequence; a Last-Event-ID from another epoch, or events
+    a follower could not get, make the stream send `reset` so the client re-lists.
+    """
+
+    def __init__(self, cloud_environment: CloudEnvironment, region: RegionName, tenant_id: str):
+        self.cloud_environment = cloud_environment
+        self.region = region
+        self.name = f"events:{cloud_environment.value}:{region.value}:{tenant_id}"
+        self.buffer: deque = deque(maxlen=EVENTS_BUFFER_SIZE)
+        self.epoch: Optional[str] = None
+        self.last_id = 0
+        self.recent: deque = deque(maxlen=SHARED_POLLS)  # the leader's events of its last polls
+        self.subscribers: Set[Subscriber] = set()
+        self.snapshots: Dict[str, Dict[str, dict]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def publish(self, kind: str, resource: str, resource_id: str, item: dict) -> dict:
+        self.last_id += 1
+        event = {
+            "id": self.last_id,
+            "type": kind,
+            "resource": resource,
+            "resource_id": resource_id,
+            "status": item.get("status"),
+            "data": item,
+        }
+        self.deliver(event)
+        return event
+
+    def reset(self):
+        """Subscribers may have missed events that cannot be replayed: tell them to re-list."""
+        self.deliver({"id": self.last_id, "type": "reset"})
+        self.buffer.clear()  # nothing before it can be replayed
+
+    def deliver(self, event: dict):
+        self.buffer.append(event)
+        for subscriber in self.subscribers:
+            if subscriber.lagged or not subscriber.wants(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: drop it, the client reconnects with Last-Event-ID
+                subscriber.lagged = True
+
+    def replay_since(self, last_event_id: int) -> Optional[list]:
+        """
+        Return buffered events newer than last_event_id, or None if the ring buffer no longer covers it.
+        """
+        if last_event_id == self.last_id:
+            return []
+        if last_event_id > self.last_id or not self.buffer or self.buffer[0]["id"] > last_event_id + 1:
+            return None
+        return [event for event in self.buffer if event["id"] > last_event_id]
+
+    def subscribe(self, subscriber: Subscriber, client: httpx.AsyncClient):
+        self.subscribers.add(subscriber)
+        if self.task is None or self.task.done():
+            self.task = background_task(self.run(client))
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def fetch(self, client: httpx.AsyncClient) -> Dict[str, Dict[str, dict]]:
+        upstream = await get_upstream(self.cloud_environment, self.region, client)
+
+        async def fetch_one(resource: str) -> Dict[str, dict]:
+            items, complete = await list_all(upstream, *RESOURCE_SOURCES[resource])
+            listed = {item["id"]: item for item in items}
+            # Past the last page read, keep what the previous poll saw rather than report it deleted
+            return listed if complete else {**self.snapshots.get(resource, {}), **listed}
+
+        results = await asyncio.gather(*(fetch_one(resource) for resource in RESOURCE_SOURCES))
+        return dict(zip(RESOURCE_SOURCES.keys(), results))
+
+    def apply(self, snapshots: Dict[str, Dict[str, dict]]) -> list:
+        events = []
+        for resource, snapshot in snapshots.items():
+            # The first poll only seeds the snapshot, it does not emit events
+            if resource in self.snapshots:
+                for change in diff_snapshots(resource, self.snapshots[resource], snapshot):
+                    events.append(self.publish(*change))
+            self.snapshots[resource] = snapshot
+        return events
+
+    def follow(self, shared: dict):
+        """Take the leader's snapshot and deliver the events this worker has not delivered yet."""
+        if shared["epoch"] != self.epoch:
+            if self.epoch is not None:
+                self.last_id = shared["last_id"]
+                self.reset()  # another sequence: our IDs mean nothing in it
+            self.epoch, self.last_id = shared["epoch"], shared["last_id"]
+        elif shared["last_id"] > self.last_id:
+            missed = [event for event in shared["events"] if event["id"] > self.last_id]
+            if not missed or missed[0]["id"] != self.last_id + 1:
+                self.last_id = shared["last_id"]
+                self.reset()
+            else:
+                for event in missed:
+                    self.deliver(event)
+                self.last_id = shared["last_id"]
+        self.snapshots = shared["snapshots"]
+
+    async def run(self, client: httpx.AsyncClient):
+        """
+        Only the leader worker for this feed polls upstream and shares its snapshot and events
+        through the state backend; the other workers deliver those instead of polling themselves.
+        Polls go through the subscriber's get_async_client client, the shared instrumented one,
+        so they show in upstream metrics and traces and reuse its UpstreamClient and token.
+        """
+        current_priority.set(POLLING)  # polls queue behind interactive calls
+        snapshot_key = f"{self.name}:snapshot"
+        backend = get_backend()
+
+        async def poll():
+            if self.epoch is None:
+                shared = await backend.get(snapshot_key)
+                if shared:
+                    self.follow(shared)  # take over the sequence of the previous leader
+                else:
+                    self.epoch = uuid.uuid4().hex[:8]
+            snapshots = await self.fetch(client)
+            self.recent.append(self.apply(snapshots))
+            shared = {
+                "epoch": self.epoch,
+                "last_id": self.last_id,
+                "snapshots": snapshots,
+                "events": [event for events in self.recent for event in events],
+            }
+            await backend.set(snapshot_key, shared, ttl=EVENTS_POLL_INTERVAL * 3)
+
+        async def follow():
+            shared = await backend.get(snapshot_key)
+            if shared:
+                self.recent.clear()  # a follower's events are the leader's to share
+                self.follow(shared)
+
+        await run_elected(self.name, poll, EVENTS_POLL_INTERVAL, on_follow=follow)
+
+
+# (environment, region, tenant_id) -> EventFeed
+feeds: Dict[tuple, EventFeed] = {}
+
+
+def get_feed(cloud_environment: CloudEnvironment, region: RegionName, tenant_id: str) -> EventFeed:
+    key = (cloud_environment.value, region.value, tenant_id)
+    if key not in feeds:
+        feeds[key] = EventFeed(cloud_environment, region, tenant_id)
+    return feeds[key]
+
+
+def format_sse(feed: EventFeed, event: dict) -> str:
+    # No id before the feed has joined a sequence: there is nothing to resume from yet
+    event_id = f"id: {feed.epoch}-{event['id']}\n" if feed.epoch is not None else ""
+    return f"{event_id}event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def parse_event_id(feed: EventFeed, value: str) -> Optional[int]:
+    """The event number of a Last-Event-ID from this feed's current sequence, else None."""
+    epoch, _, number = value.rpartition("-")
+    return int(number) if epoch == feed.epoch and number.isdigit() else None
+
+
+def parse_csv(value: Optional[str]) -> Optional[Set[str]]:
+    if not value:
+        return None
+    return {part.strip() for part in value.split(",") if part.strip()}
+
+
+@router.get("/", tags=["Resource Events"])
+@router.get("")
+async def stream_events(
+    region: RegionName,
+    types: Optional[str] = Query(None, description="Comma separated resource types: servers, volumes, ports"),
+    ids: Optional[str] = Query(None, description="Comma separated resource IDs to follow"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    cloud_environment: CloudEnvironment = CloudEnvironment.OSPC,
+    client: httpx.AsyncClient = Depends(get_async_client)
+):
+    """
+    Server-sent event stream of create/update/delete/status-change events for servers, volumes and ports.
+    Reconnecting clients send Last-Event-ID to resume from the in-memory ring buffer; a `reset`
+    event means events were lost and the client should re-list.
+    """
+    upstream = await get_upstream(cloud_environment, region, client)
+    feed = get_feed(cloud_environment, region, upstream.tenant_id)
+    subscriber = Subscriber(parse_csv(types), parse_csv(ids))
+
+    async def event_stream():
+        feed.subscribe(subscriber, client)
+        try:
+            if last_event_id:
+                number = parse_event_id(feed, last_event_id)
+                missed = feed.replay_since(number) if number is not None else None
+                if missed is None:
+                    # Too far behind the ring buffer, or an ID from another sequence: the client must re-list to resync
+                    yield format_sse(feed, {"id": feed.last_id, "type": "reset"})
+                else:
+                    for event in missed:
+                        if subscriber.wants(event):
+                            yield format_sse(feed, event)
+            while not subscriber.lagged:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), EVENTS_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(feed, event)
+        finally:
+            feed.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,3 @@
+from .fake_openstack import FakeOpenStack, LatencyModel, create_app
+
+__all__ = ["FakeOpenStack", "LatencyModel", "create_app"]
\ No newline at end of file
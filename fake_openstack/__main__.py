@@ -0,0 +1,40 @@
+"""
+Run the fake cloud as a standalone server:
+    python -m fake_openstack --port 9000 --latency lognormal:0.05:0.5 --error-rate 0.01 --throttle-rate 0.01
+"""
+import argparse
+import uvicorn
+
+from .fake_openstack import FakeOpenStack
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default="none", help="none | fixed:S | uniform:LOW:HIGH | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--region-latency", default="", help="Per-region overrides, e.g. syd=lognormal:0.3:0.3,hkg=fixed:0.4")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 500")
+    parser.add_argument("--region-error-rate", default="", help="Per-region overrides, e.g. lon=0.5,syd=1")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--build-time", type=float, default=2.0, help="Seconds from BUILD to ACTIVE")
+    parser.add_argument("--volume-time", type=float, default=1.0, help="Seconds from creating to available")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--capacity", type=int, default=0, help="Requests each region's service works on at once (0 = unlimited)")
+    parser.add_argument("--queue-limit", type=int, default=0, help="Requests waiting for capacity before 429s")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    cloud = FakeOpenStack(
+        latency=args.latency,
+        region_latency=dict(entry.split("=", 1) for entry in args.region_latency.split(",") if entry),
+        error_rate=args.error_rate,
+        region_error_rate={region: float(rate) for region, rate in (entry.split("=", 1) for entry in args.region_error_rate.split(",") if entry)},
+        throttle_rate=args.throttle_rate,
+        build_time=args.build_time,
+        volume_time=args.volume_time,
+        page_size=args.page_size,
+        capacity=args.capacity,
+        queue_limit=args.queue_limit,
+        seed=args.seed,
+    )
+    uvicorn.run(cloud.asgi, host=args.host, port=args.port, interface="asgi3", log_level="warning")
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import time
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from config import FANOUT_REGION_TIMEOUT, HEALTH_ANY_ATTEMPTS
+from metrics import Counter, Histogram
+from models import CloudEnvironment, RegionName
+from upstream import upstream_health
+from upstream.limiter import Batch, current_batch
+
+
+fanout_results = Counter("fanout_region_results_total", "region=all calls per region by result (ok, timeout, error)", ("route", "region", "result"))
+fanout_duration = Histogram("fanout_region_duration_seconds", "Time until each region answered a region=all call", ("route", "region"))
+
+
+async def fetch_region(route: str, region: RegionName, fetch: Callable[[RegionName], Awaitable[Any]], timeout: float) -> tuple:
+    """(region, result, error) for one region; errors are returned, never raised."""
+    started = time.perf_counter()
+    result, error = None, None
+    try:
+        result = await asyncio.wait_for(fetch(region), timeout)
+    except asyncio.TimeoutError:
+        error = "timeout"
+    except HTTPException as e:
+        error = f"upstream status {e.status_code}"
+    except Exception as e:
+        # Anything else too: once the stream has started, a raise would cut it off without its summary line
+        error = f"{type(e).__name__}: {e}"
+    fanout_results.labels(route, region.value, "ok" if error is None else "timeout" if error == "timeout" else "error").inc()
+    fanout_duration.labels(route, region.value).observe(time.perf_counter() - started)
+    return region, result, error
+
+
+async def fan_out(route: str, collection: str, fetch: Callable[[RegionName], Awaitable[dict]], timeout: Optional[float] = None) -> AsyncIterator[bytes]:
+    """
+    Call fetch(region) for every RegionName at once and stream NDJSON as regions answer:
+        {"region": "dfw", "server": {...}}            one line per item of the region's `collection` list
+        {"region": "syd", "error": "timeout"}          a region that failed or missed its deadline
+        {"complete": false, "regions": {"dfw": "ok", "syd": "timeout", ...}}   always the last line
+    Fast regions are never held back by slow ones, and one bad region only makes the result partial.
+    """
+    timeout = timeout or FANOUT_REGION_TIMEOUT
+    item_key = collection[:-1]
+    # Region calls share each region's adaptive limit with batch creates (see upstream/limiter.py)
+    token = current_batch.set(Batch(route))
+    try:
+        tasks = [asyncio.create_task(fetch_region(route, region, fetch, timeout)) for region in RegionName]
+    finally:
+        current_batch.reset(token)
+    statuses = {}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            region, body, error = await next_done
+            statuses[region.value] = error or "ok"
+            if error is not None:
+                yield (json.dumps({"region": region.value, "error": error}) + "\n").encode()
+                continue
+            items = body.get(collection, []) if isinstance(body, dict) else []
+            if items:
+                yield "".join(json.dumps({"region": region.value, item_key: item}) + "\n" for item in items).encode()
+    finally:
+        # Client went away mid-stream: stop waiting on the slow regions
+        for task in tasks:
+            task.cancel()
+    summary = {"complete": all(status == "ok" for status in statuses.values()), "regions": {region.value: statuses[region.value] for region in RegionName}}
+    yield (json.dumps(summary) + "\n").encode()
+
+
+def fan_out_response(route: str, collection: str, fetch: Callable[[RegionName], Awaitable[dict]]) -> StreamingResponse:
+    return StreamingResponse(fan_out(route, collection, fetch), media_type="application/x-ndjson")
+
+
+async def any_region(route: str, cloud_environment: CloudEnvironment, service: str, fetch: Callable[[RegionName], Awaitable[dict]]) -> dict:
+    """
+    region=any: fetch(region) from the best region upstream_health knows of for `service`,
+    moving on to the next best when it fails, up to HEALTH_ANY_ATTEMPTS regions. The body
+    says which region answered: {"region": "iad", "servers": [...]}.
+    """
+    tried = {}
+    for region in upstream_health.ranked_regions(cloud_environment, service)[:HEALTH_ANY_ATTEMPTS]:
+        _, body, error = await fetch_region(route, region, fetch, FANOUT_REGION_TIMEOUT)
+        if error is None:
+            return {"region": region.value, **body}
+        tried[region.value] = error
+    detail = "; ".join(f"{region}: {error}" for region, error in tried.items()) or "every region's breaker is open"
+    raise HTTPException(status_code=503, detail=f"No region could serve {service}: {detail}")
+
+
+def pick_region(cloud_environment: CloudEnvironment, service: str) -> RegionName:
+    """The region a placement-agnostic create should go to, or 503 when every breaker is open."""
+    ranked = upstream_health.ranked_regions(cloud_environment, service)
+    if not ranked:
+        raise HTTPException(status_code=503, detail=f"No healthy region for {service}; see /health/upstreams")
+    return ranked[0]
@@ -0,0 +1,3 @@
+from .health import router as health_router
+
+__all__ = ["health_router"]
\ No newline at end of file
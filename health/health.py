@@ -0,0 +1,37 @@
+from typing import Optional
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from config import HEALTH_PROBE_INTERVAL, HEALTH_BREAKER_COOLDOWN
+from models import CloudEnvironment
+from upstream import upstream_health
+
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/upstreams")
+async def upstreams_health(cloud_environment: Optional[CloudEnvironment] = None, service: Optional[str] = None):
+    """
+    Latency, error rate and breaker state per environment, region and upstream service, as seen
+    by this worker. 503 when every region seen for some environment's service has an open
+    breaker, so a load balancer can steer traffic to a worker or site that can still reach it.
+    """
+    entries = [
+        entry for entry in upstream_health.snapshot()
+        if (cloud_environment is None or entry["cloud_environment"] == cloud_environment.value)
+        and (service is None or entry["service"] == service)
+    ]
+    usable = {}
+    for entry in entries:
+        group = (entry["cloud_environment"], entry["service"])
+        usable[group] = usable.get(group, False) or entry["state"] != "open"
+    unavailable = sorted(f"{environment}:{name}" for (environment, name), ok in usable.items() if not ok)
+    body = {
+        "healthy": not unavailable,
+        "unavailable": unavailable,
+        "probe_interval_s": HEALTH_PROBE_INTERVAL,
+        "breaker_cooldown_s": HEALTH_BREAKER_COOLDOWN,
+        "upstreams": entries,
+    }
+    return JSONResponse(body, status_code=200 if not unavailable else 503)
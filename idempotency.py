@@ -0,0 +1,162 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import time
+import zlib
+import httpx
+
+from typing import Dict, Optional, Tuple
+from fastapi import Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from config import IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_ENTRIES, DEADLINE_MAX
+from metrics import Counter, Gauge
+from scheduling import current_tenant
+from state import StateBackend, get_backend
+
+
+idempotency_requests = Counter(
+    "idempotency_requests_total",
+    "Create requests carrying an Idempotency-Key, by outcome (new, replayed, joined)",
+    ("route", "outcome")
+)
+idempotency_evictions = Counter("idempotency_evictions_total", "Stored create results evicted to stay within IDEMPOTENCY_MAX_ENTRIES")
+
+INDEX_KEY = "idempotency:index"  # :<shard> -> stored key -> time last stored or replayed, oldest first
+INDEX_SHARDS = 64  # small index values to rewrite per create; each holds its share of max_entries
+INDEX_CAS_ATTEMPTS = 5
+
+
+class IdempotencyStore:
+    """
+    Create results keyed by caller, route and Idempotency-Key.
+
+    A create first claims its key in the state backend (get_backend()) with a pending record,
+    and replaces it with the result once it succeeds, for IDEMPOTENCY_TTL seconds; a failed
+    create drops its claim so the client can retry with the same key. A retry on any worker
+    sharing the backend replays the stored result. A concurrent duplicate on the same worker
+    awaits the original; one on another worker gets 409 while the original is running.
+    The claim expires after DEADLINE_MAX in case its worker dies mid-create.
+
+    Stored results are bounded to about max_entries, least recently used evicted first, through
+    an index in the backend split over INDEX_SHARDS keys by a hash of the store key.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.inflight: Dict[str, Tuple[asyncio.Future, str]] = {}  # key -> (create task, fingerprint)
+
+    def __len__(self):
+        return len(self.inflight)
+
+    async def run(self, route: str, key: str, fingerprint: str, create):
+        entry = self.inflight.get(key)
+        if entry is not None:
+            self.check_fingerprint(entry[1], fingerprint)
+            idempotency_requests.labels(route, "joined").inc()
+            return await asyncio.shield(entry[0])
+
+        backend = get_backend()
+        pending = {"fingerprint": fingerprint, "pending": True}
+        while not await backend.compare_and_set(key, None, pending, ttl=DEADLINE_MAX):
+            stored = await backend.get(key)
+            if stored is None:
+                continue  # expired or dropped in between: claim it again
+            self.check_fingerprint(stored["fingerprint"], fingerprint)
+            if stored.get("pending"):
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+            idempotency_requests.labels(route, "replayed").inc()
+            await self.remember(backend, key)
+            return stored["result"]
+
+        idempotency_requests.labels(route, "new").inc()
+        # Run the create as its own task so a client disconnect cannot abort it half way:
+        # the retry that follows must find the finished result.
+        future = asyncio.ensure_future(self.create_and_store(backend, key, pending, create))
+        self.inflight[key] = (future, fingerprint)
+        future.add_done_callback(lambda done: self.inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def create_and_store(self, backend: StateBackend, key: str, pending: dict, create):
+        try:
+            result = await create()
+        except BaseException:
+            # Failed creates are not stored, so the client can retry them with the same key
+            await backend.compare_and_delete(key, pending)
+            raise
+        await backend.set(key, {"fingerprint": pending["fingerprint"], "result": jsonable_encoder(result)}, ttl=self.ttl)
+        await self.remember(backend, key)
+        return result
+
+    async def remember(self, backend: StateBackend, key: str):
+        """
+        Move key to the recent end of its index shard and evict the least recently used results
+        past the shard's share of max_entries. Left to the TTL when it keeps losing races.
+        """
+        shard = f"{INDEX_KEY}:{zlib.crc32(key.encode()) % INDEX_SHARDS}"
+        limit = max(1, self.max_entries // INDEX_SHARDS)
+        now = time.time()
+        for _ in range(INDEX_CAS_ATTEMPTS):
+            current = await backend.get(shard)
+            index = {stored: at for stored, at in (current or {}).items() if stored != key and now - at < self.ttl}
+            index[key] = now
+            evicted = list(index)[:max(0, len(index) - limit)]
+            for stored in evicted:
+                del index[stored]
+            if await backend.compare_and_set(shard, current, index, ttl=self.ttl):
+                break
+        else:
+            return
+        for stored_key in evicted:
+            stored = await backend.get(stored_key)
+            if stored is not None and not stored.get("pending"):  # not a fresh claim of the same key
+                await backend.compare_and_delete(stored_key, stored)
+                idempotency_evictions.inc()
+
+    @staticmethod
+    def check_fingerprint(stored: str, fingerprint: str):
+        if stored != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used with a different request"
+            )
+
+
+store = IdempotencyStore()
+
+Gauge("idempotency_inflight", "Creates carrying an Idempotency-Key still running in this worker", collect=lambda: {(): len(store)})
+
+
+def request_fingerprint(kwargs: dict) -> str:
+    payload = {name: value for name, value in kwargs.items() if not isinstance(value, httpx.AsyncClient)}
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode()).hexdigest()
+
+
+def idempotent(route: str):
+    """
+    Add Idempotency-Key header support to a create endpoint.
+    Requests without the header go straight to the endpoint as before.
+    """
+    def decorator(endpoint):
+        signature = inspect.signature(endpoint)
+        key_param = inspect.Parameter(
+            "idempotency_key",
+            inspect.Parameter.KEYWORD_ONLY,
+            default=Header(None, alias="Idempotency-Key"),
+            annotation=Optional[str]
+        )
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, idempotency_key: Optional[str] = None, **kwargs):
+            if not idempotency_key:
+                return await endpoint(*args, **kwargs)
+            key = f"idempotency:{current_tenant.get()}:{route}:{idempotency_key}"
+            return await store.run(route, key, request_fingerprint(kwargs), lambda: endpoint(*args, **kwargs))
+
+        wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), key_param])
+        return wrapper
+
+    return decorator
@@ -0,0 +1,3 @@
+from .inventory import router as inventory_router, inventory, InventoryIndex
+
+__all__ = ["inventory_router", "inventory", "InventoryIndex"]
\ No newline at end of file
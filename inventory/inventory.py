@@ -0,0 +1,263 @@
+import asyncio
+import bisect
+import time
+import httpx
+
+from collections import Counter as Tally
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from config import get_async_client, FANOUT_REGION_TIMEOUT, INVENTORY_TTL, INVENTORY_MAX_PAGES, INVENTORY_BID_BANDS
+from metrics import Gauge, Histogram
+from models import CloudEnvironment, RegionName
+from scheduling import POLLING, background_task, current_priority
+from upstream import get_upstream, UpstreamClient
+from upstream.limiter import Batch, current_batch
+
+
+router = APIRouter(prefix="/inventory", tags=["inventory"])
+
+# Resource kind -> (UpstreamClient service, list path, collection key)
+INVENTORY_SOURCES = {
+    "servers": ("servers", "/servers/detail", "servers"),
+    "volumes": ("volumes", "/volumes/detail", "volumes"),
+    "ports": ("networking", "/ports", "ports"),
+}
+GROUP_FIELDS = ("cloud_environment", "region", "status", "tenant_id", "flavor", "bid_band", "volume_type")
+
+inventory_refresh_duration = Histogram("inventory_refresh_seconds", "Time to rebuild the fleet inventory across environments and regions", buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+
+def bid_band(bid_price) -> str:
+    """Bucket a server's bid_price metadata into INVENTORY_BID_BANDS, e.g. "0.05-0.1" or "1+"."""
+    try:
+        price = float(bid_price)
+    except (TypeError, ValueError):
+        return "none"
+    index = bisect.bisect_right(INVENTORY_BID_BANDS, price)
+    if index == len(INVENTORY_BID_BANDS):
+        return f"{INVENTORY_BID_BANDS[-1]:g}+"
+    low = INVENTORY_BID_BANDS[index - 1] if index else 0
+    return f"{low:g}-{INVENTORY_BID_BANDS[index]:g}"
+
+
+def normalize(kind: str, item: dict, upstream: UpstreamClient) -> dict:
+    """One compact record per resource, the same fields whichever service and environment it came from."""
+    record = {
+        "kind": kind,
+        "id": item["id"],
+        "cloud_environment": upstream.cloud_environment.value,
+        "region": upstream.region.value,
+        "status": str(item.get("status", "")).upper(),
+        "tenant_id": item.get("tenant_id") or item.get("os-vol-tenant-attr:tenant_id") or upstream.tenant_id,
+        "name": item.get("name") or item.get("display_name"),
+    }
+    if kind == "servers":
+        metadata = item.get("metadata") or {}
+        flavor = item.get("flavor") or {}
+        record["flavor"] = flavor.get("id") or flavor.get("original_name") or metadata.get("flavor")
+        record["bid_band"] = bid_band(metadata.get("bid_price"))
+        image = item.get("image")
+        record["image"] = image.get("id") if isinstance(image, dict) else None  # "" when booted from a volume
+    elif kind == "volumes":
+        attachments = item.get("attachments") or []
+        record["size_gb"] = item.get("size")
+        record["volume_type"] = item.get("volume_type")
+        record["server_id"] = attachments[0].get("server_id") if attachments else None
+    else:
+        record["network_id"] = item.get("network_id")
+        record["server_id"] = item.get("device_id") or None
+    return record
+
+
+async def list_all(upstream: UpstreamClient, service: str, path: str, key: str) -> Tuple[list, bool]:
+    """
+    Every page of a list call, following the *_links next marker: (items, complete).
+    complete is False when INVENTORY_MAX_PAGES pages were read and upstream still had more.
+    """
+    items, params = [], {}
+    for _ in range(INVENTORY_MAX_PAGES):
+        response = await getattr(upstream, service).get(path, params=params)
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        body = response.json()
+        items.extend(body.get(key, []))
+        next_link = next((link["href"] for link in body.get(f"{key}_links", []) if link.get("rel") == "next"), None)
+        marker = parse_qs(urlsplit(next_link).query).get("marker") if next_link else None
+        if not marker:
+            return items, True
+        params = {"marker": marker[0]}
+    return items, False
+
+
+class InventoryIndex:
+    """
+    Fleet-wide snapshot of servers, volumes and ports across every environment and region,
+    normalized to one schema. Group-by counts over the whole fleet are computed once per
+    rebuild; filtered questions scan the compact records. Rebuilt at most every INVENTORY_TTL
+    seconds, with concurrent callers sharing one rebuild.
+    """
+
+    def __init__(self, ttl: float = INVENTORY_TTL):
+        self.ttl = ttl
+        self.records: Dict[str, List[dict]] = {kind: [] for kind in INVENTORY_SOURCES}
+        self.counts: Dict[tuple, Tally] = {}  # (kind, field) -> counts over the whole fleet
+        self.failures: Dict[str, str] = {}  # "environment:region:kind" -> error
+        self.built_at: Optional[float] = None
+        self.built_wall: Optional[float] = None
+        self.rebuilding: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        return self.built_at is not None and time.monotonic() - self.built_at < self.ttl
+
+    async def ensure_fresh(self, client: httpx.AsyncClient, force: bool = False):
+        if self.is_fresh() and not force:
+            return
+        if self.rebuilding is None or self.rebuilding.done():
+            self.rebuilding = background_task(self.rebuild(client))
+        await asyncio.shield(self.rebuilding)
+
+    async def fetch(self, client: httpx.AsyncClient, cloud_environment: CloudEnvironment, region: RegionName) -> tuple:
+        upstream = await get_upstream(cloud_environment, region, client)
+        kinds = list(INVENTORY_SOURCES)
+        results = await asyncio.gather(*(list_all(upstream, *INVENTORY_SOURCES[kind]) for kind in kinds), return_exceptions=True)
+        return upstream, dict(zip(kinds, results))
+
+    async def rebuild(self, client: httpx.AsyncClient):
+        # Shared by every waiting request: background_task leaves out the deadline, tenant and
+        # trace of the one that started it
+        current_batch.set(Batch("inventory"))  # retry list calls answered 429
+        current_priority.set(POLLING)  # background refresh: behind interactive calls in each region's queue
+        started = time.perf_counter()
+        targets = [(environment, region) for environment in CloudEnvironment for region in RegionName]
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self.fetch(client, environment, region), FANOUT_REGION_TIMEOUT) for environment, region in targets),
+            return_exceptions=True
+        )
+        records = {kind: [] for kind in INVENTORY_SOURCES}
+        failures = {}
+        for (environment, region), result in zip(targets, results):
+            if isinstance(result, BaseException):
+                failures[f"{environment.value}:{region.value}"] = describe(result)
+                continue
+            upstream, by_kind = result
+            for kind, listed in by_kind.items():
+                if isinstance(listed, BaseException):
+                    failures[f"{environment.value}:{region.value}:{kind}"] = describe(listed)
+                    continue
+                items, complete = listed
+                if not complete:
+                    failures[f"{environment.value}:{region.value}:{kind}"] = f"truncated after {INVENTORY_MAX_PAGES} pages"
+                records[kind].extend(normalize(kind, item, upstream) for item in items)
+
+        counts = {}
+        for kind, kind_records in records.items():
+            for field in GROUP_FIELDS:
+                if kind_records and field in kind_records[0]:
+                    counts[(kind, field)] = tally(kind_records, field)
+        self.records, self.counts, self.failures = records, counts, failures
+        self.built_at, self.built_wall = time.monotonic(), time.time()
+        inventory_refresh_duration.observe(time.perf_counter() - started)
+
+    def select(self, kind: str, filters: dict) -> List[dict]:
+        filters = {field: value for field, value in filters.items() if value is not None}
+        if not filters:
+            return self.records[kind]
+        return [record for record in self.records[kind] if all(record.get(field) == value for field, value in filters.items())]
+
+    def summary(self, kind: str, group_by: List[str], filters: dict) -> dict:
+        active = {field: value for field, value in filters.items() if value is not None}
+        records = self.select(kind, active)
+        counts = {}
+        for field in group_by:
+            field_counts = self.counts.get((kind, field)) if not active else tally(records, field)
+            counts[field] = dict((field_counts or Tally()).most_common())
+        return {"kind": kind, "total": len(records), "counts": counts, **self.freshness()}
+
+    def freshness(self) -> dict:
+        return {
+            "as_of": self.built_wall,
+            "age_s": round(time.monotonic() - self.built_at, 3) if self.built_at is not None else None,
+            "complete": not self.failures,
+            "failures": self.failures,
+        }
+
+
+def tally(records: List[dict], field: str) -> Tally:
+    return Tally(record.get(field) or "unknown" for record in records)
+
+
+def describe(error: BaseException) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, HTTPException):
+        return f"upstream status {error.status_code}"
+    return f"{type(error).__name__}: {error}"
+
+
+inventory = InventoryIndex()
+
+Gauge("inventory_items", "Resources in the fleet inventory index", ("kind",), collect=lambda: {kind: len(records) for kind, records in inventory.records.items()})
+
+
+def parse_kind(kind: str) -> str:
+    if kind not in INVENTORY_SOURCES:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(INVENTORY_SOURCES)}")
+    return kind
+
+
+@router.get("/summary")
+async def inventory_summary(
+    kind: str = "servers",
+    group_by: List[str] = Query(["status", "flavor"], description=f"Any of {', '.join(GROUP_FIELDS)}"),
+    cloud_environment: Optional[CloudEnvironment] = None,
+    region: Optional[RegionName] = None,
+    status: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    refresh: bool = False,
+    client: httpx.AsyncClient = Depends(get_async_client)
+):
+    """
+    Fleet-wide counts across OSPC and FLEX and every region, e.g. servers by flavor, status,
+    tenant_id or bid_band, optionally narrowed by environment, region, status or tenant.
+    """
+    kind = parse_kind(kind)
+    unknown = [field for field in group_by if field not in GROUP_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot group by {', '.join(unknown)}")
+    await inventory.ensure_fresh(client, force=refresh)
+    filters = {
+        "cloud_environment": cloud_environment.value if cloud_environment else None,
+        "region": region.value if region else None,
+        "status": status.upper() if status else None,
+        "tenant_id": tenant_id,
+    }
+    return inventory.summary(kind, group_by, filters)
+
+
+@router.get("/items")
+async def inventory_items(
+    kind: str = "servers",
+    cloud_environment: Optional[CloudEnvironment] = None,
+    region: Optional[RegionName] = None,
+    status: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    flavor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    refresh: bool = False,
+    client: httpx.AsyncClient = Depends(get_async_client)
+):
+    """
+    Normalized records from the fleet inventory, filtered by any of the listed fields.
+    """
+    kind = parse_kind(kind)
+    await inventory.ensure_fresh(client, force=refresh)
+    records = inventory.select(kind, {
+        "cloud_environment": cloud_environment.value if cloud_environment else None,
+        "region": region.value if region else None,
+        "status": status.upper() if status else None,
+        "tenant_id": tenant_id,
+        "flavor": flavor,
+    })
+    return {"kind": kind, "total": len(records), "items": records[:limit], **inventory.freshness()}
@@ -0,0 +1,161 @@
+"""
+Worker startup and shutdown.
+
+Startup opens the worker's shared upstream client and, when PREWARM lists environments and
+regions ("ospc:dfw,ospc:iad"), fetches their tokens and opens a pooled connection to each
+upstream service before the worker accepts its first request. Prewarm failures are logged,
+never fatal: the worker then warms up on live traffic instead.
+
+While serving, every HEALTH_PROBE_INTERVAL seconds the same cheap calls probe the PREWARM
+regions and the regions live traffic has used, unless live traffic kept them fresh, so
+upstream_health (and region=any placement) also knows about quiet and recovering regions.
+Only the worker leading "health-probes" probes; the others record its outcomes from the state
+backend. With a shared STATE_BACKEND, the worker also exchanges its inbound rate limit usage
+with the other workers (ratelimit.RateLimiter.share_usage). Every OWNERSHIP_RECONCILE_INTERVAL
+seconds the ownership index behind mine=true listings is reconciled with upstream, by the worker
+leading "ownership", and followed by the others (see ownership.py).
+
+Shutdown waits up to DRAIN_TIMEOUT for batch creates that are still sending items upstream,
+then flushes traces and logs.
+"""
+import asyncio
+import contextlib
+import os
+import time
+
+from config import open_shared_client, close_shared_client, HEALTH_PROBE_INTERVAL, HEALTH_PROBE_TIMEOUT, RATE_LIMIT_SYNC_INTERVAL, OWNERSHIP_RECONCILE_INTERVAL
+from log import get_logger, setup_logging, shutdown_logging
+from metrics import loop_monitor, batch_items_in_flight
+from models import CloudEnvironment, RegionName
+from ownership import ownership
+from ratelimit import rate_limiter
+from scheduling import POLLING, current_priority
+from state import get_backend, run_elected, InProcessBackend
+from tracing import exporter
+from upstream import get_upstream, upstream_health, UPSTREAM_SERVICES
+
+
+PREWARM = os.getenv("PREWARM", "")  # "environment:region,..."
+PREWARM_TIMEOUT = float(os.getenv("PREWARM_TIMEOUT", "20"))  # seconds before startup gives up warming
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "30"))  # seconds shutdown waits for in-flight batches
+
+# One cheap call per upstream service, shared by prewarm and the health probes
+PROBE_CALLS = {
+    "servers": ("/flavors", None),
+    "volumes": ("/volumes", {"limit": 1}),
+    "networking": ("/networks", {"limit": 1}),
+}
+PROBES_KEY = "health:probes"  # the leader's latest probe outcomes, for the other workers
+
+logger = get_logger(__name__)
+
+
+def prewarm_targets(spec: str = PREWARM):
+    for entry in filter(None, (item.strip() for item in spec.split(","))):
+        environment, _, region = entry.partition(":")
+        yield CloudEnvironment(environment), RegionName(region)
+
+
+async def prewarm_region(client, cloud_environment: CloudEnvironment, region: RegionName):
+    upstream = await get_upstream(cloud_environment, region, client)
+    # One cheap call per service leaves a keep-alive connection to each in the pool
+    await asyncio.gather(*(getattr(upstream, service).get(path, params=params) for service, (path, params) in PROBE_CALLS.items()))
+
+
+async def prewarm(client, spec: str = PREWARM):
+    targets = list(prewarm_targets(spec))
+    if not targets:
+        return
+    started = time.perf_counter()
+    results = await asyncio.wait_for(
+        asyncio.gather(*(prewarm_region(client, environment, region) for environment, region in targets), return_exceptions=True),
+        PREWARM_TIMEOUT
+    )
+    for (environment, region), result in zip(targets, results):
+        if isinstance(result, Exception):
+            logger.warning("prewarm_failed", cloud_environment=environment.value, region=region.value, error=repr(result))
+    logger.info("prewarm_done", targets=len(targets), seconds=round(time.perf_counter() - started, 3))
+
+
+async def probe_upstreams(client, interval: float = HEALTH_PROBE_INTERVAL, spec: str = PREWARM):
+    """
+    Synthetic traffic for upstream_health. ServiceClient records the probes like any other call;
+    a probe to an open breaker past its cooldown is the trial call that can close it.
+
+    Only the worker leading "health-probes" calls upstream. It shares each probed service's
+    outcome (latency, ok, error) under PROBES_KEY, and the others record those as if they had
+    made the call, for the services their own traffic has not kept fresh. run_elected renews the
+    lease on its own heartbeat, so it holds across an interval longer than the lease TTL.
+    """
+    current_priority.set(POLLING)
+    backend = get_backend()
+    followed_at = 0.0
+
+    async def probe():
+        started = time.monotonic()
+        targets = (set(prewarm_targets(spec)) | upstream_health.seen_regions())
+        targets = [target for target in targets if upstream_health.needs_probe(*target, UPSTREAM_SERVICES, interval)]
+        results = await asyncio.gather(
+            *(asyncio.wait_for(prewarm_region(client, environment, region), HEALTH_PROBE_TIMEOUT) for environment, region in targets),
+            return_exceptions=True
+        )
+        failed = sum(isinstance(result, Exception) for result in results)
+        if failed:
+            logger.info("health_probes_failed", probed=len(targets), failed=failed)
+        outcomes = []
+        for environment, region in targets:
+            for service in UPSTREAM_SERVICES:
+                health = upstream_health.regions.get((environment.value, region.value, service))
+                if health is not None and health.last_seen is not None and health.last_seen >= started:
+                    outcomes.append([environment.value, region.value, service, health.latency, health.consecutive_failures == 0, health.last_error])
+        await backend.set(PROBES_KEY, {"at": time.time(), "outcomes": outcomes}, ttl=interval * 3)
+
+    async def follow():
+        nonlocal followed_at
+        shared = await backend.get(PROBES_KEY)
+        if not shared or shared["at"] <= followed_at:
+            return
+        followed_at = shared["at"]
+        for environment, region, service, seconds, ok, error in shared["outcomes"]:
+            key = (environment, region, service)
+            if not upstream_health.needs_probe(CloudEnvironment(environment), RegionName(region), (service,), interval):
+                continue
+            if upstream_health.allow(key):  # like a probe of our own: the trial call of a cooled-down breaker
+                upstream_health.record(key, seconds, ok, error)
+
+    await run_elected("health-probes", probe, interval, on_follow=follow)
+
+
+async def drain(timeout: float = DRAIN_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while batch_items_in_flight() and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    remaining = batch_items_in_flight()
+    if remaining:
+        logger.warning("drain_timeout", batch_items_pending=remaining)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    setup_logging()  # no-op unless a previous lifespan in this process shut logging down
+    loop_monitor.ensure_started()
+    client = open_shared_client()
+    try:
+        await prewarm(client)
+    except asyncio.TimeoutError:
+        logger.warning("prewarm_timeout", seconds=PREWARM_TIMEOUT)
+    probes = asyncio.create_task(probe_upstreams(client)) if HEALTH_PROBE_INTERVAL > 0 else None
+    backend = get_backend()
+    sharing = None
+    if not isinstance(backend, InProcessBackend) and rate_limiter.tenant_rule is not None and RATE_LIMIT_SYNC_INTERVAL > 0:
+        sharing = asyncio.create_task(rate_limiter.share_usage(backend))
+    reconciling = asyncio.create_task(ownership.run(client)) if OWNERSHIP_RECONCILE_INTERVAL > 0 else None
+    yield
+    for task in (probes, sharing, reconciling):
+        if task is not None:
+            task.cancel()
+    await drain()
+    await close_shared_client()
+    await exporter.shutdown()
+    loop_monitor.stop()
+    shutdown_logging()
@@ -0,0 +1,131 @@
+"""
+Structured logging that costs the event loop only a level check and a queue put.
+
+Records go through a QueueHandler to a QueueListener thread, which does all formatting
+(JSON, one object per line) and writing, to stderr unless setup_logging() is given a stream,
+so stdout stays free for what a command prints (the benchmarks' JSON reports). Levels are set per logger:
+    LOG_LEVEL=INFO LOG_LEVELS="servers=DEBUG,auth=WARNING"
+Per-request debug lines use debug_sampled(), which keeps or drops every line of a request
+together (keyed on its trace id) at LOG_DEBUG_SAMPLE_RATE.
+
+Field values are formatted on the writer thread, so do not mutate them after logging.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+from typing import Optional
+
+import tracing  # whole, not its names: tracing logs through this module too
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")  # "module=LEVEL,module=LEVEL"
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+# httpx logs every request at INFO; LOG_LEVELS can still override these
+DEFAULT_LEVELS = "httpx=WARNING,httpcore=WARNING"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread instead of the caller."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(stream=None):
+    """Route every logger through one background writer thread. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(records, writer, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(records)]
+    root.setLevel(LOG_LEVEL.upper())
+    for entry in filter(None, f"{DEFAULT_LEVELS},{LOG_LEVELS}".split(",")):
+        name, _, level = entry.partition("=")
+        logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def request_sampled(rate: float = LOG_DEBUG_SAMPLE_RATE) -> bool:
+    trace = tracing.current_trace.get()
+    if trace is None:
+        return random.random() < rate
+    return int(trace.trace_id[:8], 16) < rate * 0x100000000
+
+
+class Logger:
+    """
+    logging.Logger wrapper taking the event name plus keyword fields:
+        logger.info("server_created", region=region.value, server_id=server_id)
+    Nothing is built for records below the logger's level.
+    """
+    __slots__ = ("logger",)
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+
+    def log(self, level: int, event: str, exc_info=None, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        trace = tracing.current_trace.get()
+        if trace is not None:
+            fields["trace_id"] = trace.trace_id
+        self.logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def debug_sampled(self, event: str, **fields):
+        """Debug line kept for a LOG_DEBUG_SAMPLE_RATE share of requests."""
+        if self.logger.isEnabledFor(logging.DEBUG) and request_sampled():
+            self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event: str, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+    def exception(self, event: str, **fields):
+        self.log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name: str) -> Logger:
+    return Logger(name)
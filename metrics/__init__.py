@@ -0,0 +1,5 @@
+from .metrics import router as metrics_router, Counter, Gauge, Histogram, REGISTRY
+from .instrumentation import MetricsMiddleware, InstrumentedTransport, start_batch, batch_items_in_flight, token_cache_events
+from .loop_monitor import loop_monitor, BlockedLoopError
+
+__all__ = ["metrics_router", "Counter", "Gauge", "Histogram", "REGISTRY", "MetricsMiddleware", "InstrumentedTransport", "start_batch", "batch_items_in_flight", "token_cache_events", "loop_monitor", "BlockedLoopError"]
\ No newline at end of file
@@ -0,0 +1,134 @@
+import re
+import time
+import weakref
+import httpx
+
+from typing import Optional
+
+from .loop_monitor import loop_monitor
+from .metrics import Counter, Gauge, Histogram
+
+
+UPSTREAM_HOST_PATTERN = re.compile(r"^(?P<region>[a-z]+)\.(?P<service>servers|blockstorage|networks)\.api\.rackspacecloud\.com$")
+UPSTREAM_PATH_PATTERN = re.compile(r"^/(?P<region>[a-z]+)/(?P<service>servers|blockstorage|networks)/")
+
+http_requests = Counter("http_requests_total", "Requests handled, by route template, method and status", ("route", "method", "status"))
+http_request_duration = Histogram("http_request_duration_seconds", "Request latency by route template and method", ("route", "method"))
+http_requests_inflight = Gauge("http_requests_inflight", "Requests currently being handled")
+
+upstream_request_duration = Histogram(
+    "upstream_request_duration_seconds",
+    "Upstream OpenStack call latency (to response headers) by service, region, method and status",
+    ("service", "region", "method", "status")
+)
+
+token_cache_events = Counter("auth_token_cache_total", "Auth token lookups by result (hit, miss, refresh)", ("result",))
+
+batch_sizes = Histogram("batch_size", "Items per batch create request", ("route",), buckets=(1, 2, 5, 10, 20, 50, 100))
+batch_pending = Gauge("batch_items_pending", "Items of in-flight batch creates not yet sent upstream", ("route",))
+
+
+def upstream_labels(url: httpx.URL):
+    """(service, region) for a Rackspace URL, or a fake_openstack URL in path mode."""
+    match = UPSTREAM_HOST_PATTERN.match(url.host)
+    if match is None:
+        match = UPSTREAM_PATH_PATTERN.match(url.path)
+    if match is not None:
+        return match["service"], match["region"]
+    if url.host.startswith("identity.") or url.path.startswith("/identity/"):
+        return "identity", "global"
+    return url.host, "unknown"
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Times every upstream call into upstream_request_duration_seconds.
+    Wraps a regular pooled transport by default; pass another transport (e.g. a fake) to wrap that instead.
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.transport = transport or httpx.AsyncHTTPTransport()
+        live_transports.add(self)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        service, region = upstream_labels(request.url)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.transport.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            upstream_request_duration.labels(service, region, request.method, status).observe(time.perf_counter() - started)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+live_transports = weakref.WeakSet()
+
+
+def pool_utilization() -> dict:
+    """Connection counts across every live upstream pool (httpcore internals, read defensively)."""
+    counts = {"active": 0, "idle": 0, "waiting": 0}
+    for transport in list(live_transports):
+        pool = getattr(transport.transport, "_pool", None)
+        for connection in getattr(pool, "connections", ()):
+            counts["idle" if connection.is_idle() else "active"] += 1
+        for pending in getattr(pool, "_requests", ()):
+            if getattr(pending, "connection", True) is None:
+                counts["waiting"] += 1
+    return counts
+
+
+Gauge("upstream_pool_connections", "Upstream HTTP connections by state (waiting counts queued requests)", ("state",), collect=pool_utilization)
+
+
+def start_batch(route: str, size: int):
+    """
+    For batches whose items run concurrently: records the batch size and returns a callback
+    to call once per finished item.
+    """
+    batch_sizes.labels(route).observe(size)
+    pending = batch_pending.labels(route)
+    pending.inc(size)
+    return pending.dec
+
+
+def batch_items_in_flight() -> int:
+    """Items of batch creates, across routes, still waiting to be sent upstream."""
+    return sum(child.value for child in list(batch_pending.children.values()))
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording count and latency per route template.
+    Requests that match no route are grouped under "unmatched" to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        loop_monitor.ensure_started()
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        started = time.perf_counter()
+        http_requests_inflight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_inflight.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration.labels(route, scope["method"]).observe(time.perf_counter() - started)
+            http_requests.labels(route, scope["method"], status).inc()
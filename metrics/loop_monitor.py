@@ -0,0 +1,138 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+from collections import deque
+from typing import Optional
+
+from .metrics import Counter, Histogram
+
+
+LOOP_BLOCK_HISTORY = 50  # blocking events kept for /debug/loop
+
+loop_lag = Histogram("event_loop_lag_seconds", "Event-loop scheduling delay", buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+loop_blocks = Counter("event_loop_blocked_total", "Times a callback held the event loop longer than LOOP_BLOCK_THRESHOLD")
+loop_block_duration = Histogram("event_loop_block_seconds", "How long blocking callbacks held the event loop", buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+
+class BlockedLoopError(AssertionError):
+    pass
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag continuously and catches the code that causes it.
+
+    A heartbeat task on the loop wakes every LOOP_HEARTBEAT_INTERVAL and records how late it woke.
+    A watchdog thread checks the heartbeat; once it is LOOP_BLOCK_THRESHOLD overdue the loop is
+    stuck in one callback, so the watchdog snapshots the loop thread's stack while it is still
+    inside the offending code. The heartbeat fills in the total duration when the loop comes back.
+
+    Settings left as None take their config.py value (LOOP_HEARTBEAT_INTERVAL, LOOP_BLOCK_THRESHOLD,
+    LOOP_MONITOR_STRICT) when the monitor first starts.
+    """
+
+    def __init__(self, interval: Optional[float] = None, threshold: Optional[float] = None, strict: Optional[bool] = None):
+        self.interval = interval
+        self.threshold = threshold
+        self.strict = strict
+        self.logger = None
+        self.events: deque = deque(maxlen=LOOP_BLOCK_HISTORY)
+        self.lock = threading.Lock()
+        self.heartbeat = time.monotonic()
+        self.pending: Optional[dict] = None  # block captured by the watchdog, still in progress
+        self.max_lag = 0.0
+        self.lag = 0.0  # latest heartbeat's lag
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.stopped = threading.Event()
+
+    def ensure_started(self):
+        """Start on the running loop; a no-op when already running there."""
+        loop = asyncio.get_running_loop()
+        if self.task is not None and not self.task.done() and self.loop is loop:
+            return
+        self.configure()
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.task = loop.create_task(self.beat())
+        if self.strict:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+        self.stopped.set()  # retire the watchdog of a previous loop
+        self.stopped = threading.Event()
+        threading.Thread(target=self.watch, args=(self.stopped,), name="loop-watchdog", daemon=True).start()
+
+    def configure(self):
+        # Imported here, not at the top: config and log both import metrics, so this module loads before them
+        from config import LOOP_HEARTBEAT_INTERVAL, LOOP_BLOCK_THRESHOLD, LOOP_MONITOR_STRICT
+        from log import get_logger
+        self.interval = self.interval if self.interval is not None else LOOP_HEARTBEAT_INTERVAL
+        self.threshold = self.threshold if self.threshold is not None else LOOP_BLOCK_THRESHOLD
+        self.strict = self.strict if self.strict is not None else LOOP_MONITOR_STRICT
+        self.logger = get_logger(__name__)
+
+    def stop(self):
+        self.lag = 0.0
+        self.stopped.set()
+        if self.task is not None:
+            self.task.cancel()
+
+    async def beat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            loop_lag.observe(lag)
+            self.lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            with self.lock:
+                self.heartbeat = now
+                pending, self.pending = self.pending, None
+            if pending is not None:
+                pending["duration"] = round(lag, 4)
+                loop_block_duration.observe(lag)
+                self.logger.warning("event_loop_blocked", blocked_s=round(lag, 3), stack="".join(pending["stack"][-8:]))
+
+    def watch(self, stopped: threading.Event):
+        while not stopped.wait(self.interval / 2):
+            with self.lock:
+                overdue = time.monotonic() - self.heartbeat - self.interval
+                if overdue < self.threshold or self.pending is not None:
+                    continue
+                frame = sys._current_frames().get(self.loop_thread_id)
+                if frame is None:
+                    continue
+                self.pending = {
+                    "at": time.time(),
+                    "duration": None,  # filled in once the loop runs again
+                    "stack": traceback.format_stack(frame),
+                }
+                self.events.append(self.pending)
+            loop_blocks.inc()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            events = [dict(event) for event in self.events]
+        return {
+            "running": self.task is not None and not self.task.done(),
+            "threshold_s": self.threshold,
+            "strict": self.strict,
+            "max_lag_s": round(self.max_lag, 4),
+            "blocked_total": loop_blocks.labels().value,
+            "recent_blocks": events[::-1],
+        }
+
+    def raise_if_blocked(self):
+        """For tests and load runs in strict mode: fail if any callback blocked the loop."""
+        if self.strict and self.events:
+            worst = max(self.events, key=lambda event: event["duration"] or 0)
+            raise BlockedLoopError(f"{len(self.events)} blocking callback(s); worst {worst['duration']}s at:\n{''.join(worst['stack'])}")
+
+
+loop_monitor = LoopMonitor()
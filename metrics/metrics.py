@@ -0,0 +1,175 @@
+import bisect
+
+from typing import Callable, Dict, Optional, Sequence, Tuple
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+
+router = APIRouter(tags=["metrics"])
+
+# Every metric registers itself here and is rendered by /metrics
+REGISTRY: list = []
+
+
+def format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        """Child for one label combination. Cached, so hot paths only pay a dict lookup."""
+        child = self.children.get(values)
+        if child is None:
+            # Keys are stored as strings; str and str-enum label values hit the lookup above directly
+            values = tuple(str(value) for value in values)
+            child = self.children.get(values)
+            if child is None:
+                child = self.children[values] = self.new_child()
+        return child
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        for values, child in self.children.items():
+            yield "", format_labels(self.labelnames, values), child.value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {value}")
+        return "\n".join(lines)
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class Gauge(Metric):
+    """
+    Gauge set by the caller, or computed at scrape time by collect() returning {label values: value}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), collect: Optional[Callable[[], dict]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def new_child(self):
+        return GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def samples(self):
+        if self.collect is None:
+            yield from super().samples()
+            return
+        for values, value in self.collect().items():
+            values = values if isinstance(values, tuple) else (values,)
+            yield "", format_labels(self.labelnames, values), value
+
+
+# Seconds; covers cache hits (sub-millisecond) through slow upstream creates
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class HistogramChild:
+    """
+    Per-bucket counts (not cumulative) plus sum. observe() is a bisect and two additions,
+    with no lock: handlers all run on the event loop thread, and scrapes tolerate a torn read.
+    """
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def new_child(self):
+        return HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            counts = list(child.counts)
+            cumulative = 0
+            for bound, count in zip((*self.bounds, "+Inf"), counts):
+                cumulative += count
+                yield "_bucket", format_labels(self.labelnames, values, f'le="{bound}"'), cumulative
+            yield "_sum", format_labels(self.labelnames, values), child.sum
+            yield "_count", format_labels(self.labelnames, values), cumulative
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of every registered metric."""
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
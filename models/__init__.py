@@ -1,6 +1,7 @@
 from .models import (
     CloudEnvironment, 
     RegionName, 
+    RegionScope,
     AuthRequest, 
     TokenResponse, 
     ServerCreate, 
@@ -36,6 +37,7 @@ from .models import (
 __all__ = [
     "CloudEnvironment",
     "RegionName",
+    "RegionScope",
     "AuthRequest",
     "TokenResponse",
     "ServerCreate",
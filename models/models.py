@@ -16,6 +16,20 @@ class RegionName(str, Enum):
     SYD = "syd"
     HKG = "hkg"
 
+class RegionScope(str, Enum):
+    """
+    Region for list endpoints and placement-agnostic creates: one RegionName, "all" to fan out
+    to every region, or "any" for the healthiest, fastest region (see upstream.health).
+    """
+    ALL = "all"
+    ANY = "any"
+    DFW = "dfw"
+    ORD = "ord"
+    IAD = "iad"
+    LON = "lon"
+    SYD = "syd"
+    HKG = "hkg"
+
 class AuthRequest(BaseModel):
     username: str
     api_key: str
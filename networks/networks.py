@@ -1,51 +1,59 @@
 import httpx
 
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
 from typing import Optional
 
-from auth import get_auth_token
-from config import API_BASE_URLS, get_async_client
-from models import RegionName, NetworkCreate, NetworkCreateList, NetworkUpdate, NetworkUpdateList, CloudEnvironment
+from cache import resource_cache
+from config import get_async_client
+from etag import conditional_get
+from fanout import fan_out_response, any_region
+from idempotency import idempotent
+from ownership import ownership
+from scheduling import current_tenant
+from upstream import get_upstream, run_batch
+from models import RegionName, RegionScope, NetworkCreate, NetworkCreateList, NetworkUpdate, NetworkUpdateList, CloudEnvironment
 
 
 router = APIRouter(prefix="/networks", tags=["networks"])
 
 # List all networks
 @router.get("/", tags=["List Networks"])
+@conditional_get
 async def list_networks(
-    region: RegionName,
+    region: RegionScope,
     name: Optional[str] = None,
     tenant_id: Optional[str] = None,
+    mine: bool = Query(False, description="Only what the caller (X-Tenant-Id) created, from the ownership index"),
     cloud_environment: CloudEnvironment = CloudEnvironment.OSPC,
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
-    """List all networks with optional filtering"""
-    # TODO: Show only user related networks, not all networks in the region
-    # TODO: Store networks metadata in local database MySQL or MongoDB
-    auth: dict = await get_auth_token(cloud_environment, region, client)
+    """List all networks with optional filtering; region=all streams every region's networks as NDJSON, region=any reads the healthiest region, mine=true only the caller's"""
+    if mine:
+        return ownership.listing("networks", cloud_environment, region, {"name": name, "tenant_id": tenant_id})
 
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/networks"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
-    
     # Build query params
     params = {}
     if name:
         params["name"] = name
     if tenant_id:
         params["tenant_id"] = tenant_id
-    
-    response = await client.get(url, headers=headers, params=params)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+
+    async def fetch(region: RegionName):
+        upstream = await get_upstream(cloud_environment, region, client)
+        response = await upstream.networking.get("/networks", params=params)
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json()
+
+    if region == RegionScope.ALL:
+        return fan_out_response("list_networks", "networks", fetch)
+    if region == RegionScope.ANY:
+        return await any_region("list_networks", cloud_environment, "networking", fetch)
+    return await fetch(RegionName(region.value))
 
 # Create network
 @router.post("/{region}/networks", tags=["Create Networks"])
+@idempotent("create_network")
 async def create_network(
     region: RegionName,
     network_data_list: NetworkCreateList = Body(...),
@@ -53,27 +61,17 @@ async def create_network(
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """Create a new network"""
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/networks"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response_list = []
-    for network_data in network_data_list.networks:
+    async def create_one(network_data):
         if not isinstance(network_data, NetworkCreate):
             raise HTTPException(
                 status_code=400,
                 detail="Invalid network data provided"
             )
-        response = await client.post(
-            url,
-            json={"network": network_data.dict(exclude_none=True)},
-            headers=headers
+        response = await upstream.networking.post(
+            "/networks",
+            json={"network": network_data.dict(exclude_none=True)}
         )
         
         if response.status_code != 201:
@@ -81,11 +79,14 @@ async def create_network(
                 status_code=response.status_code,
                 detail=response.text
             )
-        response_list.append(response.json())
-    return response_list
+        ownership.add("networks", cloud_environment.value, region.value, current_tenant.get(), response.json().get("network", {}))
+        return response.json()
+
+    return await run_batch("create_network", network_data_list.networks, create_one)
 
 # Get network details
 @router.get("/{network_id}", tags=["Get Network"])
+@conditional_get
 async def get_network(
     region: RegionName,
     network_id: str,
@@ -93,20 +94,12 @@ async def get_network(
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """Get specific network details"""
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/networks/{network_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    async def fetch():
+        upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.get(url, headers=headers)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+        return await upstream.networking.get(f"/networks/{network_id}")
+
+    return await resource_cache.get("networks", cloud_environment.value, region.value, network_id, fetch)
 
 # Update network
 # TODO: Update netwoks attributes to handle list of udpates
@@ -119,23 +112,15 @@ async def update_network(
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """Update network attributes"""
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/networks/{network_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.put(
-        url,
-        json={"network": network_data.dict(exclude_none=True)},
-        headers=headers
+    response = await upstream.networking.put(
+        f"/networks/{network_id}",
+        json={"network": network_data.dict(exclude_none=True)}
     )
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail=response.text)
+    await resource_cache.invalidate("networks", cloud_environment.value, region.value, network_id)
     return response.json()
 
 # Delete network
@@ -147,17 +132,11 @@ async def delete_network(
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """Delete a network"""
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/networks/{network_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.delete(url, headers=headers)
+    response = await upstream.networking.delete(f"/networks/{network_id}")
     if response.status_code != 204:
         raise HTTPException(status_code=response.status_code, detail=response.text)
+    await resource_cache.invalidate("networks", cloud_environment.value, region.value, network_id)
+    ownership.remove("networks", cloud_environment.value, region.value, network_id)
     return {"status": "success", "message": "Network deleted successfully"}
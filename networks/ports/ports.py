@@ -3,8 +3,13 @@ import httpx
 from typing import Dict, Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
 
-from auth import get_auth_token
-from config import API_BASE_URLS, get_async_client
+from cache import resource_cache
+from config import get_async_client
+from etag import conditional_get
+from idempotency import idempotent
+from ownership import ownership
+from scheduling import current_tenant
+from upstream import get_upstream, run_batch
 from models import RegionName, PortCreate, PortCreateList, CloudEnvironment
 
 
@@ -12,6 +17,7 @@ router = APIRouter(prefix="/ports", tags=["ports"])
 
 
 @router.post("/ports", tags=["Networking - Create Ports"])
+@idempotent("create_port")
 async def create_port(
     region: RegionName,
     port_data_list: PortCreateList = Body(...),
@@ -23,61 +29,49 @@ async def create_port(
     # TODO: Assuming that at time of creation of server, network was created default by Rackspace and so no need to manually pass network field here
     # TODO: In future, provide option for creating a network here for users so that ports and all can be then created by users here as per convenience
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/ports"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response_list = []
-    for port_data in port_data_list.ports:
+    async def create_one(port_data):
         if not isinstance(port_data, PortCreate):
             raise HTTPException(
                 status_code=400,
                 detail="Invalid port data provided"
             )
         
-        response = await client.post(url, json={"port": port_data.dict()}, headers=headers)
+        response = await upstream.networking.post("/ports", json={"port": port_data.dict()})
     
         if response.status_code != 201:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=response.text
             )
-        response_list.append(response)
+        ownership.add("ports", cloud_environment.value, region.value, current_tenant.get(), response.json().get("port", {}))
+        return response.json()
         
-    return response_list
+    return await run_batch("create_port", port_data_list.ports, create_one)
 
 @router.get("/ports", tags=["Networking - List Ports"])
+@conditional_get
 async def list_ports(
     region: RegionName,
     device_id: Optional[str] = Query(None, description="Filter ports by device ID"),
+    mine: bool = Query(False, description="Only what the caller (X-Tenant-Id) created, from the ownership index"),
     cloud_environment: CloudEnvironment = CloudEnvironment.OSPC,
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """
-    List all ports. Also handles device_id check here
-    # TODO: Give ports wrt particular user only
-    # TODO: Maybe store all ports metadata in local database MySQL or MongoDB
+    List all ports. Also handles device_id check here; mine=true lists only the caller's ports.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
+    if mine:
+        return ownership.listing("ports", cloud_environment, region, {"device_id": device_id})
 
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/ports"
+    upstream = await get_upstream(cloud_environment, region, client)
 
+    params = {}
     if device_id:
-        url = url+f"?device_id={device_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+        params["device_id"] = device_id
     
-    response = await client.get(url, headers=headers)
+    response = await upstream.networking.get("/ports", params=params, hedge="list_ports")
     
     if response.status_code != 200:
         raise HTTPException(
@@ -88,6 +82,7 @@ async def list_ports(
     return response.json()
 
 @router.get("/{port_id}", tags=["Networking - Get Port"])
+@conditional_get
 async def get_port(
     region: RegionName,
     port_id: str,
@@ -97,25 +92,12 @@ async def get_port(
     """
     Get details of a specific port.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/ports/{port_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
-    
-    response = await client.get(url, headers=headers)
-    
-    if response.status_code != 200:
-        raise HTTPException(
-            status_code=response.status_code,
-            detail=response.text
-        )
+    async def fetch():
+        upstream = await get_upstream(cloud_environment, region, client)
     
-    return response.json()
+        return await upstream.networking.get(f"/ports/{port_id}")
+
+    return await resource_cache.get("ports", cloud_environment.value, region.value, port_id, fetch)
 
 # TODO: Needs to identify the fields that can be updated in a port
 @router.put("/{port_id}", tags=["Networking - Update Port"])
@@ -130,17 +112,9 @@ async def update_port(
     Update a port's details.
     # TODO: Validate port_data fields based on OpenStack API documentation
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/ports/{port_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.put(url, json={"port": port_data}, headers=headers)
+    response = await upstream.networking.put(f"/ports/{port_id}", json={"port": port_data})
     
     if response.status_code != 200:
         raise HTTPException(
@@ -148,6 +122,7 @@ async def update_port(
             detail=response.text
         )
     
+    await resource_cache.invalidate("ports", cloud_environment.value, region.value, port_id)
     return response.json()
 
 @router.delete("/{port_id}", tags=["Networking - Delete Port"])
@@ -160,17 +135,9 @@ async def delete_port(
     """
     Delete a port.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/ports/{port_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.delete(url, headers=headers)
+    response = await upstream.networking.delete(f"/ports/{port_id}")
     
     if response.status_code != 204:
         raise HTTPException(
@@ -178,4 +145,6 @@ async def delete_port(
             detail=response.text
         )
     
+    await resource_cache.invalidate("ports", cloud_environment.value, region.value, port_id)
+    ownership.remove("ports", cloud_environment.value, region.value, port_id)
     return {"status": "success", "message": "Port deleted successfully"}
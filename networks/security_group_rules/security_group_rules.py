@@ -2,13 +2,17 @@ import httpx
 
 from fastapi import APIRouter, Depends, HTTPException, Body
 
-from auth import get_auth_token
-from config import API_BASE_URLS, get_async_client
+from cache import resource_cache
+from config import get_async_client
+from etag import conditional_get
+from idempotency import idempotent
+from upstream import get_upstream, run_batch
 from models import RegionName, SecurityGroupRuleCreate, SecurityGroupRuleCreateList, CloudEnvironment
 
 router = APIRouter(prefix="/security_group_rules", tags=["security_group_rules"])
 
 @router.post("/", tags=["Networking - Create Security Group Rule"])
+@idempotent("create_security_group_rule")
 async def create_security_group_rule(
     region: RegionName,
     rule_data_list: SecurityGroupRuleCreateList = Body(...),
@@ -18,18 +22,9 @@ async def create_security_group_rule(
     """
     Create a new security group rule.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/security-group-rules"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     # print(f"Creating security group rules in {cloud_environment.value} for region {region.value}")
-    response_list = []
-    for rule_data in rule_data_list.security_group_rules:
+    async def create_one(rule_data):
         if not isinstance(rule_data, SecurityGroupRuleCreate):
             raise HTTPException(
                 status_code=400,
@@ -49,33 +44,22 @@ async def create_security_group_rule(
             }
         }
         # print(f"Creating security group rule: {request_body}")
-        try:
-            response = await client.post(url, json=request_body, headers=headers)   
-        
-            if response.status_code != 201:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=response.text
-                )
-            
-            response_list.append(response.json())
-        except httpx.HTTPStatusError as e:
-            print(e)
-            # raise HTTPException(
-            #     status_code=e.response.status_code,
-            #     detail=f"Failed to create security group rule: {e.response.text}"
-            # )
-        except Exception as e:
-            print(e)
-            # raise HTTPException(
-            #     status_code=500,
-            #     detail=f"An unexpected error occurred: {str(e)}"
-            # )
-        print("\n", response_list)
-    # print(f"Created security group rules: {response_list}")
-    return response_list
+        response = await upstream.networking.post("/security-group-rules", json=request_body)
+
+        if response.status_code != 201:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=response.text
+            )
+
+        # Rules are embedded in their security group's GET response
+        await resource_cache.invalidate("security_groups", cloud_environment.value, region.value, rule_dict["security_group_id"])
+        return response.json()
+
+    return await run_batch("create_security_group_rule", rule_data_list.security_group_rules, create_one)
 
 @router.get("/", tags=["Networking - List Security Group Rules"])
+@conditional_get
 async def list_security_group_rule(
     region: RegionName,
     cloud_environment: CloudEnvironment = CloudEnvironment.OSPC,
@@ -86,17 +70,9 @@ async def list_security_group_rule(
     # TODO: Give security rule wrt particular user only
     # TODO: Maybe store all security group rules metadata in local database MySQL or MongoDB
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/security-group-rules"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.get(url, headers=headers)
+    response = await upstream.networking.get("/security-group-rules")
     
     if response.status_code != 200:
         raise HTTPException(
@@ -107,6 +83,7 @@ async def list_security_group_rule(
     return response.json()
 
 @router.get("/{rule_id}", tags=["Networking - Get Security Group Rule"])
+@conditional_get
 async def get_security_group_rule(
     region: RegionName,
     rule_id: str,
@@ -116,17 +93,9 @@ async def get_security_group_rule(
     """
     Get details of a specific security group rule.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/security-group-rules/{rule_id}"
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
-    
-    response = await client.get(url, headers=headers)
+    response = await upstream.networking.get(f"/security-group-rules/{rule_id}")
     
     if response.status_code != 200:
         raise HTTPException(
@@ -146,17 +115,9 @@ async def delete_security_group_rule(
     """
     Delete a security group rule.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/security-group-rules/{rule_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.delete(url, headers=headers)
+    response = await upstream.networking.delete(f"/security-group-rules/{rule_id}")
     
     if response.status_code != 204:
         raise HTTPException(
@@ -164,4 +125,6 @@ async def delete_security_group_rule(
             detail=response.text
         )
     
+    # The rule's security group is unknown here, so drop every cached group in the region
+    await resource_cache.invalidate("security_groups", cloud_environment.value, region.value)
     return {"status": "success", "message": "Security group rule deleted successfully"}
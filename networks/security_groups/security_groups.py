@@ -2,14 +2,18 @@ import httpx
 
 from fastapi import APIRouter, Depends, HTTPException, Body
 
-from auth import get_auth_token
-from config import API_BASE_URLS, get_async_client
+from cache import resource_cache
+from config import get_async_client
+from etag import conditional_get
+from idempotency import idempotent
+from upstream import get_upstream, run_batch
 from models import RegionName, SecurityGroupCreate, SecurityGroupCreateList, CloudEnvironment
 
 
 router = APIRouter(prefix="/security_groups", tags=["security_groups"])
 
 @router.post("/", tags=["Networking - Create Security Group"])
+@idempotent("create_security_group")
 async def create_security_group(
     region: RegionName,
     group_data: SecurityGroupCreateList = Body(...),
@@ -19,34 +23,27 @@ async def create_security_group(
     """
     Create a new security group.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
+    upstream = await get_upstream(cloud_environment, region, client)
 
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/security-groups"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
-
-    response_list = []
-    for rule_data in group_data.security_groups:
+    async def create_one(rule_data):
         if not isinstance(rule_data, SecurityGroupCreate):
             raise HTTPException(
                 status_code=400,
                 detail="Invalid security group rules provided"
             )
-        response = await client.post(url, json={"security_group": rule_data.dict()}, headers=headers)
+        response = await upstream.networking.post("/security-groups", json={"security_group": rule_data.dict()})
         
         if response.status_code != 201:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=response.text
             )
-        response_list.append(response.json())
-    return response_list
+        return response.json()
+
+    return await run_batch("create_security_group", group_data.security_groups, create_one)
 
 @router.get("/", tags=["Networking - List Security Groups"])
+@conditional_get
 async def list_security_groups(
     region: RegionName,
     cloud_environment: CloudEnvironment = CloudEnvironment.OSPC,
@@ -55,17 +52,9 @@ async def list_security_groups(
     """
     List all security groups.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/security-groups"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.get(url, headers=headers)
+    response = await upstream.networking.get("/security-groups")
     
     if response.status_code != 200:
         raise HTTPException(
@@ -77,6 +66,7 @@ async def list_security_groups(
 
 @router.get("/{security_group_id}", tags=["Networking - Get Security Group"])
 @router.get("")
+@conditional_get
 async def get_security_group(
     region: RegionName,
     security_group_id: str,
@@ -86,25 +76,12 @@ async def get_security_group(
     """
     Get details of a specific security group.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/security-groups/{security_group_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
-    
-    response = await client.get(url, headers=headers)
-    
-    if response.status_code != 200:
-        raise HTTPException(
-            status_code=response.status_code,
-            detail=response.text
-        )
+    async def fetch():
+        upstream = await get_upstream(cloud_environment, region, client)
     
-    return response.json()
+        return await upstream.networking.get(f"/security-groups/{security_group_id}")
+
+    return await resource_cache.get("security_groups", cloud_environment.value, region.value, security_group_id, fetch)
 
 @router.delete("/{security_group_id}", tags=["Networking - Delete Security Group"])
 async def delete_security_group(
@@ -116,17 +93,9 @@ async def delete_security_group(
     """
     Delete a security group.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/security-groups/{security_group_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.delete(url, headers=headers)
+    response = await upstream.networking.delete(f"/security-groups/{security_group_id}")
     
     if response.status_code != 204:
         raise HTTPException(
@@ -134,4 +103,5 @@ async def delete_security_group(
             detail=response.text
         )
     
+    await resource_cache.invalidate("security_groups", cloud_environment.value, region.value, security_group_id)
     return {"status": "success", "message": "Security group deleted successfully"}
\ No newline at end of file
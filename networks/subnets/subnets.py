@@ -1,10 +1,15 @@
 import httpx
 
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
 from typing import Optional
 
-from auth import get_auth_token
-from config import API_BASE_URLS, get_async_client
+from cache import resource_cache
+from config import get_async_client
+from etag import conditional_get
+from idempotency import idempotent
+from ownership import ownership
+from scheduling import current_tenant
+from upstream import get_upstream, run_batch
 from models import RegionName, SubnetCreate, SubnetCreateList, SubnetUpdate, SubnetUpdateList, CloudEnvironment
 
 
@@ -13,25 +18,19 @@ router = APIRouter(prefix="/subnets", tags=["subnets"])
 
 # List all subnets
 @router.get("/", tags=["Networking - List all Subnets"])
+@conditional_get
 async def list_subnets(
     region: RegionName,
     network_id: Optional[str] = None,
     cidr: Optional[str] = None,
+    mine: bool = Query(False, description="Only what the caller (X-Tenant-Id) created, from the ownership index"),
     cloud_environment: CloudEnvironment = CloudEnvironment.OSPC,
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
-    """List all subnets with optional filtering"""
-    # TODO: Show only user related subnets, not all subnets in the region
-    # TODO: Store subnets metadata in local database MySQL or MongoDB
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/subnets"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    """List all subnets with optional filtering; mine=true only the caller's"""
+    if mine:
+        return ownership.listing("subnets", cloud_environment, region, {"network_id": network_id, "cidr": cidr})
+    upstream = await get_upstream(cloud_environment, region, client)
 
     params = {}
     if network_id:
@@ -39,13 +38,14 @@ async def list_subnets(
     if cidr:
         params["cidr"] = cidr
     
-    response = await client.get(url, headers=headers, params=params)
+    response = await upstream.networking.get("/subnets", params=params)
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail=response.text)
     return response.json()
 
 # Create subnet
 @router.post("/", tags=["Networking - Create Subnets"])
+@idempotent("create_subnet")
 async def create_subnet(
     region: RegionName,
     subnet_data_list: SubnetCreateList = Body(...),
@@ -53,37 +53,30 @@ async def create_subnet(
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """Create a new subnets"""
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/subnets"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response_list = []
-    for subnet_data in subnet_data_list.subnets:
+    async def create_one(subnet_data):
         if not isinstance(subnet_data, SubnetCreate):
             raise HTTPException(
                 status_code=400,
                 detail="Invalid subnet data provided"
             )
         
-        response = await client.post(
-            url,
-            json={"subnet": subnet_data.dict(exclude_none=True)},
-            headers=headers
+        response = await upstream.networking.post(
+            "/subnets",
+            json={"subnet": subnet_data.dict(exclude_none=True)}
         )
 
         if response.status_code != 201:
             raise HTTPException(status_code=response.status_code, detail=response.text)
-        response_list.append(response.json())
-    return response_list
+        ownership.add("subnets", cloud_environment.value, region.value, current_tenant.get(), response.json().get("subnet", {}))
+        return response.json()
+
+    return await run_batch("create_subnet", subnet_data_list.subnets, create_one)
 
 # Get subnet details
 @router.get("/{subnet_id}", tags=["Networking - Get Subnet"])
+@conditional_get
 async def get_subnet(
     region: RegionName,
     subnet_id: str,
@@ -91,20 +84,12 @@ async def get_subnet(
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """Get specific subnet details"""
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/subnets/{subnet_id}"
+    async def fetch():
+        upstream = await get_upstream(cloud_environment, region, client)
     
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
-    
-    response = await client.get(url, headers=headers)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+        return await upstream.networking.get(f"/subnets/{subnet_id}")
+
+    return await resource_cache.get("subnets", cloud_environment.value, region.value, subnet_id, fetch)
 
 # TODO: Update subnet with valid and proper fields as per docs
 @router.put("/{subnet_id}", tags=["Networking - Update Subnets"])
@@ -118,23 +103,15 @@ async def update_subnet(
     """Update subnet attributes"""
     ## TODO: Handle for update list with list of subnets update objects
 
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/subnets/{subnet_id}"
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
-    
-    response = await client.put(
-        url,
-        json={"subnet": subnet_data.dict(exclude_none=True)},
-        headers=headers
+    response = await upstream.networking.put(
+        f"/subnets/{subnet_id}",
+        json={"subnet": subnet_data.dict(exclude_none=True)}
     )
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail=response.text)
+    await resource_cache.invalidate("subnets", cloud_environment.value, region.value, subnet_id)
     return response.json()
 
 # Delete subnet
@@ -146,17 +123,11 @@ async def delete_subnet(
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """Delete a subnet"""
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["networking"]
-    url = f"{base_url.format(region=region.value)}/subnets/{subnet_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.delete(url, headers=headers)
+    response = await upstream.networking.delete(f"/subnets/{subnet_id}")
     if response.status_code != 204:
         raise HTTPException(status_code=response.status_code, detail=response.text)
+    await resource_cache.invalidate("subnets", cloud_environment.value, region.value, subnet_id)
+    ownership.remove("subnets", cloud_environment.value, region.value, subnet_id)
     return {"status": "success", "message": "Subnet deleted successfully"}
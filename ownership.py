@@ -0,0 +1,231 @@
+import asyncio
+import functools
+import time
+import httpx
+
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+
+from config import OWNERSHIP_RECONCILE_INTERVAL, FANOUT_REGION_TIMEOUT
+from deadline import current_deadline
+from inventory.inventory import list_all, describe
+from log import get_logger
+from metrics import Counter, Gauge
+from models import CloudEnvironment, RegionName, RegionScope
+from scheduling import DEFAULT_TENANT, POLLING, current_priority, current_tenant
+from state import StateBackend, get_backend, run_elected
+from upstream import get_upstream, upstream_health
+from upstream.limiter import Batch, current_batch
+
+
+logger = get_logger(__name__)
+
+# Resource kind -> (UpstreamClient service, list path, collection key), the lists reconcile() reads
+OWNERSHIP_SOURCES = {
+    "servers": ("servers", "/servers/detail", "servers"),  # detail: reconcile reads metadata.owner
+    "volumes": ("volumes", "/volumes", "volumes"),
+    "networks": ("networking", "/networks", "networks"),
+    "subnets": ("networking", "/subnets", "subnets"),
+    "ports": ("networking", "/ports", "ports"),
+}
+SERVER_FIELDS = ("id", "name", "links", "metadata")  # what list_servers(mine=true) returns per server
+OWNER_METADATA_KEY = "owner"  # server metadata create_server stamps with the caller's (unauthenticated) X-Tenant-Id
+CLAIMS_CAS_ATTEMPTS = 5
+
+ownership_changes = Counter("ownership_index_changes_total", "Ownership index entries changed by reconciliation", ("kind", "change"))
+
+
+def request_owner() -> str:
+    """
+    The caller's X-Tenant-Id for a mine=true listing; 400 without one. The header is not
+    authenticated: it scopes listings for cooperating callers, it does not keep one caller
+    from reading another's by sending their tenant.
+    """
+    owner = current_tenant.get()
+    if owner == DEFAULT_TENANT:
+        raise HTTPException(status_code=400, detail="mine=true needs an X-Tenant-Id header")
+    return owner
+
+
+def listing_regions(region) -> List[RegionName]:
+    """Regions a mine=true listing reads from the index: one, or every region for region=all."""
+    if region == RegionScope.ANY:
+        raise HTTPException(status_code=400, detail="mine=true lists one region or region=all")
+    return list(RegionName) if region == RegionScope.ALL else [RegionName(region.value)]
+
+
+def server_entry(item: dict) -> dict:
+    return {field: item[field] for field in SERVER_FIELDS if field in item}
+
+
+class OwnershipIndex:
+    """
+    Which of our callers (X-Tenant-Id) created each server, volume, network, subnet and port,
+    so per-caller listings are a dict lookup plus the caller's own items instead of a scan of
+    everything upstream has in the region.
+
+    Handlers add() what they create, from the creation response (servers also carry their owner
+    in metadata), and remove() what they delete. Workers share the index through the state
+    backend, one `ownership:<kind>:<environment>:<region>` map of id -> {owner, item, added} each.
+    Every OWNERSHIP_RECONCILE_INTERVAL seconds the worker leading "ownership" (run_elected)
+    reconciles the maps with upstream: it drops what upstream no longer lists, refreshes the
+    stored items and adopts servers by metadata. The others follow(): they merge what they added
+    and removed since their last pass into the maps and take the result, without calling upstream.
+    The lease is renewed on run_elected's heartbeat, not per pass, so it outlives the interval
+    and a long pass: one worker reconciles across the fleet.
+    """
+
+    def __init__(self):
+        # (kind, environment, region) -> owner -> resource id -> item, in upstream's list shape
+        self.items: Dict[Tuple[str, str, str], Dict[str, Dict[str, dict]]] = {}
+        # (kind, environment, region) -> resource id -> (owner, time.time() added)
+        self.claims: Dict[Tuple[str, str, str], Dict[str, Tuple[str, float]]] = {}
+        # (kind, environment, region) -> resource id -> time.time() removed, until shared
+        self.removed: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+        # (kind, environment, region) -> start of the last pass that got its changes into the shared map
+        self.shared_at: Dict[Tuple[str, str, str], float] = {}
+
+    def add(self, kind: str, cloud_environment: str, region: str, owner: str, item: dict):
+        if owner == DEFAULT_TENANT or not item.get("id"):
+            return
+        key = (kind, cloud_environment, region)
+        self.put(key, item["id"], owner, item, time.time())
+        self.removed.get(key, {}).pop(item["id"], None)
+
+    def remove(self, kind: str, cloud_environment: str, region: str, resource_id: str):
+        key = (kind, cloud_environment, region)
+        self.drop(key, resource_id)
+        self.removed.setdefault(key, {})[resource_id] = time.time()
+
+    def put(self, key: Tuple[str, str, str], resource_id: str, owner: str, item: dict, added: float):
+        self.drop(key, resource_id)
+        self.items.setdefault(key, {}).setdefault(owner, {})[resource_id] = item
+        self.claims.setdefault(key, {})[resource_id] = (owner, added)
+
+    def drop(self, key: Tuple[str, str, str], resource_id: str):
+        claim = self.claims.get(key, {}).pop(resource_id, None)
+        if claim is not None:
+            owned = self.items[key][claim[0]]
+            owned.pop(resource_id, None)
+            if not owned:
+                del self.items[key][claim[0]]
+
+    def owned(self, kind: str, cloud_environment: str, region: str, owner: str, filters: Optional[dict] = None) -> List[dict]:
+        """The owner's items of one kind in one region; filters are exact matches on item fields."""
+        items = self.items.get((kind, cloud_environment, region), {}).get(owner, {}).values()
+        filters = {field: value for field, value in (filters or {}).items() if value is not None}
+        if not filters:
+            return list(items)
+        return [item for item in items if all(item.get(field) == value for field, value in filters.items())]
+
+    def listing(self, kind: str, cloud_environment: CloudEnvironment, region, filters: Optional[dict] = None) -> dict:
+        """A list endpoint's mine=true response: the caller's items in upstream's {kind: [...]} shape."""
+        owner = request_owner()
+        return {kind: [item for name in listing_regions(region) for item in self.owned(kind, cloud_environment.value, name.value, owner, filters)]}
+
+    def size(self, kind: str) -> int:
+        return sum(len(claims) for (claim_kind, _, _), claims in self.claims.items() if claim_kind == kind)
+
+    async def reconcile(self, client: httpx.AsyncClient, backend: Optional[StateBackend] = None):
+        """Leader pass: take the other workers' changes, then check every kind in every region this worker knows of."""
+        backend = backend if backend is not None else get_backend()
+        current_deadline.set(None)
+        current_batch.set(Batch("ownership"))  # retry list calls answered 429
+        current_priority.set(POLLING)
+        await self.follow(backend)
+        regions = upstream_health.seen_regions() | {(CloudEnvironment(environment), RegionName(region)) for (_, environment, region), claims in self.claims.items() if claims}
+        targets = [(kind, environment, region) for environment, region in regions for kind in OWNERSHIP_SOURCES]
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self.reconcile_kind(client, backend, *target), FANOUT_REGION_TIMEOUT) for target in targets),
+            return_exceptions=True
+        )
+        for (kind, environment, region), result in zip(targets, results):
+            if isinstance(result, BaseException):
+                logger.info("ownership_reconcile_failed", kind=kind, cloud_environment=environment.value, region=region.value, error=describe(result))
+
+    async def reconcile_kind(self, client: httpx.AsyncClient, backend: StateBackend, kind: str, cloud_environment: CloudEnvironment, region: RegionName):
+        upstream = await get_upstream(cloud_environment, region, client)
+        listed_at = time.time()
+        items, complete = await list_all(upstream, *OWNERSHIP_SOURCES[kind])
+        if not complete:
+            # Anything past the last page would look deleted: refresh and adopt only
+            logger.info("ownership_list_truncated", kind=kind, cloud_environment=cloud_environment.value, region=region.value, items=len(items))
+        upstream_items = {item["id"]: item for item in items}
+        await self.share_claims(backend, (kind, cloud_environment.value, region.value), upstream_items, listed_at if complete else None)
+
+    async def follow(self, backend: StateBackend):
+        """Follower pass: swap changes with the shared map of every kind in every region."""
+        for environment in CloudEnvironment:
+            for region in RegionName:
+                for kind in OWNERSHIP_SOURCES:
+                    await self.share_claims(backend, (kind, environment.value, region.value))
+
+    async def share_claims(self, backend: StateBackend, key: Tuple[str, str, str], upstream_items: Optional[dict] = None, listed_at: Optional[float] = None):
+        """
+        Merge what this worker added to and removed from `key` since its last pass into the shared
+        map, and make the result its index. With upstream_items (the leader's list of the kind in
+        the region), also refresh items from upstream, adopt servers by metadata and, given
+        listed_at because the list was complete, drop ids upstream no longer has. Left to the
+        next pass when it keeps losing races.
+        """
+        shared_key = "ownership:" + ":".join(key)
+        started, since = time.time(), self.shared_at.get(key, 0.0)
+        for _ in range(CLAIMS_CAS_ATTEMPTS):
+            current = await backend.get(shared_key)
+            merged = dict(current or {})
+            for resource_id, (owner, added) in self.claims.get(key, {}).items():
+                if added >= since:
+                    merged[resource_id] = {"owner": owner, "item": self.items[key][owner][resource_id], "added": added}
+            for resource_id in self.removed.get(key, {}):
+                merged.pop(resource_id, None)
+            if upstream_items is not None:
+                merged = self.refresh(key, merged, upstream_items, listed_at)
+            if merged == (current or {}) or await backend.compare_and_set(shared_key, current, merged):
+                break
+        else:
+            return
+        self.adopt(key, merged, started)
+        self.shared_at[key] = started
+        removed = self.removed.get(key)
+        if removed:
+            self.removed[key] = {resource_id: at for resource_id, at in removed.items() if at >= started}
+
+    def refresh(self, key: Tuple[str, str, str], merged: dict, upstream_items: dict, listed_at: Optional[float]) -> dict:
+        kind, removed = key[0], self.removed.get(key, {})
+        refreshed = {}
+        for resource_id, entry in merged.items():
+            item = upstream_items.get(resource_id)
+            if item is not None:
+                refreshed[resource_id] = {**entry, "item": server_entry(item) if kind == "servers" else item}
+            elif listed_at is None or entry["added"] >= listed_at:  # not something created while the list was read
+                refreshed[resource_id] = entry
+        if kind == "servers":
+            for resource_id, item in upstream_items.items():
+                owner = (item.get("metadata") or {}).get(OWNER_METADATA_KEY)
+                if owner and owner != DEFAULT_TENANT and resource_id not in refreshed and resource_id not in removed:
+                    refreshed[resource_id] = {"owner": owner, "item": server_entry(item), "added": listed_at or time.time()}
+        return refreshed
+
+    def adopt(self, key: Tuple[str, str, str], merged: dict, started: float):
+        """Take the shared map as this worker's index for `key`, keeping local changes made since `started`."""
+        claims, removed = self.claims.get(key, {}), self.removed.get(key, {})
+        for resource_id, (_, added) in list(claims.items()):
+            if resource_id not in merged and added < started:
+                self.drop(key, resource_id)
+                ownership_changes.labels(key[0], "removed").inc()
+        for resource_id, entry in merged.items():
+            claim = claims.get(resource_id)
+            if resource_id in removed or (claim is not None and claim[1] >= started):
+                continue
+            if claim is None:
+                ownership_changes.labels(key[0], "adopted").inc()
+            self.put(key, resource_id, entry["owner"], entry["item"], entry["added"])
+
+    async def run(self, client: httpx.AsyncClient, interval: float = OWNERSHIP_RECONCILE_INTERVAL):
+        backend = get_backend()
+        await run_elected("ownership", functools.partial(self.reconcile, client, backend), interval, on_follow=functools.partial(self.follow, backend))
+
+
+ownership = OwnershipIndex()
+
+Gauge("ownership_index_items", "Resources with a known owner in the ownership index", ("kind",), collect=lambda: {kind: ownership.size(kind) for kind in OWNERSHIP_SOURCES})
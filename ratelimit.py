@@ -0,0 +1,280 @@
+import asyncio
+import itertools
+import math
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    RATE_LIMIT_RATE, RATE_LIMIT_BURST, RATE_LIMIT_ADDRESS_RATE, RATE_LIMIT_ADDRESS_BURST, RATE_LIMIT_ROUTES,
+    RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SYNC_INTERVAL, SHED_MAX_INFLIGHT, SHED_LOOP_LAG, SHED_RETRY_AFTER
+)
+from metrics import Counter, Gauge, loop_monitor
+from scheduling import DEFAULT_TENANT, tenant_of
+from state import StateBackend
+from state.leader import worker_id
+
+
+EXEMPT_PREFIXES = ("/health", "/metrics", "/debug")  # never limited or shed, so operators can still look
+STREAM_PREFIXES = ("/events",)  # long-lived streams: limited when opened, not counted as queued work
+USAGE_KEY = "ratelimit:usage"
+USAGE_CAS_ATTEMPTS = 5
+EVICTION_SCAN = 16  # oldest buckets looked at for a full one to drop when a rule holds RATE_LIMIT_MAX_KEYS
+
+rejections = Counter("http_requests_rejected_total", "Requests turned away before routing, by reason", ("reason",))
+# Children resolved once: the rejection path allocates nothing it does not have to
+rejected_tenant, rejected_route, rejected_address = rejections.labels("tenant_rate"), rejections.labels("route_rate"), rejections.labels("address_rate")
+shed_inflight, shed_loop_lag = rejections.labels("shed_inflight"), rejections.labels("shed_loop_lag")
+
+
+class TokenBucket:
+    """`taken` counts the tokens this worker took since it last shared its usage."""
+    __slots__ = ("tokens", "updated", "taken")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+        self.taken = 0
+
+    def take(self, rate: float, burst: float, now: float) -> float:
+        """Take one token; returns 0 when granted, else the seconds until one will be there."""
+        tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if tokens >= 1:
+            self.tokens = tokens - 1
+            self.taken += 1
+            return 0.0
+        self.tokens = tokens
+        return (1 - tokens) / rate
+
+    def give_back(self):
+        """Undo a take() for a request another bucket refused."""
+        self.tokens += 1
+        self.taken -= 1
+
+
+class Rule:
+    """
+    One set of buckets: per tenant for every request (method None, prefix "") or for one method
+    and path prefix, or per client address for every request.
+    """
+    __slots__ = ("name", "method", "prefix", "rate", "burst", "buckets")
+
+    def __init__(self, name: str, rate: float, burst: float):
+        method, _, prefix = name.partition(" ")
+        self.name = name
+        self.method = None if method == "*" else method
+        self.prefix = prefix
+        self.rate = rate
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.method is None or self.method == method) and path.startswith(self.prefix)
+
+    def bucket(self, key: str, now: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= RATE_LIMIT_MAX_KEYS:
+                self.evict(now)
+            bucket = self.buckets[key] = TokenBucket(self.burst, now)
+        return bucket
+
+    def evict(self, now: float):
+        """
+        Drop a bucket that would be full again, so nothing is forgiven, from the EVICTION_SCAN
+        oldest; the oldest when none is. A dropped bucket comes back full.
+        """
+        victim = next(iter(self.buckets))
+        for key, bucket in itertools.islice(self.buckets.items(), EVICTION_SCAN):
+            if bucket.tokens + (now - bucket.updated) * self.rate >= self.burst:
+                victim = key
+                break
+        del self.buckets[victim]
+
+
+class RateLimiter:
+    """
+    Token buckets per tenant: one across all routes plus one per RATE_LIMIT_ROUTES rule the
+    request matches; and one per client address across all routes and tenants, since the tenant
+    is whatever X-Tenant-Id the client sends. A request takes a token from each of its buckets
+    or, when any of them is empty, from none. A check is a dict lookup and a little arithmetic
+    per bucket.
+
+    Buckets live in the worker. With a shared STATE_BACKEND, share_usage() lets workers tell
+    each other every RATE_LIMIT_SYNC_INTERVAL how many tokens they took per bucket, and each
+    takes the others' out of its own buckets, so a tenant gets about one rate across the fleet
+    rather than one per worker (bursts can still reach one burst per worker).
+    """
+
+    def __init__(
+        self, rate: float = RATE_LIMIT_RATE, burst: float = RATE_LIMIT_BURST, routes: Dict[str, Tuple[float, float]] = RATE_LIMIT_ROUTES,
+        address_rate: float = RATE_LIMIT_ADDRESS_RATE, address_burst: float = RATE_LIMIT_ADDRESS_BURST
+    ):
+        self.tenant_rule = Rule("*", rate, burst) if rate > 0 else None
+        self.rules = [Rule(name, *limits) for name, limits in routes.items()] if rate > 0 else []
+        self.address_rule = Rule("address", address_rate, address_burst) if rate > 0 and address_rate > 0 else None
+
+    def check(self, key: str, address: Optional[str], method: str, path: str, now: float) -> Tuple[float, Optional[Rule]]:
+        """
+        (0, None) when the request may go ahead, else (seconds until it could, the rule that
+        refused it). A refused request leaves every bucket as it found it.
+        """
+        if self.tenant_rule is None:
+            return 0.0, None
+        rule = self.tenant_rule
+        bucket = rule.bucket(key, now)
+        wait = bucket.take(rule.rate, rule.burst, now)
+        if wait:
+            return wait, rule
+        granted = (bucket,)
+        rule = self.address_rule
+        if rule is not None and address is not None:
+            bucket = rule.bucket(address, now)
+            wait = bucket.take(rule.rate, rule.burst, now)
+            if wait:
+                return self.refuse(granted, wait, rule)
+            granted += (bucket,)
+        for rule in self.rules:
+            if rule.matches(method, path):
+                bucket = rule.bucket(key, now)
+                wait = bucket.take(rule.rate, rule.burst, now)
+                if wait:
+                    return self.refuse(granted, wait, rule)
+                granted += (bucket,)
+        return 0.0, None
+
+    @staticmethod
+    def refuse(granted: Tuple[TokenBucket, ...], wait: float, rule: Rule) -> Tuple[float, Rule]:
+        for bucket in granted:
+            bucket.give_back()
+        return wait, rule
+
+    def all_rules(self) -> List[Rule]:
+        rules = ([self.tenant_rule] if self.tenant_rule is not None else []) + self.rules
+        return rules + ([self.address_rule] if self.address_rule is not None else [])
+
+    def collect_taken(self) -> List[list]:
+        """[rule name, key, tokens] taken by this worker since the last call."""
+        taken = []
+        for rule in self.all_rules():
+            for key, bucket in rule.buckets.items():
+                if bucket.taken:
+                    taken.append([rule.name, key, bucket.taken])
+                    bucket.taken = 0
+        return taken
+
+    def deduct(self, taken: List[list]):
+        rules = {rule.name: rule for rule in self.all_rules()}
+        now = time.monotonic()
+        for name, key, tokens in taken:
+            rule = rules.get(name)
+            if rule is not None:
+                bucket = rule.bucket(key, now)
+                bucket.tokens = max(bucket.tokens - tokens, -rule.burst)
+
+    async def share_usage(self, backend: StateBackend, interval: float = RATE_LIMIT_SYNC_INTERVAL):
+        """
+        Background task: publish this worker's usage under USAGE_KEY, next to the other workers'
+        latest, and deduct theirs. Usage that loses USAGE_CAS_ATTEMPTS races is dropped, so the
+        shared limit is approximate, erring on the lenient side.
+        """
+        me, sequence, applied = worker_id(), 0, {}
+        while True:
+            await asyncio.sleep(interval)
+            sequence += 1
+            taken, now = self.collect_taken(), time.time()
+            usage = {}
+            for _ in range(USAGE_CAS_ATTEMPTS):
+                current = await backend.get(USAGE_KEY)
+                usage = {worker: entry for worker, entry in (current or {}).items() if worker != me and now - entry["at"] < interval * 10}
+                usage[me] = {"at": now, "sequence": sequence, "taken": taken}
+                if await backend.compare_and_set(USAGE_KEY, current, usage, ttl=interval * 10):
+                    break
+            for worker, entry in usage.items():
+                if worker != me and applied.get(worker) != entry["sequence"]:
+                    self.deduct(entry["taken"])
+            applied = {worker: entry["sequence"] for worker, entry in usage.items()}
+
+
+rate_limiter = RateLimiter()
+
+Gauge("rate_limit_buckets", "Token buckets held per rate limit rule", ("rule",), collect=lambda: {(rule.name,): len(rule.buckets) for rule in rate_limiter.all_rules()})
+
+
+def rejection(status: int, detail: bytes, retry_after: int) -> Tuple[dict, dict]:
+    body = b'{"detail":"' + detail + b'"}'
+    start = {
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    }
+    return start, {"type": "http.response.body", "body": body}
+
+
+OVERLOADED = rejection(503, b"Service overloaded, retry later", SHED_RETRY_AFTER)
+# 429s by whole seconds to wait: the common ones are built once
+RATE_LIMITED = {seconds: rejection(429, b"Rate limit exceeded", seconds) for seconds in range(1, 61)}
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware, outermost but for CORS: refuses work before any of it is done, and
+    its refusals still carry CORS headers.
+
+    * 503 with Retry-After while SHED_MAX_INFLIGHT requests are already being handled or the
+      event loop runs SHED_LOOP_LAG seconds late (loop_monitor), so an overload sheds the excess
+      instead of making every request slow;
+    * 429 with Retry-After when the tenant or the client address is over its rate_limiter budget.
+
+    Health, metrics and debug routes are exempt.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None, max_inflight: int = SHED_MAX_INFLIGHT, max_lag: float = SHED_LOOP_LAG):
+        self.app = app
+        self.limiter = limiter if limiter is not None else rate_limiter
+        self.max_inflight = max_inflight
+        self.max_lag = max_lag
+        self.inflight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        if self.max_inflight and self.inflight >= self.max_inflight:
+            shed_inflight.inc()
+            await self.reject(send, OVERLOADED)
+            return
+        if self.max_lag and loop_monitor.lag >= self.max_lag:
+            shed_loop_lag.inc()
+            await self.reject(send, OVERLOADED)
+            return
+        tenant, address = tenant_of(scope), scope["client"][0] if scope.get("client") else None
+        if tenant == DEFAULT_TENANT and address is not None:
+            tenant = address  # callers without a tenant are limited per address
+        wait, rule = self.limiter.check(tenant, address, scope["method"], scope["path"], time.monotonic())
+        if wait:
+            if rule is self.limiter.tenant_rule:
+                rejected_tenant.inc()
+            else:
+                (rejected_address if rule is self.limiter.address_rule else rejected_route).inc()
+            seconds = math.ceil(wait)
+            await self.reject(send, RATE_LIMITED.get(seconds) or rejection(429, b"Rate limit exceeded", seconds))
+            return
+        if scope["path"].startswith(STREAM_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        self.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.inflight -= 1
+
+    @staticmethod
+    async def reject(send, response: Tuple[dict, dict]):
+        await send(response[0])
+        await send(response[1])
@@ -7,6 +7,11 @@ from networks.subnets import subnets_router
 from servers import servers_router
 from servers.keypair import keypair_router
 from storage import storage_router
+from events import events_router
+from metrics import metrics_router
+from diagnostics import diagnostics_router
+from inventory import inventory_router
+from health import health_router
 
-all_routers = [auth_router, networks_router, servers_router, storage_router, keypair_router, security_groups_router, security_group_rules_router, ports_router, subnets_router]
+all_routers = [auth_router, networks_router, servers_router, storage_router, keypair_router, security_groups_router, security_group_rules_router, ports_router, subnets_router, events_router, metrics_router, diagnostics_router, inventory_router, health_router]
 
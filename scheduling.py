@@ -0,0 +1,136 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config import SCHEDULER_CLASS_SHARES, SCHEDULER_TENANT_WEIGHTS
+from metrics import Histogram
+
+
+# Priority classes of outbound upstream calls, highest first
+INTERACTIVE, POLLING, BULK = "interactive", "polling", "bulk"
+PRIORITIES = (INTERACTIVE, POLLING, BULK)
+
+TENANT_HEADER = b"x-tenant-id"
+DEFAULT_TENANT = "anonymous"
+MAX_TENANT_LENGTH = 64
+
+# Class and tenant of the upstream calls made by the current task. Requests are interactive
+# unless a batch (bulk) or a background poller (polling) says otherwise.
+current_priority: contextvars.ContextVar[str] = contextvars.ContextVar("current_priority", default=INTERACTIVE)
+current_tenant: contextvars.ContextVar[str] = contextvars.ContextVar("current_tenant", default=DEFAULT_TENANT)
+
+queue_wait = Histogram(
+    "upstream_queue_wait_seconds", "Time upstream calls waited for a slot of their (region, service), by priority class", ("priority",),
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+
+@contextlib.contextmanager
+def priority(name: str):
+    """Run a block's upstream calls in another priority class: `with priority(POLLING): ...`"""
+    token = current_priority.set(name)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+def background_task(coroutine: Awaitable) -> asyncio.Task:
+    """
+    Start a task that outlives the request starting it in an empty context: it inherits none of
+    the request's tenant, priority, deadline or trace, so its upstream calls are not queued as
+    that caller's and its spans do not pile onto a finished trace.
+    """
+    return contextvars.Context().run(asyncio.ensure_future, coroutine)
+
+
+def tenant_of(scope) -> str:
+    for name, value in scope["headers"]:
+        if name == TENANT_HEADER:
+            return value.decode("latin-1")[:MAX_TENANT_LENGTH] or DEFAULT_TENANT
+    return DEFAULT_TENANT
+
+
+def admits(priority_class: str, inflight: int, limit: float) -> bool:
+    """Whether a class may take another slot: each class only fills its SCHEDULER_CLASS_SHARES of the limit."""
+    return inflight < max(1.0, limit * SCHEDULER_CLASS_SHARES[priority_class])
+
+
+class FairQueue:
+    """
+    Upstream calls waiting for a slot of one (region, service).
+
+    Classes are served in strict priority order. Within a class, tenants share the slots by
+    weighted fair queueing: each waiting call gets a virtual finish tag of
+        max(class virtual time, tenant's previous tag) + 1 / tenant weight
+    and the smallest tag goes next, so a tenant queueing 500 creates takes turns with one
+    queueing a single call instead of going first for all 500. Push and pop are O(log n).
+    Calls cancelled while waiting stay in the heap and are skipped when they reach the top.
+    """
+
+    def __init__(self):
+        self.heaps: Dict[str, List[tuple]] = {name: [] for name in PRIORITIES}
+        self.virtual_time: Dict[str, float] = {name: 0.0 for name in PRIORITIES}
+        self.finish: Dict[str, Dict[str, float]] = {name: {} for name in PRIORITIES}  # class -> tenant -> last tag
+        self.sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return sum(len(heap) for heap in self.heaps.values())
+
+    def waiting(self, priority_class: str) -> bool:
+        """Calls of this class or a higher one are queued."""
+        for name in PRIORITIES:
+            if self.heaps[name]:
+                return True
+            if name == priority_class:
+                return False
+        return False
+
+    def push(self, priority_class: str, tenant: str, waiter):
+        finishes = self.finish[priority_class]
+        tag = max(self.virtual_time[priority_class], finishes.get(tenant, 0.0)) + 1 / SCHEDULER_TENANT_WEIGHTS.get(tenant, 1.0)
+        finishes[tenant] = tag
+        heapq.heappush(self.heaps[priority_class], (tag, next(self.sequence), waiter))
+
+    def pop(self, admissible: Callable[[str], bool]) -> Optional[object]:
+        """
+        The next waiter of the highest class with calls waiting, or None when `admissible` does
+        not let that class in: lower classes wait behind it rather than take the slot.
+        """
+        for name in PRIORITIES:
+            heap = self.heaps[name]
+            while heap and heap[0][2].done():
+                heapq.heappop(heap)
+            if not heap:
+                self.finish[name].clear()  # idle class: tenants start level next time
+                continue
+            if not admissible(name):
+                return None
+            tag, _, waiter = heapq.heappop(heap)
+            self.virtual_time[name] = tag
+            return waiter
+        return None
+
+
+class TenantMiddleware:
+    """
+    Pure ASGI middleware taking the caller's tenant from X-Tenant-Id, so the outbound
+    scheduler can queue each tenant's upstream calls fairly against everyone else's.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_tenant.set(tenant_of(scope))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(token)
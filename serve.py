@@ -0,0 +1,57 @@
+"""
+Production launcher. `python app.py` runs uvicorn with reload on, which is for development only.
+
+    python serve.py --workers 4 --prewarm ospc:dfw,ospc:iad
+
+Uses uvloop and httptools when they are installed (pip install uvloop httptools) and falls back
+to asyncio and h11 otherwise. Every option can also be set through the environment variable
+shown in its help. On SIGTERM a worker stops accepting connections, lets in-flight requests
+(batch creates included) finish for up to --graceful-timeout seconds, then runs the app's
+lifespan shutdown (see lifespan.py).
+"""
+import argparse
+import importlib.util
+import os
+import uvicorn
+
+
+def available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the VM Allocater API for production")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"), help="HOST")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")), help="PORT")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))), help="WEB_CONCURRENCY, default one per CPU")
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("BACKLOG", "2048")), help="BACKLOG, pending connections the kernel queues per socket")
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("KEEP_ALIVE", "75")), help="KEEP_ALIVE, seconds an idle client connection stays open; keep above the load balancer's idle timeout")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("DRAIN_TIMEOUT", "30")), help="DRAIN_TIMEOUT, seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--limit-concurrency", type=int, default=int(os.getenv("LIMIT_CONCURRENCY", "0")) or None, help="LIMIT_CONCURRENCY, connections per worker before 503s (default unlimited)")
+    parser.add_argument("--prewarm", default=os.getenv("PREWARM", ""), help="PREWARM, environment:region pairs to warm before serving, e.g. ospc:dfw,ospc:iad")
+    parser.add_argument("--access-log", action="store_true", help="Log every request (off by default, /metrics already counts them)")
+    args = parser.parse_args()
+
+    # Workers are separate processes: lifespan.py reads these from the environment they inherit
+    os.environ["PREWARM"] = args.prewarm
+    os.environ["DRAIN_TIMEOUT"] = str(args.graceful_timeout)
+
+    uvicorn.run(
+        "app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if available("uvloop") else "asyncio",
+        http="httptools" if available("httptools") else "h11",
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        limit_concurrency=args.limit_concurrency,
+        access_log=args.access_log,
+        proxy_headers=True,
+        lifespan="on"
+    )
+
+
+if __name__ == "__main__":
+    main()
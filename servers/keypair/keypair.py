@@ -3,8 +3,11 @@ import httpx
 from fastapi import APIRouter, HTTPException, Depends, Body
 from typing import List
 
-from auth import get_auth_token
-from config import API_BASE_URLS, get_async_client
+from cache import resource_cache
+from config import get_async_client
+from etag import conditional_get
+from idempotency import idempotent
+from upstream import get_upstream
 from models import RegionName, CloudEnvironment, KeyPairCreate, KeyPairImport, KeyPairResponse
 
 router = APIRouter(prefix="/keypairs", tags=["Key Pair Management"])
@@ -12,6 +15,7 @@ router = APIRouter(prefix="/keypairs", tags=["Key Pair Management"])
 
 @router.post("/")
 @router.post("")
+@idempotent("create_keypair")
 async def create_keypair(
     region: RegionName,
     keypair_data: KeyPairCreate = Body(...),
@@ -25,27 +29,20 @@ async def create_keypair(
         - Public key
         - Fingerprint
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/os-keypairs"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
     payload = {
         "keypair": keypair_data.dict()
     }
     
     try:
-        response = await client.post(url, json=payload, headers=headers)
+        response = await upstream.servers.post("/os-keypairs", json=payload)
         if response.status_code != 200:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=f"Failed to create keypair: {response.text}"
             )
+        await resource_cache.invalidate("keypairs", cloud_environment.value, region.value)
         return response.json()["keypair"]
     except httpx.RequestError as e:
         raise HTTPException(
@@ -54,6 +51,7 @@ async def create_keypair(
         )
 
 @router.post("/import")
+@idempotent("import_keypair")
 async def import_keypair(
     region: RegionName,
     keypair_data: KeyPairImport = Body(...),
@@ -66,27 +64,20 @@ async def import_keypair(
         - Key pair name
         - SSH public key content
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/os-keypairs"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
     payload = {
         "keypair": keypair_data.dict()
     }
     
     try:
-        response = await client.post(url, json=payload, headers=headers)
+        response = await upstream.servers.post("/os-keypairs", json=payload)
         if response.status_code != 200:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=f"Failed to import keypair: {response.text}"
             )
+        await resource_cache.invalidate("keypairs", cloud_environment.value, region.value)
         return response.json()["keypair"]
     except httpx.RequestError as e:
         raise HTTPException(
@@ -96,6 +87,7 @@ async def import_keypair(
 
 @router.get("/", response_model=List[KeyPairResponse])
 @router.get("")
+@conditional_get
 async def list_keypairs(
     region: RegionName,
     cloud_environment: CloudEnvironment = CloudEnvironment.OSPC,
@@ -104,25 +96,15 @@ async def list_keypairs(
     """
     List all key pairs for the account
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
+    async def fetch():
+        upstream = await get_upstream(cloud_environment, region, client)
+        return await upstream.servers.get("/os-keypairs")
 
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/os-keypairs"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = await client.get(url, headers=headers)
-        response.raise_for_status()
-        return [kp["keypair"] for kp in response.json()["keypairs"]]
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(
-            status_code=e.response.status_code,
-            detail=f"Failed to list keypairs: {e.response.text}"
-        )
+    # The whole keypair list is one cache entry, dropped whenever a keypair is created, imported or deleted
+    return await resource_cache.get(
+        "keypairs", cloud_environment.value, region.value, "*", fetch,
+        transform=lambda body: [kp["keypair"] for kp in body["keypairs"]]
+    )
 
 @router.delete("/{keypair_name}")
 async def delete_keypair(
@@ -134,23 +116,16 @@ async def delete_keypair(
     """
     Delete a key pair by name
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/os-keypairs/{keypair_name}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
     try:
-        response = await client.delete(url, headers=headers)
+        response = await upstream.servers.delete(f"/os-keypairs/{keypair_name}")
         if response.status_code != 202:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=f"Failed to delete keypair: {response.text}"
             )
+        await resource_cache.invalidate("keypairs", cloud_environment.value, region.value)
         return {"status": "success", "message": "Keypair deletion initiated"}
     except httpx.RequestError as e:
         raise HTTPException(
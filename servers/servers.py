@@ -1,44 +1,82 @@
 import httpx
 import time
+import uuid
 import datetime
 
-from typing import Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, Body, Path
+from typing import Dict, Any, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Body, Path, Query
 
-from auth import get_auth_token
-from config import API_BASE_URLS, get_async_client
-from models import RegionName, ServerCreate, ServerCreateList, CloudEnvironment, VolumeAttachmentCreate
+from cache import resource_cache
+from config import get_async_client
+from deadline import deadline
+from etag import conditional_get
+from fanout import fan_out_response, any_region, pick_region
+from idempotency import idempotent
+from log import get_logger
+from upstream import get_upstream, run_batch, BatchError
+from models import RegionName, RegionScope, ServerCreate, ServerCreateList, CloudEnvironment, VolumeAttachmentCreate
 from os_images import find_os_image_uuid_by_name
+from ownership import ownership, server_entry, OWNER_METADATA_KEY
+from scheduling import current_tenant
 from flavors import flavor_id_mapping
 
 
 router = APIRouter(prefix="/servers", tags=["servers"])
+logger = get_logger(__name__)
 
 
+def build_server_payload(server_data: ServerCreate, region: RegionName, cloud_environment: CloudEnvironment, tenant_id: str) -> Dict[str, Any]:
+    """
+    Build the Nova create body for one requested server: resolve image and flavor and stamp the pooler metadata.
+    """
+    server_name = f"pooler-VM-{str(int(time.time()*1000))}-{uuid.uuid4().hex[:8]}"  # unique within a concurrent batch
+    imageRef = find_os_image_uuid_by_name(server_data.imageRef)
+    flavorRef = flavor_id_mapping.get(server_data.flavorRef, "general1-2")
+    key_name = server_data.key_name if server_data.key_name else ""
+    metadata = {
+        "region": region.value,
+        "cloud_environment": cloud_environment.value,
+        "bid_price": "", # Integrate when auctioneer is attached as middleware
+        "tenant_id": tenant_id,
+        OWNER_METADATA_KEY: current_tenant.get(),  # our caller, for the ownership index
+        "server_name": server_data.name if server_data.name else server_name,
+        "timestamp": datetime.datetime.now().isoformat(),
+        "key_name": key_name,
+        # ""
+        "image": server_data.imageRef, # Update with new idea later ( short name )
+        # "flavor": flavorRef # Stores full flavor here -> Works for OSPC only for now, TODO: For Flex in future
+        "flavor": flavorRef.split("-")[0][:-1] # Works for OSPC only for now, TODO: For Flex in future
+    }
+
+    return {
+        "name": server_name,
+        "imageRef": imageRef,
+        "flavorRef": flavorRef,
+        "metadata": metadata,
+        "key_name": key_name
+    }
+
 # Servers API Endpoints
 @router.post("/", tags=["Create Servers"])
 @router.post("")
+@idempotent("create_server")
+@deadline(300)
 async def create_server(
-    region: RegionName,
+    region: RegionScope,
     server_data_list: ServerCreateList = Body(...),
     cloud_environment: CloudEnvironment = CloudEnvironment.OSPC,
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """
-    Create new servers in the specified region.
+    Create new servers in the specified region, or with region=any in the healthiest, fastest
+    region for the environment; the response says which region was used.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/servers"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    if region == RegionScope.ALL:
+        raise HTTPException(status_code=400, detail="region=all is only supported by list endpoints")
+    region = pick_region(cloud_environment, "servers") if region == RegionScope.ANY else RegionName(region.value)
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response_list = []
-    for server_data in server_data_list.servers:
+    async def create_one(server_data: ServerCreate) -> Tuple[int, dict]:
         # Ensure the server data is a valid ServerCreate model
         if not isinstance(server_data, ServerCreate):
             raise HTTPException(
@@ -46,69 +84,55 @@ async def create_server(
                 detail="Invalid server data provided"
             )
         
-        server_name = f"pooler-VM-{str(int(time.time()*1000))}"
-        imageRef = find_os_image_uuid_by_name(server_data.imageRef)
-        flavorRef = flavor_id_mapping.get(server_data.flavorRef, "general1-2")
-        key_name = server_data.key_name if server_data.key_name else ""
-        metadata = {
-            "region": region.value,
-            "cloud_environment": cloud_environment.value,
-            "bid_price": "", # Integrate when auctioneer is attached as middleware
-            "tenant_id": auth["tenant_id"],
-            "server_name": server_data.name if server_data.name else server_name,
-            "timestamp": datetime.datetime.now().isoformat(),
-            "key_name": key_name,
-            # ""
-            "image": server_data.imageRef, # Update with new idea later ( short name )
-            # "flavor": flavorRef # Stores full flavor here -> Works for OSPC only for now, TODO: For Flex in future
-            "flavor": flavorRef.split("-")[0][:-1] # Works for OSPC only for now, TODO: For Flex in future
-        }
-
-        final_server_data = {
-            "name": server_name,
-            "imageRef": imageRef,
-            "flavorRef": flavorRef,
-            "metadata": metadata,
-            "key_name": key_name
-        }
-        print(f"\nFinal server data: {final_server_data}")
+        final_server_data = build_server_payload(server_data, region, cloud_environment, upstream.tenant_id)
+        logger.debug_sampled("server_payload", region=region.value, payload=final_server_data)
         # Convert to dict for JSON serialization
-        response = await client.post(url, json={"server": final_server_data}, headers=headers)
+        response = await upstream.servers.post("/servers", json={"server": final_server_data})
         
-        print(f"Response Status: {response.status_code} \n Data: {response.json()}")
-        print(f"Creating server in {region} with data: {server_data.dict()}")
         if response.status_code not in [200, 201, 202]:
+            logger.warning("server_create_failed", region=region.value, status_code=response.status_code)
             raise HTTPException(
                 status_code=response.status_code,
                 detail=response.text
             )
-        print(f"\nServer created successfully in {region} with status code: {response.status_code} data: {response.json()}")
-        response_list.append(response.json())
-    return {"servers": response_list, "message": "Servers created successfully", "status_code": response.status_code}
+        body = response.json()
+        server = body.get("server", {})
+        logger.info("server_created", region=region.value, server_id=server.get("id"), status_code=response.status_code)
+        ownership.add("servers", cloud_environment.value, region.value, current_tenant.get(), server_entry({**server, "name": final_server_data["name"], "metadata": final_server_data["metadata"]}))
+        return response.status_code, body
+
+    try:
+        created = await run_batch("create_server", server_data_list.servers, create_one)
+    except BatchError as e:
+        # Report what was already created so the caller can track it instead of retrying blindly
+        logger.warning("server_create_incomplete", region=region.value, created=len(e.results), skipped=e.skipped, requested=len(server_data_list.servers))
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"message": e.detail, "servers": [body for _, body in e.results], "region": region.value}
+        )
+    return {"servers": [body for _, body in created], "region": region.value, "message": "Servers created successfully", "status_code": created[-1][0] if created else 200}
 
 @router.get("/", tags=["List Servers"])
+@conditional_get
 async def list_servers(
-    region: RegionName,
+    region: RegionScope,
+    mine: bool = Query(False, description="Only what the caller (X-Tenant-Id) created, from the ownership index"),
     cloud_environment: CloudEnvironment = CloudEnvironment.OSPC,
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """
-    List all servers in the specified region irrespective of user
-    TODO: Modify it such that it gives all servers of particular user
-    TODO: Maybe store all server metadata in local database MySQL or MongoDB
+    List all servers in the specified region irrespective of user.
+    region=all streams every region's servers as NDJSON, see fanout.fan_out;
+    region=any lists the healthiest, fastest region's, see fanout.any_region.
+    mine=true lists only the caller's servers, from the ownership index (see ownership.py).
     """
-    try:
-        auth: dict = await get_auth_token(cloud_environment, region, client)
+    if mine:
+        return ownership.listing("servers", cloud_environment, region)
 
-        base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-        url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/servers"
+    async def fetch(region: RegionName):
+        upstream = await get_upstream(cloud_environment, region, client)
         
-        headers = {
-            "X-Auth-Token": auth["auth_token"],
-            "Content-Type": "application/json"
-        }
-        
-        response = await client.get(url, headers=headers)
+        response = await upstream.servers.get("/servers")
         
         if response.status_code != 200:
             raise HTTPException(
@@ -117,6 +141,15 @@ async def list_servers(
             )
         
         return response.json()
+
+    if region == RegionScope.ALL:
+        return fan_out_response("list_servers", "servers", fetch)
+    if region == RegionScope.ANY:
+        return await any_region("list_servers", cloud_environment, "servers", fetch)
+    try:
+        return await fetch(RegionName(region.value))
+    except HTTPException:
+        raise
     except httpx.ConnectError as e:
         raise HTTPException(
             status_code=502,
@@ -135,6 +168,7 @@ async def list_servers(
 
 @router.get("/{server_id}", tags=["Get Server"])
 @router.get("")
+@conditional_get
 async def get_server(
     region: RegionName,
     server_id: str,
@@ -144,24 +178,11 @@ async def get_server(
     """
     Get details of a specific server.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
+    async def fetch():
+        upstream = await get_upstream(cloud_environment, region, client)
+        return await upstream.servers.get(f"/servers/{server_id}", hedge="get_server")
 
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/servers/{server_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
-    response = await client.get(url, headers=headers)
-    
-    if response.status_code != 200:
-        raise HTTPException(
-            status_code=response.status_code,
-            detail=response.text
-        )
-    
-    return response.json()
+    return await resource_cache.get("servers", cloud_environment.value, region.value, server_id, fetch)
 
 ### TODO: Implement update server endpoint with valid fields once available
 @router.put("/{server_id}", tags=["Update Server"])
@@ -177,17 +198,9 @@ async def update_server(
     # TODO: Implement later with valid fields here to update.
     # TODO: Needs to call get server to fetch old data and then update with new data
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/servers/{server_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.put(url, json={"server": server_data}, headers=headers)
+    response = await upstream.servers.put(f"/servers/{server_id}", json={"server": server_data})
     
     if response.status_code != 200:
         raise HTTPException(
@@ -195,6 +208,7 @@ async def update_server(
             detail=response.text
         )
     
+    await resource_cache.invalidate("servers", cloud_environment.value, region.value, server_id)
     return response.json()
 
 @router.delete("/{server_id}", tags=["Delete Server"])
@@ -207,17 +221,9 @@ async def delete_server(
     """
     Delete a server.
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/servers/{server_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.delete(url, headers=headers)
+    response = await upstream.servers.delete(f"/servers/{server_id}")
     
     if response.status_code != 204:
         raise HTTPException(
@@ -225,9 +231,12 @@ async def delete_server(
             detail=response.text
         )
     
+    await resource_cache.invalidate("servers", cloud_environment.value, region.value, server_id)
+    ownership.remove("servers", cloud_environment.value, region.value, server_id)
     return {"status": "success", "message": "Server deleted successfully"}
 
 @router.post("/{server_id}/rebuild-with-keypair")
+@deadline(120)
 async def rebuild_server_with_keypair(
     region: RegionName,
     keypair_name: dict = Body(...),
@@ -240,25 +249,16 @@ async def rebuild_server_with_keypair(
     Rebuild server with new key pair (only supported method for existing VMs)
     """
     # 1. Get original server details to obtain imageRef
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    server_url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/servers/{server_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
     try:
         # Get current server details
-        server_resp = await client.get(server_url, headers=headers)
+        server_resp = await upstream.servers.get(f"/servers/{server_id}")
         server_data = server_resp.json()["server"]
         
         current_metadata = server_resp.json()["server"]["metadata"]
 
         # 2. Prepare rebuild payload
-        rebuild_url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/servers/{server_id}/action"
         payload = {
             "rebuild": {
                 "imageRef": server_data["image"]["id"],
@@ -275,12 +275,13 @@ async def rebuild_server_with_keypair(
         }
         
         # 3. Execute rebuild
-        rebuild_resp = await client.post(rebuild_url, json=payload, headers=headers)
+        rebuild_resp = await upstream.servers.post(f"/servers/{server_id}/action", json=payload)
         if rebuild_resp.status_code != 202:
             raise HTTPException(
                 status_code=rebuild_resp.status_code,
                 detail=f"Rebuild failed: {rebuild_resp.text}"
             )
+        await resource_cache.invalidate("servers", cloud_environment.value, region.value, server_id)
         
         return {
             "status": "success",
@@ -310,27 +311,21 @@ async def attach_volume(
     """
     Attach a volume to a server
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/servers/{server_id}/os-volume_attachments"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
     payload = {
         "volumeAttachment": attachment_data.dict(exclude_none=True)
     }
     
     try:
-        response = await client.post(url, json=payload, headers=headers)
+        response = await upstream.servers.post(f"/servers/{server_id}/os-volume_attachments", json=payload)
         if response.status_code != 202:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=f"Failed to attach volume: {response.text}"
             )
+        await resource_cache.invalidate("servers", cloud_environment.value, region.value, server_id)
+        await resource_cache.invalidate("volumes", cloud_environment.value, region.value, attachment_data.volumeId)
         return response.json()["volumeAttachment"]
     except httpx.RequestError as e:
         raise HTTPException(
@@ -349,23 +344,17 @@ async def detach_volume(
     """
     Detach a volume from a server
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/servers/{server_id}/os-volume_attachments/{volume_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
     try:
-        response = await client.delete(url, headers=headers)
+        response = await upstream.servers.delete(f"/servers/{server_id}/os-volume_attachments/{volume_id}")
         if response.status_code != 202:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=f"Failed to detach volume: {response.text}"
             )
+        await resource_cache.invalidate("servers", cloud_environment.value, region.value, server_id)
+        await resource_cache.invalidate("volumes", cloud_environment.value, region.value, volume_id)
         return {"status": "success", "message": "Volume detachment initiated"}
     except httpx.RequestError as e:
         raise HTTPException(
@@ -374,6 +363,7 @@ async def detach_volume(
         )
 
 @router.get("/{server_id}/os-volume_attachments")
+@conditional_get
 async def list_volume_attachments(
     region: RegionName,
     server_id: str = Path(...),
@@ -383,18 +373,10 @@ async def list_volume_attachments(
     """
     List all volume attachments for a server
     """
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["servers"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/servers/{server_id}/os-volume_attachments"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
     try:
-        response = await client.get(url, headers=headers)
+        response = await upstream.servers.get(f"/servers/{server_id}/os-volume_attachments")
         response.raise_for_status()
         return response.json()["volumeAttachments"]
     except httpx.HTTPStatusError as e:
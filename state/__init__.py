@@ -0,0 +1,21 @@
+from .base import StateBackend, BackendLock
+from .memory import InProcessBackend
+from .sqlite import SQLiteBackend
+from .redis import RedisBackend
+from .state import get_backend, set_backend, create_backend
+from .leader import LeaseElection, FileLockElection, get_election, run_elected
+
+__all__ = [
+    "StateBackend",
+    "BackendLock",
+    "InProcessBackend",
+    "SQLiteBackend",
+    "RedisBackend",
+    "get_backend",
+    "set_backend",
+    "create_backend",
+    "LeaseElection",
+    "FileLockElection",
+    "get_election",
+    "run_elected"
+]
\ No newline at end of file
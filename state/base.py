@@ -0,0 +1,78 @@
+import asyncio
+import time
+import uuid
+
+from typing import Any, Optional
+
+
+LOCK_TTL = 30  # seconds a lock survives if its holder dies without releasing it
+LOCK_POLL_MIN = 0.005
+LOCK_POLL_MAX = 0.1
+
+
+class StateBackend:
+    """
+    Shared key/value state for tokens, caches and leases.
+    Values must be JSON serializable so cross-process implementations can store them.
+    A ttl of None means the key never expires.
+    """
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def compare_and_set(self, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        """
+        Atomically set key to value if its current value equals expected (None means the key must not exist).
+        """
+        raise NotImplementedError
+
+    async def compare_and_delete(self, key: str, expected: Any) -> bool:
+        """
+        Atomically delete key if its current value equals expected.
+        """
+        raise NotImplementedError
+
+    def lock(self, name: str, ttl: float = LOCK_TTL, timeout: Optional[float] = None) -> "BackendLock":
+        return BackendLock(self, name, ttl, timeout)
+
+    async def close(self) -> None:
+        pass
+
+
+class BackendLock:
+    """
+    Cross-process lock built on compare_and_set. The owner token guards release,
+    and the ttl frees the lock if its holder dies.
+    """
+
+    def __init__(self, backend: StateBackend, name: str, ttl: float = LOCK_TTL, timeout: Optional[float] = None):
+        self.backend = backend
+        self.key = f"lock:{name}"
+        self.ttl = ttl
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+
+    async def acquire(self) -> None:
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        delay = LOCK_POLL_MIN
+        while not await self.backend.compare_and_set(self.key, None, self.token, self.ttl):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for lock {self.key}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LOCK_POLL_MAX)
+
+    async def release(self) -> None:
+        await self.backend.compare_and_delete(self.key, self.token)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
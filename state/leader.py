@@ -0,0 +1,156 @@
+import asyncio
+import contextlib
+import fcntl
+import math
+import os
+import socket
+import tempfile
+import time
+
+from typing import Optional
+
+from log import get_logger
+from .base import StateBackend
+from .state import get_backend
+
+
+LEASE_TTL = 15  # seconds a leader keeps its role without renewing; bounds failover time
+LEASE_RENEWALS = 3  # campaigns per lease TTL, on a heartbeat beside the poller
+HOSTNAME = socket.gethostname()
+
+logger = get_logger(__name__)
+
+
+def worker_id() -> str:
+    # Evaluated per call so forked workers never inherit their parent's identity
+    return f"{HOSTNAME}:{os.getpid()}"
+
+
+class LeaseElection:
+    """
+    Leader election through a lease record in the shared state backend.
+    The leader renews the lease on every campaign; if it dies, another worker takes over once the lease expires.
+    """
+
+    def __init__(self, name: str, backend: Optional[StateBackend] = None, ttl: float = LEASE_TTL):
+        self.key = f"leader:{name}"
+        self.backend = backend or get_backend()
+        self.ttl = ttl
+        self.is_leader = False
+
+    async def campaign(self) -> bool:
+        """Acquire or renew the lease. Returns True while this worker is the leader."""
+        if self.is_leader:
+            self.is_leader = await self.backend.compare_and_set(self.key, worker_id(), worker_id(), self.ttl)
+        if not self.is_leader:
+            self.is_leader = await self.backend.compare_and_set(self.key, None, worker_id(), self.ttl)
+        return self.is_leader
+
+    async def resign(self) -> None:
+        if self.is_leader:
+            await self.backend.compare_and_delete(self.key, worker_id())
+            self.is_leader = False
+
+    async def leader(self) -> Optional[str]:
+        return await self.backend.get(self.key)
+
+
+class FileLockElection:
+    """
+    Leader election for workers on one host through an exclusive flock.
+    The kernel drops the lock the moment the leader process exits, so failover is one tick.
+    """
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        safe_name = name.replace("/", "_").replace(":", "_")
+        self.path = os.path.join(directory or tempfile.gettempdir(), f"vm-allocater-{safe_name}.lock")
+        self.fd: Optional[int] = None
+        self.is_leader = False
+
+    async def campaign(self) -> bool:
+        if self.is_leader:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, worker_id().encode())
+        self.fd = fd
+        self.is_leader = True
+        return True
+
+    async def resign(self) -> None:
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+        self.is_leader = False
+
+    async def leader(self) -> Optional[str]:
+        try:
+            with open(self.path) as f:
+                return f.read() or None
+        except FileNotFoundError:
+            return None
+
+
+def get_election(name: str, ttl: float = LEASE_TTL):
+    """
+    Election for one background poller. LEADER_ELECTION=file uses host-local flocks,
+    anything else uses lease records in the state backend, held for ttl seconds per renewal.
+    """
+    if os.getenv("LEADER_ELECTION", "lease") == "file":
+        return FileLockElection(name)
+    return LeaseElection(name, ttl=ttl)
+
+
+async def run_elected(name: str, poll, interval: float, on_follow=None, ttl: float = LEASE_TTL):
+    """
+    Run poll() every interval seconds, but only on the worker that currently leads `name`.
+    Followers call on_follow() instead (e.g. to read the leader's results from the state backend).
+
+    Workers campaign on a heartbeat of their own, LEASE_RENEWALS times per ttl, so the lease
+    lapses neither between polls further apart than ttl nor during a poll that outlasts it.
+    A leader that has not renewed for ttl seconds stops polling: someone else may hold the lease.
+    """
+    if ttl <= 0:
+        raise ValueError(f"Lease TTL for {name} must be positive, got {ttl}")
+    election = get_election(name, ttl)
+    renewed_at = -math.inf
+
+    async def campaign():
+        nonlocal renewed_at
+        started = time.monotonic()
+        try:
+            if await election.campaign():
+                renewed_at = started
+        except Exception as e:
+            logger.warning("leader_campaign_failed", poller=name, error=repr(e))
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(ttl / LEASE_RENEWALS)
+            await campaign()
+
+    await campaign()
+    renewals = asyncio.ensure_future(heartbeat())
+    try:
+        while True:
+            try:
+                if election.is_leader and time.monotonic() - renewed_at < ttl:
+                    await poll()
+                elif on_follow is not None:
+                    await on_follow()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("background_poller_failed", poller=name, error=repr(e))
+            await asyncio.sleep(interval)
+    finally:
+        renewals.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await renewals
+        await election.resign()
@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from collections import defaultdict
+from typing import Any, Optional
+
+from .base import StateBackend, LOCK_TTL
+
+
+SWEEP_INTERVAL = 1000  # writes between purges of expired keys nobody reads again
+
+
+class InProcessBackend(StateBackend):
+    """
+    Single-process backend: a dict plus asyncio locks.
+    Every operation runs without awaiting, so it is atomic on the event loop.
+    """
+
+    def __init__(self):
+        self.data = {}  # key -> (value, expires_at or None)
+        self.lock_map = defaultdict(asyncio.Lock)
+        self.writes = 0
+
+    def _read(self, key: str) -> Optional[Any]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self.data[key]
+            return None
+        return value
+
+    def _write(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        self.data[key] = (value, None if ttl is None else time.time() + ttl)
+        self.writes += 1
+        if self.writes % SWEEP_INTERVAL == 0:
+            now = time.time()
+            self.data = {key: entry for key, entry in self.data.items() if entry[1] is None or entry[1] > now}
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._read(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._write(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        self.data.pop(key, None)
+
+    async def compare_and_set(self, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        if self._read(key) != expected:
+            return False
+        self._write(key, value, ttl)
+        return True
+
+    async def compare_and_delete(self, key: str, expected: Any) -> bool:
+        if self._read(key) != expected:
+            return False
+        self.data.pop(key, None)
+        return True
+
+    def lock(self, name: str, ttl: float = LOCK_TTL, timeout: Optional[float] = None) -> "LocalLock":
+        # Within one process a plain asyncio.Lock is enough and avoids polling
+        return LocalLock(self.lock_map[name], timeout)
+
+
+class LocalLock:
+    """asyncio.Lock with the same timeout semantics as BackendLock."""
+
+    def __init__(self, lock: asyncio.Lock, timeout: Optional[float] = None):
+        self.lock = lock
+        self.timeout = timeout
+
+    async def acquire(self) -> None:
+        try:
+            await asyncio.wait_for(self.lock.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timed out waiting for lock")
+
+    async def release(self) -> None:
+        self.lock.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
@@ -0,0 +1,168 @@
+import asyncio
+import json
+
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+from .base import StateBackend
+
+
+class RedisError(Exception):
+    pass
+
+
+def encode_command(*args) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f"${len(data)}\r\n".encode())
+        parts.append(data)
+        parts.append(b"\r\n")
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """Read one RESP2 reply."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Redis connection closed")
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b"+":
+        return payload.decode()
+    if prefix == b"-":
+        raise RedisError(payload.decode())
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length == -1:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        length = int(payload)
+        if length == -1:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unknown reply type: {line!r}")
+
+
+class RedisConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def command(self, *args) -> Any:
+        self.writer.write(encode_command(*args))
+        await self.writer.drain()
+        return await read_reply(self.reader)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class RedisBackend(StateBackend):
+    """
+    Redis-protocol backend for multi-host fleets. Speaks plain RESP2 over asyncio streams,
+    so it works against Redis, Valkey or the bundled stand-in in state/resp_server.py.
+    compare_and_set uses WATCH/MULTI/EXEC, so no server-side scripting is required.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", pool_size: int = 8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.pool: asyncio.Queue = asyncio.Queue()
+        self.pool_size = pool_size
+        self.opened = 0
+
+    async def _connect(self) -> RedisConnection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        conn = RedisConnection(reader, writer)
+        if self.password:
+            await conn.command("AUTH", self.password)
+        if self.db:
+            await conn.command("SELECT", self.db)
+        return conn
+
+    async def _acquire(self) -> RedisConnection:
+        if self.pool.empty() and self.opened < self.pool_size:
+            self.opened += 1
+            try:
+                return await self._connect()
+            except Exception:
+                self.opened -= 1
+                raise
+        return await self.pool.get()
+
+    def _release(self, conn: RedisConnection, broken: bool = False) -> None:
+        if broken:
+            conn.close()
+            self.opened -= 1
+        else:
+            self.pool.put_nowait(conn)
+
+    async def _execute(self, fn):
+        conn = await self._acquire()
+        try:
+            result = await fn(conn)
+        except BaseException:
+            # A cancelled or failed exchange may leave unread replies: never reuse that connection
+            self._release(conn, broken=True)
+            raise
+        self._release(conn)
+        return result
+
+    @staticmethod
+    def _set_args(key: str, value: Any, ttl: Optional[float]) -> list:
+        args = ["SET", key, json.dumps(value)]
+        if ttl is not None:
+            args += ["PX", max(1, int(ttl * 1000))]
+        return args
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._execute(lambda conn: conn.command("GET", key))
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._execute(lambda conn: conn.command(*self._set_args(key, value, ttl)))
+
+    async def delete(self, key: str) -> None:
+        await self._execute(lambda conn: conn.command("DEL", key))
+
+    async def compare_and_set(self, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        if expected is None:
+            reply = await self._execute(lambda conn: conn.command(*self._set_args(key, value, ttl), "NX"))
+            return reply == "OK"
+
+        async def transaction(conn: RedisConnection) -> bool:
+            await conn.command("WATCH", key)
+            raw = await conn.command("GET", key)
+            if raw is None or json.loads(raw) != expected:
+                await conn.command("UNWATCH")
+                return False
+            await conn.command("MULTI")
+            await conn.command(*self._set_args(key, value, ttl))
+            return await conn.command("EXEC") is not None
+
+        return await self._execute(transaction)
+
+    async def compare_and_delete(self, key: str, expected: Any) -> bool:
+        async def transaction(conn: RedisConnection) -> bool:
+            await conn.command("WATCH", key)
+            raw = await conn.command("GET", key)
+            if raw is None or json.loads(raw) != expected:
+                await conn.command("UNWATCH")
+                return False
+            await conn.command("MULTI")
+            await conn.command("DEL", key)
+            return await conn.command("EXEC") is not None
+
+        return await self._execute(transaction)
+
+    async def close(self) -> None:
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+        self.opened = 0
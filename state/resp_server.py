@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import time
+
+from typing import Any, Dict, Optional, Tuple
+
+from .redis import read_reply
+
+
+class RespStandIn:
+    """
+    Minimal in-memory Redis-protocol server for local multi-worker runs and tests.
+    Supports PING, GET, SET (NX/XX/EX/PX), DEL, EXISTS, WATCH/UNWATCH/MULTI/EXEC/DISCARD, SELECT, AUTH and FLUSHALL.
+    """
+
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.versions: Dict[bytes, int] = {}
+
+    def _read(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self._remove(key)
+            return None
+        return value
+
+    def _remove(self, key: bytes) -> int:
+        if self.data.pop(key, None) is None:
+            return 0
+        self.versions[key] = self.versions.get(key, 0) + 1
+        return 1
+
+    def _set(self, key: bytes, value: bytes, options: list) -> Optional[str]:
+        expires_at = None
+        nx = xx = False
+        i = 0
+        while i < len(options):
+            option = options[i].upper()
+            if option == b"NX":
+                nx = True
+            elif option == b"XX":
+                xx = True
+            elif option in (b"EX", b"PX"):
+                amount = float(options[i + 1])
+                expires_at = time.time() + (amount if option == b"EX" else amount / 1000)
+                i += 1
+            i += 1
+        exists = self._read(key) is not None
+        if (nx and exists) or (xx and not exists):
+            return None
+        self.data[key] = (value, expires_at)
+        self.versions[key] = self.versions.get(key, 0) + 1
+        return "OK"
+
+    def execute(self, args: list) -> Any:
+        name = args[0].upper()
+        if name == b"PING":
+            return "PONG"
+        if name == b"GET":
+            return self._read(args[1])
+        if name == b"SET":
+            return self._set(args[1], args[2], args[3:])
+        if name == b"DEL":
+            return sum(self._remove(key) for key in args[1:] if self._read(key) is not None)
+        if name == b"EXISTS":
+            return sum(1 for key in args[1:] if self._read(key) is not None)
+        if name in (b"SELECT", b"AUTH"):
+            return "OK"
+        if name == b"FLUSHALL":
+            for key in list(self.data):
+                self._remove(key)
+            return "OK"
+        raise ValueError(f"ERR unknown command '{name.decode()}'")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        watched: Dict[bytes, int] = {}
+        queued: Optional[list] = None
+        try:
+            while True:
+                try:
+                    args = await read_reply(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                name = args[0].upper()
+                try:
+                    if name == b"WATCH":
+                        for key in args[1:]:
+                            self._read(key)  # expire first so the version reflects it
+                            watched[key] = self.versions.get(key, 0)
+                        reply = "OK"
+                    elif name == b"UNWATCH":
+                        watched.clear()
+                        reply = "OK"
+                    elif name == b"MULTI":
+                        queued = []
+                        reply = "OK"
+                    elif name == b"DISCARD":
+                        queued = None
+                        watched.clear()
+                        reply = "OK"
+                    elif name == b"EXEC":
+                        if queued is None:
+                            raise ValueError("ERR EXEC without MULTI")
+                        if any(self.versions.get(key, 0) != version for key, version in watched.items()):
+                            reply = None
+                        else:
+                            reply = [self.execute(command) for command in queued]
+                        queued = None
+                        watched.clear()
+                    elif queued is not None:
+                        queued.append(args)
+                        reply = "QUEUED"
+                    else:
+                        reply = self.execute(args)
+                except (ValueError, IndexError) as e:
+                    reply = e
+                writer.write(encode_reply(reply))
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+def encode_reply(reply: Any) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return f"+{reply}\r\n".encode()
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode()
+    if isinstance(reply, bytes):
+        return f"${len(reply)}\r\n".encode() + reply + b"\r\n"
+    if isinstance(reply, list):
+        return f"*{len(reply)}\r\n".encode() + b"".join(encode_reply(item) for item in reply)
+    raise TypeError(f"Cannot encode {type(reply)}")
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6379) -> asyncio.AbstractServer:
+    return await asyncio.start_server(RespStandIn().handle, host, port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-memory Redis-protocol stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    async def main():
+        server = await serve(args.host, args.port)
+        print(f"RESP stand-in listening on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from .base import StateBackend
+
+
+PURGE_EVERY = 1000  # writes between sweeps of expired rows
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Multi-worker backend for a single host: one SQLite file in WAL mode shared by every worker.
+    Each worker talks to its own connection from a dedicated thread so the event loop never blocks on file I/O.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writes = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-sqlite")
+        self.conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+        )
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _read(self, key: str) -> Optional[Any]:
+        row = self.conn.execute(
+            "SELECT value FROM state WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _write(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        expires = None if ttl is None else time.time() + ttl
+        self.writes += 1
+        if self.writes % PURGE_EVERY == 0:
+            self.conn.execute("DELETE FROM state WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO state (key, value, expires) VALUES (?, ?, ?)", (key, json.dumps(value), expires)
+        )
+
+    def _compare_and_set(self, key: str, expected: Any, value: Any, ttl: Optional[float]) -> bool:
+        # BEGIN IMMEDIATE takes the write lock up front so the read and the write are one atomic step
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._read(key) != expected:
+                return False
+            self._write(key, value, ttl)
+            return True
+        finally:
+            self.conn.execute("COMMIT")
+
+    def _compare_and_delete(self, key: str, expected: Any) -> bool:
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._read(key) != expected:
+                return False
+            self.conn.execute("DELETE FROM state WHERE key = ?", (key,))
+            return True
+        finally:
+            self.conn.execute("COMMIT")
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self._run(self._read, key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._run(self._write, key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._run(self.conn.execute, "DELETE FROM state WHERE key = ?", (key,))
+
+    async def compare_and_set(self, key: str, expected: Any, value: Any, ttl: Optional[float] = None) -> bool:
+        return await self._run(self._compare_and_set, key, expected, value, ttl)
+
+    async def compare_and_delete(self, key: str, expected: Any) -> bool:
+        return await self._run(self._compare_and_delete, key, expected)
+
+    async def close(self) -> None:
+        await self._run(self.conn.close)
+        self.executor.shutdown(wait=False)
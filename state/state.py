@@ -0,0 +1,39 @@
+import os
+
+from typing import Optional
+
+from .base import StateBackend
+from .memory import InProcessBackend
+from .sqlite import SQLiteBackend
+from .redis import RedisBackend
+
+
+_backend: Optional[StateBackend] = None
+
+
+def create_backend(url: str) -> StateBackend:
+    """
+    Build a backend from a STATE_BACKEND style URL:
+        memory                     -> per-process dict (default)
+        sqlite:///var/run/vm.db    -> SQLite WAL file shared by workers on one host
+        redis://host:6379/0        -> Redis protocol server shared by every host
+    """
+    if url in ("", "memory"):
+        return InProcessBackend()
+    if url.startswith("sqlite://"):
+        return SQLiteBackend(url[len("sqlite://"):])
+    if url.startswith("redis://"):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported STATE_BACKEND: {url}")
+
+
+def get_backend() -> StateBackend:
+    global _backend
+    if _backend is None:
+        _backend = create_backend(os.getenv("STATE_BACKEND", "memory"))
+    return _backend
+
+
+def set_backend(backend: StateBackend) -> None:
+    global _backend
+    _backend = backend
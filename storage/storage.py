@@ -1,39 +1,47 @@
 import httpx
 
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
 
-from auth import get_auth_token
-from config import API_BASE_URLS, get_async_client
-from models import RegionName, VolumeCreate, VolumeCreateList, VolumeUpdate, VolumeUpdateList, CloudEnvironment
+from cache import resource_cache
+from config import get_async_client
+from etag import conditional_get
+from fanout import fan_out_response, any_region
+from idempotency import idempotent
+from ownership import ownership
+from scheduling import current_tenant
+from upstream import get_upstream, run_batch
+from models import RegionName, RegionScope, VolumeCreate, VolumeCreateList, VolumeUpdate, VolumeUpdateList, CloudEnvironment
 
 
 router = APIRouter(prefix="/volumes", tags=["volumes"])
 
 
 @router.get("/", tags=["Block Storage - List Volumes"])
+@conditional_get
 async def list_volumes(
-    region: RegionName,
+    region: RegionScope,
+    mine: bool = Query(False, description="Only what the caller (X-Tenant-Id) created, from the ownership index"),
     cloud_environment: CloudEnvironment = CloudEnvironment.OSPC,
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
-    """List all volumes"""
-    # TODO: Show only user related volumes, not all volumes in the region
-    # TODO: Store volumes metadata in local database MySQL or MongoDB
-    try:
-        auth: dict = await get_auth_token(cloud_environment, region, client)
+    """List all volumes; region=all streams every region's volumes as NDJSON, region=any reads the healthiest region, mine=true only the caller's"""
+    if mine:
+        return ownership.listing("volumes", cloud_environment, region)
 
-        base_url = API_BASE_URLS[cloud_environment.value]["volumes"]
-        url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/volumes"
+    async def fetch(region: RegionName):
+        upstream = await get_upstream(cloud_environment, region, client)
         
-        headers = {
-            "X-Auth-Token": auth["auth_token"],
-            "Content-Type": "application/json"
-        }
-        
-        response = await client.get(url, headers=headers)
+        response = await upstream.volumes.get("/volumes")
         if response.status_code != 200:
             raise HTTPException(status_code=response.status_code, detail=response.text)
         return response.json()
+
+    if region == RegionScope.ALL:
+        return fan_out_response("list_volumes", "volumes", fetch)
+    if region == RegionScope.ANY:
+        return await any_region("list_volumes", cloud_environment, "volumes", fetch)
+    try:
+        return await fetch(RegionName(region.value))
     except httpx.HTTPStatusError as e:
         raise HTTPException(
             status_code=e.response.status_code,
@@ -41,6 +49,7 @@ async def list_volumes(
         )
 
 @router.post("/", tags=["Block Storage - Create Volumes"])
+@idempotent("create_volume")
 async def create_volume(
     region: RegionName,
     volume_data_list: VolumeCreateList = Body(...),
@@ -48,18 +57,9 @@ async def create_volume(
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """Create a new volumes"""
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["volumes"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/volumes"
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
-    
-    response_list = []
-    for volume_data in volume_data_list.volumes:
+    async def create_one(volume_data):
         if not isinstance(volume_data, VolumeCreate):
             raise HTTPException(
                 status_code=400,
@@ -68,18 +68,21 @@ async def create_volume(
         payload = {
             "volume": volume_data.dict(exclude_none=True)
         }
-        response = await client.post(url, json=payload, headers=headers)
+        response = await upstream.volumes.post("/volumes", json=payload)
         
         if response.status_code not in [200, 201, 202]:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=response.text
             )
-        response_list.append(response.json())
-    return response_list
+        ownership.add("volumes", cloud_environment.value, region.value, current_tenant.get(), response.json().get("volume", {}))
+        return response.json()
+
+    return await run_batch("create_volume", volume_data_list.volumes, create_one)
 
 @router.get("")
 @router.get("/{volume_id}", tags=["Block Storage - Get Volume"])
+@conditional_get
 async def get_volume(
     region: RegionName,
     volume_id: str,
@@ -87,20 +90,12 @@ async def get_volume(
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """Get volume details"""
-    auth: dict = await get_auth_token(cloud_environment, region, client)
+    async def fetch():
+        upstream = await get_upstream(cloud_environment, region, client)
 
-    base_url = API_BASE_URLS[cloud_environment.value]["volumes"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/volumes/{volume_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+        return await upstream.volumes.get(f"/volumes/{volume_id}")
 
-    response = await client.get(url, headers=headers)
-    if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
-    return response.json()
+    return await resource_cache.get("volumes", cloud_environment.value, region.value, volume_id, fetch)
 
 # TODO: Handle for List of volumes updates together
 @router.put("/{volume_id}", tags=["Block Storage - Update Volumes"])
@@ -114,19 +109,12 @@ async def update_volume(
     """Update volume metadata"""
     # TODO: Handle for List of volumes updates together
 
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["volumes"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/volumes/{volume_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.put(url, json={"volume": volume_data.dict(exclude_none=True)}, headers=headers)
+    response = await upstream.volumes.put(f"/volumes/{volume_id}", json={"volume": volume_data.dict(exclude_none=True)})
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail=response.text)
+    await resource_cache.invalidate("volumes", cloud_environment.value, region.value, volume_id)
     return response.json()
 
 @router.delete("/{volume_id}", tags=["Block Storage - Delete Volume"])
@@ -137,17 +125,11 @@ async def delete_volume(
     client: httpx.AsyncClient = Depends(get_async_client)
 ):
     """Delete a volume"""
-    auth: dict = await get_auth_token(cloud_environment, region, client)
-
-    base_url = API_BASE_URLS[cloud_environment.value]["volumes"]
-    url = f"{base_url.format(region=region.value, tenant_id=auth["tenant_id"])}/volumes/{volume_id}"
-    
-    headers = {
-        "X-Auth-Token": auth["auth_token"],
-        "Content-Type": "application/json"
-    }
+    upstream = await get_upstream(cloud_environment, region, client)
     
-    response = await client.delete(url, headers=headers)
+    response = await upstream.volumes.delete(f"/volumes/{volume_id}")
     if response.status_code not in [202, 204]:
         raise HTTPException(status_code=response.status_code, detail=response.text)
+    await resource_cache.invalidate("volumes", cloud_environment.value, region.value, volume_id)
+    ownership.remove("volumes", cloud_environment.value, region.value, volume_id)
     return {"status": "success", "message": "Volume deletion initiated"}
@@ -0,0 +1,3 @@
+from .tracing import TracingMiddleware, TracingTransport, span, traced, traced_lock, exporter, current_trace
+
+__all__ = ["TracingMiddleware", "TracingTransport", "span", "traced", "traced_lock", "exporter", "current_trace"]
\ No newline at end of file
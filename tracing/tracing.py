@@ -0,0 +1,318 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import random
+import re
+import time
+import httpx
+
+from typing import Dict, List, Optional
+
+import log  # whole, not get_logger: log reads current_trace from this module
+from metrics import Counter
+from metrics.instrumentation import upstream_labels
+
+
+# Share of requests whose spans are exported (an incoming sampled traceparent always is)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+# none | file:///path/to/spans.jsonl | http://collector:4318 (OTLP/HTTP JSON, /v1/traces is appended)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_EXPORT_BATCH_SIZE = 512  # spans per export call
+TRACE_EXPORT_INTERVAL = 5  # seconds between flushes of a partial batch
+TRACE_QUEUE_SIZE = 10000  # finished traces waiting for export before new ones are dropped
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+# Server-Timing metric name per upstream service
+UPSTREAM_PHASES = {"identity": "identity", "servers": "nova", "blockstorage": "cinder", "networks": "neutron"}
+
+current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+exported_spans = Counter("trace_spans_exported_total", "Spans handed to the trace exporter, by outcome (exported, dropped, failed)", ("outcome",))
+
+
+def new_id(nbytes: int) -> str:
+    return random.getrandbits(nbytes * 8).to_bytes(nbytes, "big").hex()
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "phase", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], phase: Optional[str], attributes: dict):
+        self.trace = trace
+        self.span_id = new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.phase = phase
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            # SERVER for the request's root span, CLIENT for upstream calls, INTERNAL otherwise
+            "kind": 2 if self.span_id == self.trace.root_id else 3 if "service" in self.attributes else 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": {"stringValue": str(value)}} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    """
+    Spans of one inbound request. Phase durations are summed for Server-Timing whether or not
+    the trace is sampled; only sampled traces are exported.
+    """
+
+    def __init__(self, traceparent: Optional[str] = None, sample_rate: float = TRACE_SAMPLE_RATE):
+        match = TRACEPARENT_PATTERN.match(traceparent or "")
+        if match:
+            self.trace_id, self.remote_parent_id = match[1], match[2]
+            self.sampled = bool(int(match[3], 16) & 1)
+        else:
+            self.trace_id, self.remote_parent_id = new_id(16), None
+            self.sampled = random.random() < sample_rate
+        self.spans: List[Span] = []
+        self.phases: Dict[str, float] = {}
+        self.root_id: Optional[str] = None
+        self.children_ms = 0.0  # time covered by direct children of the root span
+
+    def finish(self, span: Span):
+        self.spans.append(span)
+        if span.phase:
+            self.phases[span.phase] = self.phases.get(span.phase, 0.0) + span.duration_ms
+        if span.parent_id is not None and span.parent_id == self.root_id:
+            self.children_ms += span.duration_ms
+
+    def server_timing(self, total_ms: float) -> str:
+        entries = [f"{phase};dur={duration:.1f}" for phase, duration in self.phases.items()]
+        # Handler time outside any span: validation, JSON encode/decode, response building
+        entries.append(f"app;dur={max(0.0, total_ms - self.children_ms):.1f}")
+        entries.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(entries)
+
+    def traceparent(self, span_id: str) -> str:
+        return f"00-{self.trace_id}-{span_id}-{'01' if self.sampled else '00'}"
+
+
+@contextlib.contextmanager
+def span(name: str, phase: Optional[str] = None, **attributes):
+    """Child span of the current one. A no-op outside a traced request."""
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = current_span.get()
+    child = Span(trace, name, parent.span_id if parent else trace.remote_parent_id, phase, attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = repr(e)
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        current_span.reset(token)
+        trace.finish(child)
+
+
+def traced(name: str, phase: Optional[str] = None):
+    """Run an async function inside span(name, phase). Keeps the signature, so it works on dependencies."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if current_trace.get() is None:
+                return await func(*args, **kwargs)
+            with span(name, phase):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.asynccontextmanager
+async def traced_lock(name: str, lock):
+    """Hold an async lock, recording only the time spent waiting for it as a "lock" phase span."""
+    with span(name, phase="lock"):
+        await lock.__aenter__()
+    try:
+        yield
+    except BaseException as e:
+        if not await lock.__aexit__(type(e), e, e.__traceback__):
+            raise
+    else:
+        await lock.__aexit__(None, None, None)
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Makes every upstream call a child span and propagates the trace with a traceparent header."""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if current_trace.get() is None:
+            return await self.transport.handle_async_request(request)
+        service, region = upstream_labels(request.url)
+        with span(f"{request.method} {service}", UPSTREAM_PHASES.get(service, "upstream"), service=service, region=region, url=str(request.url)) as upstream:
+            request.headers["traceparent"] = upstream.trace.traceparent(upstream.span_id)
+            response = await self.transport.handle_async_request(request)
+            upstream.attributes["status"] = response.status_code
+            return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class BatchExporter:
+    """
+    Exports finished sampled traces off the request path: traces are queued, and a background
+    task ships them in batches of TRACE_EXPORT_BATCH_SIZE spans or every TRACE_EXPORT_INTERVAL seconds.
+    A full queue drops new traces rather than slow requests down.
+    """
+
+    def __init__(self, target: str = TRACE_EXPORTER):
+        self.target = target
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self.task: Optional[asyncio.Task] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self.batch: List[Span] = []  # spans taken off the queue, not exported yet
+
+    @property
+    def enabled(self) -> bool:
+        return self.target not in ("", "none")
+
+    def submit(self, trace: Trace):
+        if not self.enabled or not trace.sampled:
+            return
+        if self.task is None or self.task.done():
+            # In an empty context: the exporter outlives the submitting request and is not part of its trace
+            self.task = contextvars.Context().run(asyncio.ensure_future, self.run())
+        try:
+            self.queue.put_nowait(trace)
+        except asyncio.QueueFull:
+            exported_spans.labels("dropped").inc(len(trace.spans))
+
+    async def run(self):
+        while True:
+            await self.collect()
+            batch, self.batch = self.batch, []
+            await self.export(batch)
+
+    async def collect(self):
+        deadline = time.monotonic() + TRACE_EXPORT_INTERVAL
+        while len(self.batch) < TRACE_EXPORT_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                trace = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            self.batch.extend(trace.spans)
+
+    async def export(self, batch: List[Span]):
+        if not batch:
+            return
+        try:
+            if self.target.startswith("file://"):
+                lines = "".join(json.dumps(item.to_otlp()) + "\n" for item in batch)
+                await asyncio.get_running_loop().run_in_executor(None, self.append, self.target[len("file://"):], lines)
+            else:
+                if self.client is None:
+                    self.client = httpx.AsyncClient(timeout=10)
+                payload = {
+                    "resourceSpans": [{
+                        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "vm-allocater"}}]},
+                        "scopeSpans": [{"scope": {"name": "vm-allocater"}, "spans": [item.to_otlp() for item in batch]}],
+                    }]
+                }
+                response = await self.client.post(f"{self.target.rstrip('/')}/v1/traces", json=payload)
+                response.raise_for_status()
+            exported_spans.labels("exported").inc(len(batch))
+        except Exception as e:
+            exported_spans.labels("failed").inc(len(batch))
+            log.get_logger(__name__).warning("trace_export_failed", target=self.target, error=repr(e))
+
+    @staticmethod
+    def append(path: str, lines: str):
+        with open(path, "a") as f:
+            f.write(lines)
+
+    async def shutdown(self):
+        """Flush whatever is queued and stop the background task."""
+        if self.task is not None:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+        pending, self.batch = self.batch, []
+        while not self.queue.empty():
+            pending.extend(self.queue.get_nowait().spans)
+        await self.export(pending)
+        if self.client is not None:
+            await self.client.aclose()
+
+
+exporter = BatchExporter()
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening a trace per request (continuing an incoming traceparent),
+    answering with X-Trace-Id and a Server-Timing summary of the phases, e.g.
+        Server-Timing: auth;dur=0.2, cache;dur=41.0, nova;dur=40.1, app;dur=2.3, total;dur=43.5
+    Phases nest (cache includes the upstream call it made), so they do not add up to total.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        trace = Trace(headers.get(b"traceparent", b"").decode("latin-1"))
+        root = Span(trace, scope["path"], trace.remote_parent_id, None, {"http.method": scope["method"]})
+        trace.root_id = root.span_id
+        trace_token = current_trace.set(trace)
+        span_token = current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.time_ns() - root.start_ns) / 1e6
+                message = dict(message, headers=[
+                    *message.get("headers", []),
+                    (b"x-trace-id", trace.trace_id.encode()),
+                    (b"server-timing", trace.server_timing(total_ms).encode()),
+                ])
+                root.attributes["http.status_code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.error = repr(e)
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            route = getattr(scope.get("route"), "path", None)
+            root.name = f"{scope['method']} {route or scope['path']}"
+            current_span.reset(span_token)
+            current_trace.reset(trace_token)
+            trace.finish(root)
+            exporter.submit(trace)
@@ -0,0 +1,6 @@
+from .upstream import UpstreamClient, ServiceClient, get_upstream, UPSTREAM_SERVICES
+from .health import upstream_health, UpstreamHealth
+from .hedging import hedger, Hedger
+from .limiter import run_batch, BatchError, AdaptiveLimiter, limiters
+
+__all__ = ["UpstreamClient", "ServiceClient", "get_upstream", "UPSTREAM_SERVICES", "upstream_health", "UpstreamHealth", "hedger", "Hedger", "run_batch", "BatchError", "AdaptiveLimiter", "limiters"]
\ No newline at end of file
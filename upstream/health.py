@@ -0,0 +1,178 @@
+import statistics
+import time
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import (
+    HEALTH_EWMA_ALPHA, HEALTH_BREAKER_FAILURES, HEALTH_BREAKER_ERROR_RATE, HEALTH_MIN_SAMPLES, HEALTH_BREAKER_COOLDOWN
+)
+from metrics import Counter, Gauge
+from models import CloudEnvironment, RegionName
+
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+ERROR_PENALTY = 4  # a region failing 25% of calls ranks like one twice as slow
+
+breaker_transitions = Counter("upstream_breaker_transitions_total", "Upstream breaker state changes", ("cloud_environment", "region", "service", "state"))
+
+
+class RegionHealth:
+    """Averages and breaker state for one (environment, region, service)."""
+    __slots__ = ("latency", "error_rate", "samples", "consecutive_failures", "state", "opened_at", "trial_in_flight", "last_seen", "last_error")
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.last_seen: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def cooled_down(self, now: float) -> bool:
+        return now - self.opened_at >= HEALTH_BREAKER_COOLDOWN
+
+
+class UpstreamHealth:
+    """
+    EWMA latency, error rate and a circuit breaker per (environment, region, service), fed by
+    every ServiceClient call and by the lifespan's synthetic probes.
+
+    closed     calls go through; HEALTH_BREAKER_FAILURES failures in a row, or an error-rate
+               average above HEALTH_BREAKER_ERROR_RATE, opens the breaker
+    open       calls fail fast with 503 for HEALTH_BREAKER_COOLDOWN seconds
+    half_open  one trial call goes through; success closes the breaker, failure reopens it
+
+    Failures are transport errors and 5xx; 429s are left to the adaptive limiter. State is per worker.
+    """
+
+    def __init__(self):
+        self.regions: Dict[Tuple[str, str, str], RegionHealth] = {}
+
+    def get(self, key: Tuple[str, str, str]) -> RegionHealth:
+        health = self.regions.get(key)
+        if health is None:
+            health = self.regions[key] = RegionHealth()
+        return health
+
+    def transition(self, key: Tuple[str, str, str], health: RegionHealth, state: str, now: float):
+        health.state = state
+        if state == OPEN:
+            health.opened_at = now
+        breaker_transitions.labels(*key, state).inc()
+
+    def allow(self, key: Tuple[str, str, str]) -> bool:
+        """Whether a call may go out now; claims the trial call of a cooled-down open breaker."""
+        health = self.regions.get(key)
+        if health is None or health.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if health.state == OPEN:
+            if not health.cooled_down(now):
+                return False
+            self.transition(key, health, HALF_OPEN, now)
+        if health.trial_in_flight:
+            return False
+        health.trial_in_flight = True
+        return True
+
+    def record(self, key: Tuple[str, str, str], seconds: float, ok: Optional[bool], error: Optional[str] = None):
+        """
+        One finished call. ok=None is a call cancelled before it answered (a caller's deadline)
+        or answered 429: its elapsed time still counts towards latency, but it is neither a
+        success nor a failure.
+        """
+        health = self.get(key)
+        now = time.monotonic()
+        health.latency = seconds if health.latency is None else health.latency + HEALTH_EWMA_ALPHA * (seconds - health.latency)
+        health.last_seen = now
+        was_trial, health.trial_in_flight = health.trial_in_flight, False
+        if ok is None:
+            return
+        health.samples += 1
+        health.error_rate += HEALTH_EWMA_ALPHA * ((0.0 if ok else 1.0) - health.error_rate)
+        if ok:
+            health.consecutive_failures = 0
+            if health.state == HALF_OPEN:
+                health.error_rate = min(health.error_rate, HEALTH_BREAKER_ERROR_RATE / 2)  # don't reopen on the old average
+                self.transition(key, health, CLOSED, now)
+            return
+        health.consecutive_failures += 1
+        health.last_error = error
+        if health.state == HALF_OPEN and was_trial:
+            self.transition(key, health, OPEN, now)
+        elif health.state == CLOSED and (
+            health.consecutive_failures >= HEALTH_BREAKER_FAILURES
+            or (health.samples >= HEALTH_MIN_SAMPLES and health.error_rate > HEALTH_BREAKER_ERROR_RATE)
+        ):
+            self.transition(key, health, OPEN, now)
+
+    def ranked_regions(self, cloud_environment: CloudEnvironment, service: str) -> List[RegionName]:
+        """
+        Regions for a placement-agnostic call, best first: closed breakers by latency weighted
+        by error rate, then breakers due a trial call. Regions still cooling down are left out.
+        Regions with no data yet rank at the median latency of the others.
+        """
+        now = time.monotonic()
+        known = [health.latency for (environment, _, name), health in self.regions.items()
+                 if environment == cloud_environment.value and name == service and health.latency is not None]
+        prior = statistics.median(known) if known else 0.0
+        ranked = []
+        for index, region in enumerate(RegionName):
+            health = self.regions.get((cloud_environment.value, region.value, service))
+            if health is None:
+                ranked.append((0, prior, index, region))
+                continue
+            if health.state != CLOSED and not health.cooled_down(now):
+                continue
+            score = (health.latency if health.latency is not None else prior) * (1 + ERROR_PENALTY * health.error_rate)
+            ranked.append((0 if health.state == CLOSED else 1, score, index, region))
+        return [region for *_, region in sorted(ranked)]
+
+    def needs_probe(self, cloud_environment: CloudEnvironment, region: RegionName, services, max_age: float) -> bool:
+        """True unless live traffic reached every service of the region within max_age and none is failing."""
+        now = time.monotonic()
+        for service in services:
+            health = self.regions.get((cloud_environment.value, region.value, service))
+            if health is None or health.state != CLOSED or health.last_seen is None or now - health.last_seen > max_age:
+                return True
+        return False
+
+    def seen_regions(self) -> Set[Tuple[CloudEnvironment, RegionName]]:
+        return {(CloudEnvironment(environment), RegionName(region)) for environment, region, _ in self.regions}
+
+    def snapshot(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "cloud_environment": environment,
+                "region": region,
+                "service": service,
+                "state": health.state,
+                "latency_ms": round(health.latency * 1000, 1) if health.latency is not None else None,
+                "error_rate": round(health.error_rate, 3),
+                "samples": health.samples,
+                "consecutive_failures": health.consecutive_failures,
+                "last_seen_s": round(now - health.last_seen, 1) if health.last_seen is not None else None,
+                "retry_in_s": round(max(0.0, HEALTH_BREAKER_COOLDOWN - (now - health.opened_at)), 1) if health.state == OPEN else None,
+                "last_error": health.last_error,
+            }
+            for (environment, region, service), health in sorted(self.regions.items())
+        ]
+
+
+upstream_health = UpstreamHealth()
+
+Gauge(
+    "upstream_breaker_state", "Upstream breaker per environment, region and service (0 closed, 1 half open, 2 open)",
+    ("cloud_environment", "region", "service"),
+    collect=lambda: {key: STATE_VALUES[health.state] for key, health in list(upstream_health.regions.items())}
+)
+Gauge(
+    "upstream_latency_ewma_seconds", "Moving average of upstream call latency per environment, region and service",
+    ("cloud_environment", "region", "service"),
+    collect=lambda: {key: health.latency for key, health in list(upstream_health.regions.items()) if health.latency is not None}
+)
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import HEDGE_BUDGET, HEDGE_BURST, HEDGE_QUANTILE, HEDGE_WINDOW, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY
+from metrics import Counter, Gauge
+
+
+hedgeable_calls = Counter("upstream_hedgeable_calls_total", "Upstream GETs of endpoints that opted into hedging", ("route",))
+hedges = Counter(
+    "upstream_hedges_total",
+    "Hedged upstream GETs by result: won (hedge answered first), lost (first attempt did), failed (both failed), budget_exhausted (not sent)",
+    ("route", "result")
+)
+
+
+class LatencyWindow:
+    """Recent attempt latencies for one endpoint; the hedge delay is recomputed every 10 samples."""
+    __slots__ = ("samples", "delay", "pending")
+
+    def __init__(self):
+        self.samples = deque(maxlen=HEDGE_WINDOW)
+        self.delay: Optional[float] = None
+        self.pending = 0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.pending += 1
+        if self.pending >= 10 and len(self.samples) >= HEDGE_MIN_SAMPLES:
+            self.pending = 0
+            ordered = sorted(self.samples)
+            self.delay = max(HEDGE_MIN_DELAY, ordered[int(HEDGE_QUANTILE * (len(ordered) - 1))])
+
+
+class Hedger:
+    """
+    Request hedging for idempotent upstream GETs: when the first attempt has not answered by
+    the endpoint's recent p95 (HEDGE_QUANTILE), an identical second attempt is sent. With the
+    first attempt's HTTP/1.1 connection busy, the pool hands the hedge a different connection.
+    The first response wins and the other attempt is cancelled, which closes its connection.
+
+    Hedges are paid for from a token bucket that earns HEDGE_BUDGET per hedgeable call (at most
+    HEDGE_BURST banked), so hedging adds at most ~5% upstream load however slow upstream gets.
+    State is per worker.
+    """
+
+    def __init__(self, budget: float = HEDGE_BUDGET, burst: float = HEDGE_BURST):
+        self.budget = budget
+        self.burst = burst
+        self.tokens = burst
+        self.windows: Dict[str, LatencyWindow] = {}
+
+    def window(self, route: str) -> LatencyWindow:
+        window = self.windows.get(route)
+        if window is None:
+            window = self.windows[route] = LatencyWindow()
+        return window
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def timed(self, window: LatencyWindow, attempt: Callable[[], Awaitable]):
+        started = time.perf_counter()
+        result = await attempt()
+        window.observe(time.perf_counter() - started)
+        return result
+
+    async def run(self, route: str, attempt: Callable[[], Awaitable]):
+        """attempt() once, or twice when the first is slow; returns the first successful result."""
+        window = self.window(route)
+        if self.budget <= 0:
+            return await attempt()
+        hedgeable_calls.labels(route).inc()
+        self.tokens = min(self.burst, self.tokens + self.budget)
+        first = asyncio.ensure_future(self.timed(window, attempt))
+        if window.delay is None:
+            return await first
+        attempts = [first]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=window.delay)
+            if done:
+                return first.result()
+            if not self.try_spend():
+                hedges.labels(route, "budget_exhausted").inc()
+                return await first
+            attempts.append(asyncio.ensure_future(self.timed(window, attempt)))
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        hedges.labels(route, "won" if task is attempts[1] else "lost").inc()
+                        return task.result()
+            hedges.labels(route, "failed").inc()
+            return first.result()  # both failed: raise the first attempt's error
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+
+hedger = Hedger()
+
+Gauge(
+    "upstream_hedge_delay_seconds", "Current hedge delay (recent p95) per endpoint", ("route",),
+    collect=lambda: {route: window.delay for route, window in list(hedger.windows.items()) if window.delay is not None}
+)
@@ -0,0 +1,204 @@
+import asyncio
+import contextvars
+import time
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+
+from config import (
+    LIMIT_INITIAL, LIMIT_MIN, LIMIT_MAX, LIMIT_TOLERANCE, LIMIT_BACKOFF, LIMIT_OVERLOAD_BACKOFF,
+    LIMIT_BASELINE_SAMPLES, LIMIT_BASELINE_WINDOWS
+)
+from metrics import Counter, Gauge, start_batch
+from scheduling import FairQueue, BULK, admits, current_priority
+
+
+SMOOTHING = 0.1  # weight of the newest call in the smoothed latency
+
+limit_decreases = Counter("upstream_concurrency_decreases_total", "Adaptive limit cuts by cause (latency, overload)", ("region", "service", "cause"))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one (region, service), steered by latency and errors:
+
+    * additive increase: +1 per `limit` successful calls, but only while the limit is what
+      holds calls back (calls are queued or every slot is busy);
+    * multiplicative decrease: x LIMIT_BACKOFF when the smoothed latency climbs past
+      LIMIT_TOLERANCE x the no-load latency (upstream is queueing), x LIMIT_OVERLOAD_BACKOFF
+      on 429, 5xx or transport errors; at most once per smoothed round trip.
+
+    The no-load latency is the lowest mean latency of recent windows of LIMIT_BASELINE_SAMPLES
+    calls. Comparing a mean with means keeps latency jitter from reading as queueing, and a
+    region that got slower for good is re-learned once LIMIT_BASELINE_WINDOWS windows have passed.
+
+    Calls over the limit wait in a scheduling.FairQueue: by priority class, then fairly by
+    tenant, with bulk and polling calls kept to their share of the limit.
+    """
+
+    def __init__(self, initial: float = LIMIT_INITIAL, minimum: float = LIMIT_MIN, maximum: float = LIMIT_MAX):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.inflight = 0
+        self.queue = FairQueue()
+        self.smoothed: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.window_sum = 0.0
+        self.window_count = 0
+        self.window_means: deque = deque(maxlen=LIMIT_BASELINE_WINDOWS)
+        self.last_decrease = 0.0
+
+    def admissible(self, priority_class: str) -> bool:
+        return admits(priority_class, self.inflight, self.limit)
+
+    async def acquire(self, priority_class: str, tenant: str):
+        if not self.queue.waiting(priority_class) and self.admissible(priority_class):
+            self.inflight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.queue.push(priority_class, tenant, waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release_slot()  # granted just as we were cancelled: hand the slot on
+            raise
+
+    def release_slot(self):
+        self.inflight -= 1
+        self.wake()
+
+    def wake(self):
+        while True:
+            waiter = self.queue.pop(self.admissible)
+            if waiter is None:
+                return
+            self.inflight += 1
+            waiter.set_result(None)
+
+    def release(self, seconds: Optional[float], overloaded: bool) -> Optional[str]:
+        """
+        Return a slot with the call's outcome; seconds=None for calls that tell nothing about
+        upstream (cancelled, refused locally). Returns the cause when the limit was cut.
+        """
+        saturated = self.inflight >= self.limit - 1 or len(self.queue) > 0
+        self.inflight -= 1
+        cause = None
+        if seconds is not None:
+            cause = "overload" if overloaded else self.observe(seconds)
+            now = time.monotonic()
+            if cause is not None and now - self.last_decrease >= (self.smoothed or 0):
+                self.limit = max(self.minimum, self.limit * (LIMIT_OVERLOAD_BACKOFF if overloaded else LIMIT_BACKOFF))
+                self.last_decrease = now
+            elif cause is None and saturated:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            else:
+                cause = None
+        self.wake()
+        return cause
+
+    def observe(self, seconds: float) -> Optional[str]:
+        self.smoothed = seconds if self.smoothed is None else self.smoothed + SMOOTHING * (seconds - self.smoothed)
+        self.window_sum += seconds
+        self.window_count += 1
+        if self.window_count >= LIMIT_BASELINE_SAMPLES:
+            self.window_means.append(self.window_sum / self.window_count)
+            self.window_sum, self.window_count = 0.0, 0
+            self.baseline = min(self.window_means)
+        if self.baseline is None:
+            return None  # still learning: only overload cuts the limit
+        return "latency" if self.smoothed > self.baseline * LIMIT_TOLERANCE else None
+
+
+# (region, service) -> limiter; shared by every environment since they reach the same endpoints
+limiters: Dict[Tuple[str, str], AdaptiveLimiter] = {}
+
+
+def limiter_for(region: str, service: str) -> AdaptiveLimiter:
+    limiter = limiters.get((region, service))
+    if limiter is None:
+        limiter = limiters[(region, service)] = AdaptiveLimiter()
+    return limiter
+
+
+class Batch:
+    """Calls made for one batch or fan-out; `error` is the first failure, after which unsent items are skipped."""
+    __slots__ = ("route", "error")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.error: Optional[BaseException] = None
+
+
+# Set while a batch or fan-out runs: failures skip the batch's unsent items and 429s are retried
+current_batch: contextvars.ContextVar[Optional[Batch]] = contextvars.ContextVar("current_batch", default=None)
+
+
+class BatchSkipped(Exception):
+    """An item that was not sent because an earlier item of its batch failed."""
+
+
+class BatchError(HTTPException):
+    """
+    First failure of a batch, with the status and detail the failing item raised, plus
+    `results`: the items that did complete, in item order.
+    """
+
+    def __init__(self, error: BaseException, results: List[Any], skipped: int):
+        status_code = error.status_code if isinstance(error, HTTPException) else 502
+        detail = error.detail if isinstance(error, HTTPException) else f"{type(error).__name__}: {error}"
+        super().__init__(status_code=status_code, detail=detail)
+        self.error = error
+        self.results = results
+        self.skipped = skipped
+
+
+async def run_batch(route: str, items: Sequence[Any], call: Callable[[Any], Awaitable[Any]]) -> List[Any]:
+    """
+    call(item) for every item at once, as bulk calls admitted by the adaptive limiter of the
+    (region, service) they go to. Returns the results in item order.
+    Once an item fails, items still waiting for a slot are skipped (those already sent finish)
+    and BatchError is raised with the results so far.
+    """
+    batch = Batch(route)
+    item_done = start_batch(route, len(items))
+
+    async def run(item):
+        try:
+            return await call(item)
+        except BaseException as e:
+            if batch.error is None and not isinstance(e, (BatchSkipped, asyncio.CancelledError)):
+                batch.error = e
+            raise
+        finally:
+            item_done()
+
+    token, priority_token = current_batch.set(batch), current_priority.set(BULK)
+    try:
+        tasks = [asyncio.ensure_future(run(item)) for item in items]
+    finally:
+        current_priority.reset(priority_token)
+        current_batch.reset(token)
+    try:
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        for task in tasks:
+            task.cancel()  # only does anything when the request itself was cancelled
+    if batch.error is not None:
+        results = [outcome for outcome in outcomes if not isinstance(outcome, BaseException)]
+        raise BatchError(batch.error, results, sum(isinstance(outcome, BatchSkipped) for outcome in outcomes))
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome  # cancelled
+    return outcomes
+
+
+def limiter_stats(field: str) -> dict:
+    return {key: getattr(limiter, field) for key, limiter in list(limiters.items())}
+
+
+Gauge("upstream_concurrency_limit", "Adaptive concurrency limit per region and service", ("region", "service"), collect=lambda: limiter_stats("limit"))
+Gauge("upstream_concurrency_inflight", "Upstream calls in flight per region and service", ("region", "service"), collect=lambda: limiter_stats("inflight"))
+Gauge("upstream_concurrency_queued", "Upstream calls waiting for a slot per region and service", ("region", "service"), collect=lambda: {key: len(limiter.queue) for key, limiter in list(limiters.items())})
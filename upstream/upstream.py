@@ -0,0 +1,147 @@
+import time
+import httpx
+
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException
+
+from auth import get_auth_token
+from config import API_BASE_URLS, LIMIT_RETRIES
+from deadline import budget_for, within_deadline
+from models import CloudEnvironment, RegionName
+from .health import upstream_health
+from .hedging import hedger
+from scheduling import current_priority, current_tenant, queue_wait
+from .limiter import current_batch, limiter_for, limit_decreases, BatchSkipped
+
+
+UPSTREAM_SERVICES = ("servers", "volumes", "networking")
+
+
+class ServiceClient:
+    """
+    One upstream service (Nova, Cinder or Neutron) for one token: the base URL and auth headers
+    are built once, requests only append the path:
+        await upstream.servers.get(f"/servers/{server_id}")
+    Every call is recorded in upstream_health under `key`, (environment, region, service), and
+    fails fast with 503 while that breaker is open. Calls made for a request are bounded by
+    what is left of its deadline (see deadline.py). Every call waits for a slot of the
+    (region, service) adaptive limiter, queued by priority class and tenant (see scheduling.py);
+    calls made by a batch (limiter.run_batch) are sent again when answered 429, up to
+    LIMIT_RETRIES times. Idempotent GETs can opt into hedging by
+    naming their endpoint: upstream.networking.get("/ports", hedge="list_ports").
+    """
+    __slots__ = ("client", "base_url", "headers", "key")
+
+    def __init__(self, client: httpx.AsyncClient, base_url: str, headers: httpx.Headers, key: Tuple[str, str, str]):
+        self.client = client
+        self.base_url = base_url
+        self.headers = headers
+        self.key = key
+
+    def url(self, path: str = "") -> str:
+        return self.base_url + path
+
+    async def request(self, method: str, path: str = "", **kwargs) -> httpx.Response:
+        batch = current_batch.get()
+        priority_class, tenant = current_priority.get(), current_tenant.get()
+        _, region, service = self.key
+        limiter = limiter_for(region, service)
+        for attempt in range(LIMIT_RETRIES + 1 if batch is not None else 1):
+            waiting = time.perf_counter()
+            budget = budget_for(service)
+            acquire = limiter.acquire(priority_class, tenant)
+            await (acquire if budget is None else within_deadline(acquire, budget, service, "queued"))
+            queue_wait.labels(priority_class).observe(time.perf_counter() - waiting)
+            if batch is not None and batch.error is not None:
+                limiter.release(None, False)
+                raise BatchSkipped()
+            started = time.perf_counter()
+            seconds, overloaded = None, False
+            try:
+                response = await self.send(method, path, **kwargs)
+                seconds, overloaded = time.perf_counter() - started, response.status_code == 429 or response.status_code >= 500
+            except httpx.TransportError:
+                seconds, overloaded = time.perf_counter() - started, True
+                raise
+            finally:
+                cause = limiter.release(seconds, overloaded)
+                if cause is not None:
+                    limit_decreases.labels(region, service, cause).inc()
+            if response.status_code != 429 or batch is None or attempt == LIMIT_RETRIES:
+                return response
+
+    async def send(self, method: str, path: str = "", **kwargs) -> httpx.Response:
+        budget = budget_for(self.key[2])
+        if not upstream_health.allow(self.key):
+            raise HTTPException(status_code=503, detail=f"{self.key[2]} in {self.key[0]}:{self.key[1]} is failing; see /health/upstreams")
+        started = time.perf_counter()
+        ok, error = None, None
+        try:
+            call = self.client.request(method, self.base_url + path, headers=self.headers, **kwargs)
+            response = await (call if budget is None else within_deadline(call, budget, self.key[2]))
+            # 429 is upstream shedding load, which the adaptive limiter answers; it says nothing about the region's health
+            ok = None if response.status_code == 429 else response.status_code < 500
+            error = None if ok is not False else f"status {response.status_code}"
+            return response
+        except httpx.TransportError as e:
+            ok, error = False, type(e).__name__
+            raise
+        finally:
+            upstream_health.record(self.key, time.perf_counter() - started, ok, error)
+
+    async def get(self, path: str = "", hedge: Optional[str] = None, **kwargs) -> httpx.Response:
+        if hedge is not None:
+            return await hedger.run(hedge, lambda: self.request("GET", path, **kwargs))
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str = "", **kwargs) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path: str = "", **kwargs) -> httpx.Response:
+        return await self.request("PUT", path, **kwargs)
+
+    async def delete(self, path: str = "", **kwargs) -> httpx.Response:
+        return await self.request("DELETE", path, **kwargs)
+
+
+class UpstreamClient:
+    """
+    Typed upstream access for one (environment, region, tenant) token.
+    Endpoints come from the token's service catalog, falling back to API_BASE_URLS for services
+    the catalog does not list, so pointing a region elsewhere only needs a new token.
+    """
+    __slots__ = ("cloud_environment", "region", "tenant_id", "auth_token", "client", "endpoints", "servers", "volumes", "networking")
+
+    def __init__(self, cloud_environment: CloudEnvironment, region: RegionName, auth: dict, client: httpx.AsyncClient):
+        self.cloud_environment = cloud_environment
+        self.region = region
+        self.tenant_id = auth["tenant_id"]
+        self.auth_token = auth["auth_token"]
+        self.client = client
+        catalog = auth.get("endpoints") or {}
+        self.endpoints = {
+            service: catalog.get(service) or API_BASE_URLS[cloud_environment.value][service].format(region=region.value, tenant_id=self.tenant_id)
+            for service in UPSTREAM_SERVICES
+        }
+        headers = httpx.Headers({"X-Auth-Token": self.auth_token, "Content-Type": "application/json"})
+        self.servers, self.volumes, self.networking = (
+            ServiceClient(client, self.endpoints[service], headers, (cloud_environment.value, region.value, service))
+            for service in UPSTREAM_SERVICES
+        )
+
+
+# (environment, region) -> client for the current token; replaced when the token or the httpx client changes
+upstream_clients: Dict[Tuple[str, str], UpstreamClient] = {}
+
+
+async def get_upstream(cloud_environment: CloudEnvironment, region: RegionName, client: httpx.AsyncClient) -> UpstreamClient:
+    """
+    UpstreamClient for the region's current token. With the worker's shared httpx client
+    this is a dict lookup per request until the token is refreshed.
+    """
+    auth: dict = await get_auth_token(cloud_environment, region, client)
+    key = (cloud_environment.value, region.value)
+    upstream = upstream_clients.get(key)
+    if upstream is None or upstream.auth_token != auth["auth_token"] or upstream.client is not client:
+        upstream = upstream_clients[key] = UpstreamClient(cloud_environment, region, auth, client)
+    return upstream